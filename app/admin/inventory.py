@@ -0,0 +1,519 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+from collections.abc import Iterable, Iterator, Sequence
+from typing import IO, Any
+
+from sqlalchemy import Boolean, and_, bindparam, func, or_, select, type_coerce
+
+from ..catalog import bump_catalog_version
+from ..db_models import Inventory, InventoryLog, Item, db
+from ..search import index_items
+
+
+DEFAULT_STREAM_BATCH_SIZE = 500
+MAX_ITEMS_PAGE_SIZE = 1000
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+MAX_ADJUSTMENT_LINES = 1000
+
+_stock_quantity = func.coalesce(Inventory.stock_quantity, 0)
+_low_stock_threshold = func.coalesce(Inventory.low_stock_threshold, 0)
+
+# Same keys and defaults as routes._item_to_dict, computed in SQL so rows never become ORM objects.
+ITEM_COLUMNS = {
+	"id": Item.id,
+	"name": Item.name,
+	"price": Item.price,
+	"category": Item.category,
+	"image": Item.image,
+	"details": Item.details,
+	"price_id": Item.price_id,
+	"stock_quantity": _stock_quantity,
+	"low_stock_threshold": _low_stock_threshold,
+	"is_published": func.coalesce(Inventory.is_published, True),
+	"low_stock": type_coerce(and_(_low_stock_threshold > 0, _stock_quantity <= _low_stock_threshold), Boolean),
+}
+ITEM_FIELDS = tuple(ITEM_COLUMNS)
+
+EXPORT_FIELDS = ("id", "name", "price", "stock_quantity", "low_stock_threshold", "is_published")
+
+
+def parse_fields(raw: str | None) -> tuple[str, ...]:
+	"""Validates a ``?fields=a,b`` projection; no value selects every field."""
+	if not raw:
+		return ITEM_FIELDS
+	fields = tuple(dict.fromkeys(name.strip() for name in raw.split(",") if name.strip()))
+	unknown = [name for name in fields if name not in ITEM_COLUMNS]
+	if unknown:
+		raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+	if not fields:
+		raise ValueError("fields must name at least one field")
+	return fields
+
+
+def iter_item_rows(
+	fields: Sequence[str] = ITEM_FIELDS,
+	after: int | None = None,
+	limit: int | None = None,
+	since: datetime.datetime | None = None,
+	batch_size: int = DEFAULT_STREAM_BATCH_SIZE,
+) -> Iterator[dict[str, Any]]:
+	"""Yields items with their inventory as dicts, in id order.
+
+	Items and inventory come from a single outer-joined SELECT read through a
+	streaming cursor ``batch_size`` rows at a time, so memory does not grow
+	with the catalog. ``since`` keeps only items whose row or inventory row
+	changed at or after that time.
+	"""
+	query = (
+		select(*(ITEM_COLUMNS[name].label(name) for name in fields))
+		.select_from(Item)
+		.outerjoin(Inventory, Inventory.item_id == Item.id)
+		.order_by(Item.id)
+	)
+	if after is not None:
+		query = query.where(Item.id > after)
+	if since is not None:
+		query = query.where(or_(Item.updated_at >= since, Inventory.updated_at >= since))
+	if limit is not None:
+		query = query.limit(limit)
+	result = db.session.execute(query.execution_options(yield_per=batch_size))
+	try:
+		for row in result:
+			yield dict(row._mapping)
+	finally:
+		result.close()
+
+
+def items_page(fields: Sequence[str], after: int | None, limit: int) -> tuple[list[dict[str, Any]], int | None]:
+	"""One keyset page of items and the cursor of the next page (None on the last page)."""
+	# The cursor is the id of the last row, so it has to be read even when not projected.
+	columns = fields if "id" in fields else ("id", *fields)
+	rows = list(iter_item_rows(columns, after=after, limit=limit + 1))
+	next_after = None
+	if len(rows) > limit:
+		rows = rows[:limit]
+		next_after = rows[-1]["id"]
+	if "id" not in fields:
+		for row in rows:
+			del row["id"]
+	return rows, next_after
+
+
+def parse_since(raw: str | None) -> datetime.datetime | None:
+	"""Parses an ISO 8601 ``?since=`` value into the naive UTC datetimes stored by the models."""
+	if not raw:
+		return None
+	try:
+		since = datetime.datetime.fromisoformat(raw)
+	except ValueError as exc:
+		raise ValueError("since must be an ISO 8601 date or datetime") from exc
+	if since.tzinfo is not None:
+		since = since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+	return since
+
+
+def iter_inventory_csv(
+	since: datetime.datetime | None = None,
+	batch_size: int = DEFAULT_STREAM_BATCH_SIZE,
+) -> Iterator[str]:
+	"""Yields the inventory export as CSV text, one chunk per ``batch_size`` rows. Performs no writes."""
+	buffer = io.StringIO()
+	writer = csv.writer(buffer)
+	writer.writerow(EXPORT_FIELDS)
+	pending = 0
+	for row in iter_item_rows(EXPORT_FIELDS, since=since, batch_size=batch_size):
+		writer.writerow([row[name] for name in EXPORT_FIELDS])
+		pending += 1
+		if pending >= batch_size:
+			yield buffer.getvalue()
+			buffer.seek(0)
+			buffer.truncate()
+			pending = 0
+	yield buffer.getvalue()
+
+
+def gzip_chunks(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+	"""Compresses a stream of text chunks into a single gzip member as they are produced."""
+	compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+	for chunk in chunks:
+		data = compressor.compress(chunk.encode("utf-8"))
+		if data:
+			yield data
+	yield compressor.flush()
+
+
+ITEM_IMPORT_FIELDS = ("name", "price")
+INVENTORY_IMPORT_FIELDS = ("stock_quantity", "low_stock_threshold", "is_published")
+_TRUE_VALUES = {"1", "true", "yes", "y", "on"}
+_FALSE_VALUES = {"0", "false", "no", "n", "off"}
+
+
+def read_csv_rows(stream: IO[str]) -> Iterator[tuple[int, dict]]:
+	"""Yields ``(line number, row)`` from a CSV with the export's header."""
+	reader = csv.DictReader(stream)
+	if not reader.fieldnames or "id" not in reader.fieldnames:
+		raise ValueError("The CSV header must include an id column")
+	for row in reader:
+		yield reader.line_num, row
+
+
+def read_ndjson_rows(stream: IO[str]) -> Iterator[tuple[int, str]]:
+	"""Yields ``(line number, raw line)``; lines are decoded by the importer so a bad one only fails its row."""
+	for line_number, line in enumerate(stream, start=1):
+		if line.strip():
+			yield line_number, line
+
+
+def _non_negative_int(value: Any, field_name: str) -> int:
+	try:
+		number = int(value)
+	except (TypeError, ValueError):
+		raise ValueError(f"{field_name} must be a non-negative integer") from None
+	if number < 0 or (isinstance(value, float) and not value.is_integer()):
+		raise ValueError(f"{field_name} must be a non-negative integer")
+	return number
+
+
+def _boolean(value: Any, field_name: str) -> bool:
+	if isinstance(value, bool):
+		return value
+	text = str(value).strip().lower()
+	if text in _TRUE_VALUES:
+		return True
+	if text in _FALSE_VALUES:
+		return False
+	raise ValueError(f"{field_name} must be true or false")
+
+
+def _coerce_import_row(raw: dict | str) -> dict[str, Any]:
+	"""Validates one import row; missing or empty values leave the field unchanged."""
+	if isinstance(raw, str):
+		raw = json.loads(raw)
+	if not isinstance(raw, dict):
+		raise ValueError("Each row must be an object")
+	values = {key: value for key, value in raw.items() if value is not None and value != ""}
+	if "id" not in values:
+		raise ValueError("id is required")
+
+	row: dict[str, Any] = {"id": _non_negative_int(values["id"], "id")}
+	if "name" in values:
+		row["name"] = str(values["name"]).strip()
+		if not row["name"]:
+			raise ValueError("name cannot be blank")
+	if "price" in values:
+		try:
+			row["price"] = float(values["price"])
+		except (TypeError, ValueError):
+			raise ValueError("price must be a number") from None
+		if row["price"] < 0:
+			raise ValueError("price cannot be negative")
+	for field_name in ("stock_quantity", "low_stock_threshold"):
+		if field_name in values:
+			row[field_name] = _non_negative_int(values[field_name], field_name)
+	if "is_published" in values:
+		row["is_published"] = _boolean(values["is_published"], "is_published")
+	return row
+
+
+def _record_error(report: dict, line: int, item_id: Any, message: str) -> None:
+	report["failed"] += 1
+	if len(report["errors"]) < MAX_REPORTED_ERRORS:
+		report["errors"].append({"line": line, "id": item_id, "error": message})
+	else:
+		report["errors_truncated"] = True
+
+
+def _load_import_state(item_ids: set[int]) -> dict[int, dict[str, Any]]:
+	rows = db.session.execute(
+		select(
+			Item.id,
+			Item.name,
+			Item.price,
+			Inventory.id.label("inventory_id"),
+			func.coalesce(Inventory.stock_quantity, 0).label("stock_quantity"),
+			func.coalesce(Inventory.low_stock_threshold, 0).label("low_stock_threshold"),
+			func.coalesce(Inventory.is_published, True).label("is_published"),
+		)
+		.outerjoin(Inventory, Inventory.item_id == Item.id)
+		.where(Item.id.in_(item_ids))
+	)
+	return {row.id: dict(row._mapping) for row in rows}
+
+
+def _apply_import_batch(batch: list[tuple[int, dict]], report: dict, user_id: int | None, dry_run: bool) -> None:
+	state = _load_import_state({row["id"] for _, row in batch})
+	logs = []
+	changed_items: set[int] = set()
+	changed_inventory: set[int] = set()
+	renamed: set[int] = set()
+	for line, row in batch:
+		current = state.get(row["id"])
+		if current is None:
+			_record_error(report, line, row["id"], "Item not found")
+			continue
+		changed = False
+		for field_name in ITEM_IMPORT_FIELDS + INVENTORY_IMPORT_FIELDS:
+			if field_name not in row or row[field_name] == current[field_name]:
+				continue
+			logs.append(
+				{
+					"item_id": row["id"],
+					"user_id": user_id,
+					"change_type": "import",
+					"field_name": field_name,
+					"old_value": str(current[field_name]),
+					"new_value": str(row[field_name]),
+					"note": "Bulk import",
+				}
+			)
+			current[field_name] = row[field_name]
+			changed = True
+			if field_name in ITEM_IMPORT_FIELDS:
+				changed_items.add(row["id"])
+				if field_name == "name":
+					renamed.add(row["id"])
+			else:
+				changed_inventory.add(row["id"])
+		report["changed" if changed else "unchanged"] += 1
+
+	if dry_run or not logs:
+		return
+
+	if changed_items:
+		db.session.execute(
+			Item.__table__.update()
+			.where(Item.id == bindparam("b_id"))
+			.values(name=bindparam("b_name"), price=bindparam("b_price")),
+			[
+				{"b_id": item_id, "b_name": state[item_id]["name"], "b_price": state[item_id]["price"]}
+				for item_id in changed_items
+			],
+		)
+	existing = [item_id for item_id in changed_inventory if state[item_id]["inventory_id"] is not None]
+	if existing:
+		db.session.execute(
+			Inventory.__table__.update()
+			.where(Inventory.item_id == bindparam("b_item_id"))
+			.values(
+				stock_quantity=bindparam("b_stock_quantity"),
+				low_stock_threshold=bindparam("b_low_stock_threshold"),
+				is_published=bindparam("b_is_published"),
+			),
+			[
+				{
+					"b_item_id": item_id,
+					"b_stock_quantity": state[item_id]["stock_quantity"],
+					"b_low_stock_threshold": state[item_id]["low_stock_threshold"],
+					"b_is_published": state[item_id]["is_published"],
+				}
+				for item_id in existing
+			],
+		)
+	missing = [item_id for item_id in changed_inventory if state[item_id]["inventory_id"] is None]
+	if missing:
+		db.session.execute(
+			Inventory.__table__.insert(),
+			[
+				{
+					"item_id": item_id,
+					"stock_quantity": state[item_id]["stock_quantity"],
+					"low_stock_threshold": state[item_id]["low_stock_threshold"],
+					"is_published": state[item_id]["is_published"],
+				}
+				for item_id in missing
+			],
+		)
+	db.session.execute(InventoryLog.__table__.insert(), logs)
+	if renamed:
+		index_items(Item.query.filter(Item.id.in_(renamed)).all())
+	bump_catalog_version()
+	db.session.commit()
+
+
+def import_inventory(
+	rows: Iterable[tuple[int, dict | str]],
+	user_id: int | None = None,
+	dry_run: bool = False,
+	batch_size: int = IMPORT_BATCH_SIZE,
+) -> dict[str, Any]:
+	"""Applies rows in the export's format and returns a report with the errors of each failed row.
+
+	Rows are processed ``batch_size`` at a time: one SELECT loads the current
+	state of the batch, then the changed items and inventory rows are written
+	with executemany UPDATEs (or INSERTs for items without inventory), their
+	``InventoryLog`` rows with one bulk INSERT, and the batch is committed.
+	Invalid rows are reported and skipped. With ``dry_run`` nothing is written.
+
+	Batches are committed as they go, so a stream that breaks part-way (a
+	corrupt gzip member, bad UTF-8) keeps what came before it: the rows read
+	up to then are applied, and the report carries the read ``error`` and
+	``last_line``, the line of the last row read, for resuming the import.
+	"""
+	report: dict[str, Any] = {
+		"dry_run": dry_run,
+		"rows": 0,
+		"changed": 0,
+		"unchanged": 0,
+		"failed": 0,
+		"errors": [],
+		"last_line": None,
+	}
+	batch: list[tuple[int, dict]] = []
+	rows = iter(rows)
+	while True:
+		try:
+			line, raw = next(rows)
+		except StopIteration:
+			break
+		except (OSError, EOFError, ValueError, csv.Error) as exc:
+			report["error"] = f"Could not read the import: {exc}"
+			break
+		report["rows"] += 1
+		report["last_line"] = line
+		try:
+			batch.append((line, _coerce_import_row(raw)))
+		except ValueError as exc:
+			item_id = raw.get("id") if isinstance(raw, dict) else None
+			_record_error(report, line, item_id, str(exc))
+			continue
+		if len(batch) >= batch_size:
+			_apply_import_batch(batch, report, user_id, dry_run)
+			batch = []
+	if batch:
+		_apply_import_batch(batch, report, user_id, dry_run)
+	if dry_run:
+		db.session.rollback()
+	return report
+
+
+def parse_adjustments(payload: Any) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+	"""Validates ``[{item_id, delta | quantity, note}]`` (bare or under ``adjustments``).
+
+	Returns the parsed lines and one error per invalid line.
+	"""
+	if isinstance(payload, dict):
+		payload = payload.get("adjustments")
+	if not isinstance(payload, list) or not payload:
+		raise ValueError("Provide a non-empty list of adjustments")
+	if len(payload) > MAX_ADJUSTMENT_LINES:
+		raise ValueError(f"At most {MAX_ADJUSTMENT_LINES} adjustments per request")
+
+	lines, errors = [], []
+	for index, raw in enumerate(payload):
+		try:
+			if not isinstance(raw, dict):
+				raise ValueError("Each adjustment must be an object")
+			if ("delta" in raw) == ("quantity" in raw):
+				raise ValueError("Provide either 'delta' or 'quantity'")
+			try:
+				line = {"item_id": int(raw["item_id"])}
+			except (KeyError, TypeError, ValueError):
+				raise ValueError("item_id must be an integer") from None
+			if "delta" in raw:
+				try:
+					line["delta"] = int(raw["delta"])
+				except (TypeError, ValueError):
+					raise ValueError("delta must be an integer") from None
+			else:
+				line["quantity"] = _non_negative_int(raw["quantity"], "quantity")
+			line["note"] = raw.get("note")
+		except ValueError as exc:
+			errors.append({"index": index, "item_id": raw.get("item_id") if isinstance(raw, dict) else None, "error": str(exc)})
+			continue
+		lines.append(line)
+	return lines, errors
+
+
+def _current_stock(item_id: int) -> int | None:
+	return db.session.execute(
+		select(Inventory.stock_quantity).where(Inventory.item_id == item_id)
+	).scalar_one_or_none()
+
+
+def _item_exists(item_id: int) -> bool:
+	return db.session.execute(select(Item.id).where(Item.id == item_id)).first() is not None
+
+
+def _insert_inventory(item_id: int, quantity: int) -> tuple[int, int]:
+	"""Creates the inventory row of an item that predates inventory tracking (stock 0)."""
+	db.session.execute(Inventory.__table__.insert(), [{"item_id": item_id, "stock_quantity": quantity}])
+	return 0, quantity
+
+
+def _adjust_by_delta(item_id: int, delta: int) -> tuple[int, int] | str:
+	inventory = Inventory.__table__
+	updated = db.session.execute(
+		inventory.update()
+		.where(inventory.c.item_id == item_id, inventory.c.stock_quantity + delta >= 0)
+		.values(stock_quantity=inventory.c.stock_quantity + delta)
+	).rowcount
+	if updated:
+		# Our write keeps the row locked until commit, so reading it back is exact.
+		new_quantity = _current_stock(item_id)
+		return new_quantity - delta, new_quantity
+	if _current_stock(item_id) is None:
+		if not _item_exists(item_id):
+			return "Item not found"
+		if delta >= 0:
+			return _insert_inventory(item_id, delta)
+	return "Resulting quantity cannot be negative"
+
+
+def _set_quantity(item_id: int, quantity: int) -> tuple[int, int] | str:
+	inventory = Inventory.__table__
+	while True:
+		current = _current_stock(item_id)
+		if current is None:
+			return _insert_inventory(item_id, quantity) if _item_exists(item_id) else "Item not found"
+		# Compare-and-set: read again if another transaction changed the stock in between.
+		updated = db.session.execute(
+			inventory.update()
+			.where(inventory.c.item_id == item_id, inventory.c.stock_quantity == current)
+			.values(stock_quantity=quantity)
+		).rowcount
+		if updated:
+			return current, quantity
+
+
+def apply_stock_adjustments(lines: list[dict[str, Any]], user_id: int | None = None) -> tuple[list[dict[str, Any]], bool]:
+	"""Applies every line in the current transaction; returns the per-line results and whether all succeeded.
+
+	Deltas are applied by the database (``stock_quantity = stock_quantity +
+	:delta``) with a guard that refuses to go below zero, so concurrent
+	adjustments cannot overwrite each other. The caller commits when every line
+	succeeded and rolls back otherwise.
+	"""
+	results, logs = [], []
+	ok = True
+	for line in lines:
+		item_id = line["item_id"]
+		if "delta" in line:
+			outcome = _adjust_by_delta(item_id, line["delta"])
+		else:
+			outcome = _set_quantity(item_id, line["quantity"])
+		if isinstance(outcome, str):
+			ok = False
+			results.append({"item_id": item_id, "status": "error", "error": outcome})
+			continue
+		old_quantity, new_quantity = outcome
+		results.append({"item_id": item_id, "status": "ok", "old_quantity": old_quantity, "stock_quantity": new_quantity})
+		if new_quantity != old_quantity:
+			logs.append(
+				{
+					"item_id": item_id,
+					"user_id": user_id,
+					"change_type": "adjust",
+					"field_name": "stock_quantity",
+					"old_value": str(old_quantity),
+					"new_value": str(new_quantity),
+					"note": line.get("note") or ("Delta update" if "delta" in line else "Quantity override"),
+				}
+			)
+	if ok and logs:
+		db.session.execute(InventoryLog.__table__.insert(), logs)
+		bump_catalog_version()
+	return results, ok
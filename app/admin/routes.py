@@ -1,5 +1,7 @@
-import csv
+import datetime
+import gzip
 import io
+import json
 from pathlib import Path
 from typing import Any
 
@@ -8,18 +10,39 @@ from flask import (
 	current_app,
 	flash,
 	jsonify,
-	make_response,
 	render_template,
 	request,
+	stream_with_context,
 	url_for,
 )
 from flask_login import current_user
 from sqlalchemy import text
+from sqlalchemy.orm import contains_eager
 from werkzeug.utils import redirect, secure_filename
 
 from ..admin.forms import AddItemForm, OrderEditForm
+from ..admin.inventory import (
+	MAX_ITEMS_PAGE_SIZE,
+	apply_stock_adjustments,
+	gzip_chunks,
+	import_inventory,
+	items_page,
+	iter_inventory_csv,
+	iter_item_rows,
+	parse_adjustments,
+	parse_fields,
+	parse_since,
+	read_csv_rows,
+	read_ndjson_rows,
+)
+from ..admin.stats import dashboard_stats
+from ..catalog import bump_catalog_version
 from ..db_models import Cart, Inventory, InventoryLog, Item, Order, Ordered_item, User, db
-from ..funcs import admin_only
+from ..funcs import admin_only, refresh_cart_counts
+from ..instrumentation import get_route_metrics, render_prometheus
+from ..payments import get_gateway
+from ..rollups import apply_status_change
+from ..search import index_item, remove_items
 
 
 admin = Blueprint("admin", __name__, url_prefix="/admin", static_folder="static", template_folder="templates")
@@ -66,10 +89,14 @@ def _ensure_inventory(item: Item, defaults: dict[str, Any] | None = None) -> Inv
 	return inventory
 
 
+def _current_user_id() -> int | None:
+	return current_user.id if current_user.is_authenticated else None
+
+
 def _log_inventory_change(item: Item, change_type: str, field_name: str, old_value: Any, new_value: Any, note: str | None = None) -> None:
 	log_entry = InventoryLog(
 		item_id=item.id,
-		user_id=current_user.id if current_user.is_authenticated else None,
+		user_id=_current_user_id(),
 		change_type=change_type,
 		field_name=field_name,
 		old_value=str(old_value) if old_value is not None else None,
@@ -127,114 +154,22 @@ def _item_to_dict(item: Item) -> dict[str, Any]:
 @admin.route("/")
 @admin_only
 def dashboard():
-	from datetime import datetime, timedelta
-	from sqlalchemy import func
-	
-	# Get all orders
-	all_orders = Order.query.all()
-	orders_query = Order.query.order_by(Order.date.desc()).limit(10).all()
-	
-	# Calculate total for each order using historical prices
-	orders = []
-	for order in orders_query:
-		order_total = sum(
-			(ordered_item.price_at_purchase or ordered_item.item.price) * ordered_item.quantity
-			for ordered_item in order.items
-		)
-		orders.append({
-			"order": order,
-			"total": order_total
-		})
-	
-	# Calculate statistics using historical prices
-	total_revenue = sum(
-		sum(
-			(ordered_item.price_at_purchase or ordered_item.item.price) * ordered_item.quantity
-			for ordered_item in order.items
-		)
-		for order in all_orders if order.status.lower() != "cancelled"
-	)
-	total_orders = len(all_orders)
-	total_customers = User.query.count()
-	total_items = Item.query.count()
-	
-	# Orders by status
-	orders_by_status = {}
-	for order in all_orders:
-		status = order.status.lower()
-		orders_by_status[status] = orders_by_status.get(status, 0) + 1
-	
-	# Recent orders (last 7 days)
-	seven_days_ago = datetime.utcnow() - timedelta(days=7)
-	recent_orders_count = Order.query.filter(Order.date >= seven_days_ago).count()
-	
-	# Recent revenue (last 7 days) using historical prices
-	recent_orders = Order.query.filter(Order.date >= seven_days_ago).all()
-	recent_revenue = sum(
-		sum(
-			(ordered_item.price_at_purchase or ordered_item.item.price) * ordered_item.quantity
-			for ordered_item in order.items
-		)
-		for order in recent_orders if order.status.lower() != "cancelled"
-	)
-	
-	# Low stock items
-	low_stock_items = [
-		item for item in Item.query.all() 
-		if item.inventory and item.inventory.low_stock_threshold > 0 
-		and item.inventory.stock_quantity <= item.inventory.low_stock_threshold
-	]
-	
-	# Top selling items
-	top_items_query = db.session.query(
-		Ordered_item.itemid,
-		func.sum(Ordered_item.quantity).label('total_quantity')
-	).group_by(Ordered_item.itemid).order_by(func.sum(Ordered_item.quantity).desc()).limit(5).all()
-	
-	top_items = []
-	for item_id, quantity in top_items_query:
-		item = Item.query.get(item_id)
-		if item:
-			top_items.append({"item": item, "quantity": quantity})
-	
-	# Orders per day (last 7 days)
-	orders_per_day = []
-	for i in range(6, -1, -1):
-		day = datetime.utcnow() - timedelta(days=i)
-		day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-		day_end = day.replace(hour=23, minute=59, second=59, microsecond=999999)
-		count = Order.query.filter(Order.date >= day_start, Order.date <= day_end).count()
-		orders_per_day.append({
-			"date": day.strftime("%Y-%m-%d"),
-			"day": day.strftime("%a"),
-			"count": count
-		})
-	
-	return render_template(
-		"admin/home.html",
-		orders=orders,
-		low_stock_items=low_stock_items,
-		total_revenue=total_revenue,
-		total_orders=total_orders,
-		total_customers=total_customers,
-		total_items=total_items,
-		orders_by_status=orders_by_status,
-		recent_orders_count=recent_orders_count,
-		recent_revenue=recent_revenue,
-		top_items=top_items,
-		orders_per_day=orders_per_day,
-	)
+	return render_template("admin/home.html", **dashboard_stats())
 
 
 @admin.route("/items")
 @admin_only
 def items():
-	items = Item.query.all()
-	payload = [_item_to_dict(item) for item in items]
 	if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
-		return jsonify(payload)
+		return jsonify(list(iter_item_rows()))
 
-	return render_template("admin/items.html", items=items, inventory=payload)
+	items = (
+		Item.query.outerjoin(Item.inventory)
+		.options(contains_eager(Item.inventory))
+		.order_by(Item.id)
+		.all()
+	)
+	return render_template("admin/items.html", items=items)
 
 
 @admin.route("/add", methods=["POST", "GET"])
@@ -278,6 +213,8 @@ def add():
 			old_value=None,
 			new_value=inventory.is_published,
 		)
+		index_item(item)
+		bump_catalog_version()
 		db.session.commit()
 		flash(f"{item.name} added successfully!", "success")
 		return redirect(url_for("admin.items"))
@@ -357,6 +294,8 @@ def edit(type: str, item_id: int):
 					new_value=item.price,
 				)
 
+			index_item(item)
+			bump_catalog_version()
 			db.session.commit()
 			flash(f"{item.name} updated successfully!", "success")
 			return redirect(url_for("admin.items"))
@@ -365,6 +304,7 @@ def edit(type: str, item_id: int):
 		order = Order.query.get_or_404(item_id)
 		form = OrderEditForm(status=order.status)
 		if form.validate_on_submit():
+			apply_status_change(order, order.status, form.status.data)
 			order.status = form.status.data
 			db.session.commit()
 			return redirect(url_for("admin.dashboard"))
@@ -388,7 +328,9 @@ def delete(item_id: int):
 	item_name = row[0]
 	
 	# Supprimer les entrées du panier associées à cet article
+	cart_owners = [uid for (uid,) in db.session.query(Cart.uid).filter_by(itemid=item_id).distinct()]
 	Cart.query.filter_by(itemid=item_id).delete()
+	refresh_cart_counts(cart_owners)
 	
 	# Vérifier s'il y a des commandes associées (en utilisant une requête SQL brute pour éviter les erreurs de colonnes manquantes)
 	result = db.session.execute(text("SELECT 1 FROM ordered_items WHERE itemid = :item_id LIMIT 1"), {"item_id": item_id})
@@ -415,7 +357,10 @@ def delete(item_id: int):
 	
 	try:
 		# Utiliser une requête SQL brute pour la suppression afin d'éviter complètement le chargement des relations
+		# L'index de recherche d'abord : search_tokens référence items par clé étrangère
+		remove_items([item_id])
 		db.session.execute(text("DELETE FROM items WHERE id = :item_id"), {"item_id": item_id})
+		bump_catalog_version()
 		db.session.commit()
 		flash(f"{item_name} deleted successfully", "success")
 	except Exception as e:
@@ -425,12 +370,53 @@ def delete(item_id: int):
 	return redirect(url_for("admin.items"))
 
 
+def _wants_ndjson() -> bool:
+	if request.args.get("format") == "ndjson":
+		return True
+	best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+	return best == "application/x-ndjson"
+
+
+def _list_items():
+	"""GET /admin/api/items.
+
+	``?fields=id,stock_quantity`` selects the keys of each item. ``?limit=`` and
+	``?after=<id>`` page through the catalog by id; the next page's URL is sent
+	in the ``Link`` header. ``?format=ndjson`` (or ``Accept:
+	application/x-ndjson``) streams one item per line instead of a JSON array.
+	"""
+	try:
+		fields = parse_fields(request.args.get("fields"))
+		after = request.args.get("after", type=int)
+		limit = request.args.get("limit", type=int)
+		if "after" in request.args and after is None:
+			raise ValueError("after must be an item id")
+		if "limit" in request.args and (limit is None or limit < 1):
+			raise ValueError("limit must be a positive integer")
+	except ValueError as exc:
+		return jsonify({"error": str(exc)}), 400
+
+	if _wants_ndjson():
+		rows = iter_item_rows(fields, after=after, limit=limit)
+		lines = (json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+		return current_app.response_class(stream_with_context(lines), mimetype="application/x-ndjson")
+
+	if limit is None and after is None:
+		return jsonify(list(iter_item_rows(fields)))
+
+	rows, next_after = items_page(fields, after, min(limit or MAX_ITEMS_PAGE_SIZE, MAX_ITEMS_PAGE_SIZE))
+	response = jsonify(rows)
+	if next_after is not None:
+		next_url = url_for(".api_items", **{**request.args.to_dict(), "after": next_after})
+		response.headers["Link"] = f'<{next_url}>; rel="next"'
+	return response
+
+
 @admin.route("/api/items", methods=["GET", "POST"])
 @admin_only
 def api_items():
 	if request.method == "GET":
-		items = Item.query.all()
-		return jsonify([_item_to_dict(item) for item in items])
+		return _list_items()
 
 	payload = request.get_json(silent=True) or {}
 	required_fields = {"name", "price", "category", "details", "price_id"}
@@ -491,6 +477,8 @@ def api_items():
 			old_value=None,
 			new_value=inventory.low_stock_threshold,
 		)
+	index_item(item)
+	bump_catalog_version()
 	db.session.commit()
 	return jsonify(_item_to_dict(item)), 201
 
@@ -508,7 +496,9 @@ def api_item_detail(item_id: int):
 		item_name = row[0]
 		
 		# Supprimer les entrées du panier associées à cet article
+		cart_owners = [uid for (uid,) in db.session.query(Cart.uid).filter_by(itemid=item_id).distinct()]
 		Cart.query.filter_by(itemid=item_id).delete()
+		refresh_cart_counts(cart_owners)
 		
 		# Vérifier s'il y a des commandes associées (en utilisant une requête SQL brute pour éviter les erreurs de colonnes manquantes)
 		result = db.session.execute(text("SELECT 1 FROM ordered_items WHERE itemid = :item_id LIMIT 1"), {"item_id": item_id})
@@ -534,7 +524,10 @@ def api_item_detail(item_id: int):
 		
 		try:
 			# Utiliser une requête SQL brute pour la suppression afin d'éviter complètement le chargement des relations
+			# L'index de recherche d'abord : search_tokens référence items par clé étrangère
+			remove_items([item_id])
 			db.session.execute(text("DELETE FROM items WHERE id = :item_id"), {"item_id": item_id})
+			bump_catalog_version()
 			db.session.commit()
 			return jsonify({"status": "deleted", "id": item_id})
 		except Exception as e:
@@ -603,6 +596,9 @@ def api_item_detail(item_id: int):
 			)
 			inventory.is_published = new_published
 
+	if {"name", "category", "details"} & payload.keys():
+		index_item(item)
+	bump_catalog_version()
 	db.session.commit()
 	return jsonify(_item_to_dict(item))
 
@@ -611,66 +607,147 @@ def api_item_detail(item_id: int):
 @admin_only
 def api_adjust_stock(item_id: int):
 	item = Item.query.get_or_404(item_id)
-	inventory = _ensure_inventory(item)
 	payload = request.get_json(silent=True) or {}
 
 	if "delta" not in payload and "quantity" not in payload:
 		return jsonify({"error": "Provide either 'delta' or 'quantity' in payload"}), 400
 
-	note = payload.get("note")
+	line = {"item_id": item.id, "note": payload.get("note")}
 	if "delta" in payload:
 		try:
-			delta = int(payload["delta"])
+			line["delta"] = int(payload["delta"])
 		except (TypeError, ValueError):
 			return jsonify({"error": "delta must be an integer"}), 400
-		new_quantity = inventory.stock_quantity + delta
 	else:
 		try:
-			new_quantity = int(payload["quantity"])
+			line["quantity"] = int(payload["quantity"])
 		except (TypeError, ValueError):
 			return jsonify({"error": "quantity must be an integer"}), 400
+		if line["quantity"] < 0:
+			return jsonify({"error": "Resulting quantity cannot be negative"}), 400
 
-	if new_quantity < 0:
-		return jsonify({"error": "Resulting quantity cannot be negative"}), 400
-
-	if new_quantity != inventory.stock_quantity:
-		_log_inventory_change(
-			item,
-			"adjust",
-			"stock_quantity",
-			old_value=inventory.stock_quantity,
-			new_value=new_quantity,
-			note=note or ("Delta update" if "delta" in payload else "Quantity override"),
-		)
-		inventory.stock_quantity = new_quantity
+	results, ok = apply_stock_adjustments([line], user_id=_current_user_id())
+	if not ok:
+		db.session.rollback()
+		return jsonify({"error": results[0]["error"]}), 400
 	db.session.commit()
 	return jsonify(_item_to_dict(item))
 
 
+@admin.route("/api/inventory/adjust", methods=["POST"])
+@admin_only
+def api_adjust_inventory():
+	"""Applies a list of ``{item_id, delta | quantity, note}`` stock adjustments atomically.
+
+	Either every line is applied in one transaction, or none is and the
+	response (409) says which lines failed.
+	"""
+	try:
+		lines, errors = parse_adjustments(request.get_json(silent=True))
+	except ValueError as exc:
+		return jsonify({"error": str(exc)}), 400
+	if errors:
+		return jsonify({"error": "Invalid adjustments", "errors": errors}), 400
+
+	results, ok = apply_stock_adjustments(lines, user_id=_current_user_id())
+	if not ok:
+		db.session.rollback()
+		return jsonify({"error": "No adjustment was applied", "results": results}), 409
+	db.session.commit()
+	return jsonify({"results": results})
+
+
 @admin.route("/api/inventory/export", methods=["GET"])
 @admin_only
 def api_export_inventory():
-	items = Item.query.all()
-	output = io.StringIO()
-	writer = csv.writer(output)
-	writer.writerow(["id", "name", "price", "stock_quantity", "low_stock_threshold", "is_published"])
-	for item in items:
-		inventory = item.inventory or Inventory(stock_quantity=0, low_stock_threshold=0, is_published=True, item=item)
-		if not item.inventory:
-			db.session.add(inventory)
-			db.session.flush()
-		writer.writerow(
-			[
-				item.id,
-				item.name,
-				item.price,
-				inventory.stock_quantity,
-				inventory.low_stock_threshold,
-				inventory.is_published,
-			]
+	"""Streams the inventory as CSV; ``?since=<ISO datetime>`` exports only rows changed since then.
+
+	The response is gzip-encoded when the client accepts it. ``X-Exported-At``
+	holds the time the export started, to pass as ``since`` next time.
+	"""
+	try:
+		since = parse_since(request.args.get("since"))
+	except ValueError as exc:
+		return jsonify({"error": str(exc)}), 400
+
+	exported_at = datetime.datetime.utcnow()
+	chunks = iter_inventory_csv(since=since)
+	headers = {
+		"Content-Disposition": "attachment; filename=inventory.csv",
+		"X-Exported-At": exported_at.isoformat(),
+		"Vary": "Accept-Encoding",
+	}
+	if "gzip" in request.accept_encodings:
+		chunks = gzip_chunks(chunks)
+		headers["Content-Encoding"] = "gzip"
+	return current_app.response_class(
+		stream_with_context(chunks), mimetype="text/csv", headers=headers
+	)
+
+
+@admin.route("/api/inventory/import", methods=["POST"])
+@admin_only
+def api_import_inventory():
+	"""Applies a CSV (``text/csv``) or NDJSON (``application/x-ndjson``) body in the export's columns.
+
+	The body is read as a stream and may be gzip-encoded. ``?dry_run=1``
+	validates and reports what would change without writing anything. When the
+	body cannot be read to the end, the answer is a 400 with the report of the
+	rows applied before the error (see ``import_inventory``).
+	"""
+	data_format = request.args.get("format") or {
+		"text/csv": "csv",
+		"application/x-ndjson": "ndjson",
+	}.get(request.mimetype)
+	if data_format not in {"csv", "ndjson"}:
+		return jsonify({"error": "Send text/csv or application/x-ndjson"}), 415
+	dry_run = request.args.get("dry_run", "").lower() in {"1", "true", "yes"}
+
+	stream = request.stream
+	if request.content_encoding == "gzip":
+		stream = gzip.GzipFile(fileobj=stream)
+	text_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+	rows = read_csv_rows(text_stream) if data_format == "csv" else read_ndjson_rows(text_stream)
+	try:
+		report = import_inventory(
+			rows,
+			user_id=_current_user_id(),
+			dry_run=dry_run,
 		)
-	response = make_response(output.getvalue())
-	response.headers["Content-Disposition"] = "attachment; filename=inventory.csv"
-	response.headers["Content-Type"] = "text/csv"
-	db.session.commit()
-	return response
+	except (OSError, EOFError, ValueError) as exc:
+		db.session.rollback()
+		return jsonify({"error": f"Could not read the import: {exc}"}), 400
+	return jsonify(report), 400 if "error" in report else 200
+
+
+@admin.route("/api/payments/metrics", methods=["GET"])
+@admin_only
+def api_payment_metrics():
+	"""Call counts, retries, breaker rejections and latency histogram of the payment gateway."""
+	gateway = get_gateway()
+	metrics = getattr(gateway, "metrics", None)
+	breaker = getattr(gateway, "breaker", None)
+	return jsonify(
+		{
+			"gateway": gateway.name,
+			"circuit": breaker.state if breaker is not None else None,
+			"operations": metrics.snapshot() if metrics is not None else {},
+		}
+	)
+
+
+@admin.route("/api/metrics", methods=["GET"])
+@admin_only
+def api_metrics():
+	"""Per-endpoint request count, SQL statement count, DB time and wall time, with rolling percentiles.
+
+	JSON by default; ``?format=prometheus`` (or an ``Accept: text/plain``
+	scrape) returns the Prometheus text exposition format.
+	"""
+	snapshot = get_route_metrics().snapshot()
+	wants_text = request.accept_mimetypes.best_match(["application/json", "text/plain"]) == "text/plain"
+	if request.args.get("format") == "prometheus" or (wants_text and "format" not in request.args):
+		return current_app.response_class(
+			render_prometheus(snapshot), content_type="text/plain; version=0.0.4; charset=utf-8"
+		)
+	return jsonify({"routes": snapshot})
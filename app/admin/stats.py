@@ -0,0 +1,131 @@
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+
+from ..db_models import DailySalesRollup, Inventory, Item, Order, Ordered_item, User, db
+
+
+RECENT_DAYS = 7
+RECENT_ORDERS_LIMIT = 10
+TOP_ITEMS_LIMIT = 5
+
+
+def _revenue_totals(first_day: date) -> tuple[float, float]:
+	total, recent = db.session.query(
+		func.coalesce(func.sum(DailySalesRollup.revenue), 0),
+		func.coalesce(
+			func.sum(case((DailySalesRollup.day >= first_day, DailySalesRollup.revenue), else_=0)), 0
+		),
+	).one()
+	return float(total), float(recent)
+
+
+def _order_counts(since: datetime) -> tuple[dict[str, int], int, int]:
+	status = func.lower(Order.status)
+	rows = (
+		db.session.query(
+			status,
+			func.count(Order.id),
+			func.coalesce(func.sum(case((Order.date >= since, 1), else_=0)), 0),
+		)
+		.group_by(status)
+		.all()
+	)
+	orders_by_status = {name: count for name, count, _ in rows}
+	total_orders = sum(count for _, count, _ in rows)
+	recent_orders_count = sum(int(recent) for _, _, recent in rows)
+	return orders_by_status, total_orders, recent_orders_count
+
+
+def _orders_per_day(now: datetime) -> list[dict[str, Any]]:
+	first_day = (now - timedelta(days=RECENT_DAYS - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+	day = func.date(Order.date)
+	counts = {
+		str(value): count
+		for value, count in db.session.query(day, func.count(Order.id))
+		.filter(Order.date >= first_day)
+		.group_by(day)
+		.all()
+	}
+
+	histogram = []
+	for offset in range(RECENT_DAYS):
+		current = first_day + timedelta(days=offset)
+		key = current.strftime("%Y-%m-%d")
+		histogram.append({"date": key, "day": current.strftime("%a"), "count": counts.get(key, 0)})
+	return histogram
+
+
+def _recent_orders() -> list[dict[str, Any]]:
+	orders = (
+		Order.query.options(selectinload(Order.items).joinedload(Ordered_item.item))
+		.order_by(Order.date.desc())
+		.limit(RECENT_ORDERS_LIMIT)
+		.all()
+	)
+	return [
+		{
+			"order": order,
+			"total": sum(
+				(line.price_at_purchase or line.item.price) * line.quantity
+				for line in order.items
+			),
+		}
+		for order in orders
+	]
+
+
+def _low_stock_items() -> list[Item]:
+	return (
+		Item.query.join(Item.inventory)
+		.options(contains_eager(Item.inventory))
+		.filter(
+			Inventory.low_stock_threshold > 0,
+			Inventory.stock_quantity <= Inventory.low_stock_threshold,
+		)
+		.all()
+	)
+
+
+def _top_items() -> list[dict[str, Any]]:
+	units = func.sum(DailySalesRollup.units)
+	rows = (
+		db.session.query(Item, units)
+		.join(DailySalesRollup, DailySalesRollup.item_id == Item.id)
+		.group_by(Item.id)
+		.having(units > 0)
+		.order_by(units.desc())
+		.limit(TOP_ITEMS_LIMIT)
+		.all()
+	)
+	return [{"item": item, "quantity": quantity} for item, quantity in rows]
+
+
+def dashboard_stats(now: datetime | None = None) -> dict[str, Any]:
+	"""Every statistic shown on the admin dashboard.
+
+	Each figure is a grouped aggregate, so the number of queries is fixed and
+	does not grow with the order history. Revenue and top sellers read the
+	daily sales rollup rather than the ordered lines.
+	"""
+	now = now or datetime.utcnow()
+	since = now - timedelta(days=RECENT_DAYS)
+	first_day = (now - timedelta(days=RECENT_DAYS - 1)).date()
+
+	total_revenue, recent_revenue = _revenue_totals(first_day)
+	orders_by_status, total_orders, recent_orders_count = _order_counts(since)
+	return {
+		"orders": _recent_orders(),
+		"low_stock_items": _low_stock_items(),
+		"total_revenue": total_revenue,
+		"total_orders": total_orders,
+		"total_customers": User.query.count(),
+		"total_items": Item.query.count(),
+		"orders_by_status": orders_by_status,
+		"recent_orders_count": recent_orders_count,
+		"recent_revenue": recent_revenue,
+		"top_items": _top_items(),
+		"orders_per_day": _orders_per_day(now),
+	}
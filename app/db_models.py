@@ -10,22 +10,41 @@ class User(UserMixin, db.Model):
 	__tablename__ = "users"
 	id = db.Column(db.Integer, primary_key=True)
 	name = db.Column(db.Text, nullable=False)
-	email = db.Column(db.String(50), nullable=False)
+	email = db.Column(db.String(50), nullable=False, unique=True, index=True)
 	phone = db.Column(db.String(50), nullable=False)
 	password = db.Column(db.String(250), nullable=False)
 	admin = db.Column(db.Boolean, nullable=True, default=False)
 	email_confirmed = db.Column(db.Boolean, nullable=True, default=False)
+	# Denormalized sum of cart quantities, so the navbar badge needs no cart query
+	cart_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 	cart = db.relationship('Cart', backref='buyer')
 	orders = db.relationship("Order", backref='customer')
 
+	def get_user(self):
+		# Same accessor as the cached UserPrincipal that load_user returns.
+		return self
+
 	def add_to_cart(self, itemid, quantity):
-		item_to_add = Cart(itemid=itemid, uid=self.id, quantity=quantity)
-		db.session.add(item_to_add)
+		quantity = int(quantity)
+		if quantity <= 0:
+			raise ValueError("quantity must be positive")
+		Cart.add_quantities(self.id, {int(itemid): quantity})
+		self.cart_count = (self.cart_count or 0) + quantity
 		db.session.commit()
 
 	def remove_from_cart(self, itemid, quantity):
-		item_to_remove = Cart.query.filter_by(itemid=itemid, uid=self.id, quantity=quantity).first()
-		db.session.delete(item_to_remove)
+		quantity = int(quantity)
+		if quantity <= 0:
+			raise ValueError("quantity must be positive")
+		line = Cart.query.filter_by(itemid=int(itemid), uid=self.id).first()
+		if line is None:
+			return
+		removed = min(quantity, line.quantity)
+		if removed >= line.quantity:
+			db.session.delete(line)
+		else:
+			line.quantity -= removed
+		self.cart_count = max((self.cart_count or 0) - removed, 0)
 		db.session.commit()
 
 class Item(db.Model):
@@ -37,6 +56,7 @@ class Item(db.Model):
 	image = db.Column(db.String(250), nullable=False)
 	details = db.Column(db.String(250), nullable=False)
 	price_id = db.Column(db.String(250), nullable=False)
+	updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 	orders = db.relationship("Ordered_item", backref="item")
 	in_cart = db.relationship("Cart", backref="item")
 	inventory = db.relationship(
@@ -53,24 +73,68 @@ class Item(db.Model):
 
 class Cart(db.Model):
 	__tablename__ = "cart"
+	__table_args__ = (db.Index("uq_cart_uid_itemid", "uid", "itemid", unique=True),)
 	id = db.Column(db.Integer, primary_key=True)
 	uid = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-	itemid = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
+	itemid = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False, index=True)
 	quantity = db.Column(db.Integer, nullable=False, default=1)
 
+	@classmethod
+	def add_quantities(cls, uid, quantities):
+		"""Upserts {itemid: quantity} into a user's cart with one SELECT and bulk writes (no commit).
+
+		Existing lines are incremented in the database, so concurrent additions
+		are not lost; duplicate lines left by older versions are folded into
+		the oldest one.
+		"""
+		quantities = {itemid: quantity for itemid, quantity in quantities.items() if quantity > 0}
+		existing = {}
+		increments = {}
+		duplicates = []
+		rows = db.session.execute(
+			db.select(cls.id, cls.itemid, cls.quantity).where(cls.uid == uid).order_by(cls.id)
+		).all()
+		for line_id, itemid, quantity in rows:
+			if itemid in existing:
+				duplicates.append(line_id)
+				increments[itemid] = increments.get(itemid, 0) + quantity
+			else:
+				existing[itemid] = line_id
+		for itemid, quantity in quantities.items():
+			if itemid in existing:
+				increments[itemid] = increments.get(itemid, 0) + quantity
+
+		if duplicates:
+			db.session.execute(cls.__table__.delete().where(cls.id.in_(duplicates)))
+		if increments:
+			table = cls.__table__
+			db.session.execute(
+				table.update()
+				.where(table.c.id == db.bindparam("line_id"))
+				.values(quantity=table.c.quantity + db.bindparam("added")),
+				[{"line_id": existing[itemid], "added": added} for itemid, added in increments.items()],
+			)
+		new_lines = [
+			{"uid": uid, "itemid": itemid, "quantity": quantity}
+			for itemid, quantity in quantities.items()
+			if itemid not in existing
+		]
+		if new_lines:
+			db.session.execute(cls.__table__.insert(), new_lines)
+
 class Order(db.Model):
 	__tablename__ = "orders"
 	id = db.Column(db.Integer, primary_key=True)
-	uid = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-	date = db.Column(db.DateTime, nullable=False)
+	uid = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+	date = db.Column(db.DateTime, nullable=False, index=True)
 	status = db.Column(db.String(50), nullable=False)
 	items = db.relationship("Ordered_item", backref="order")
 
 class Ordered_item(db.Model):
 	__tablename__ = "ordered_items"
 	id = db.Column(db.Integer, primary_key=True)
-	oid = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-	itemid = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
+	oid = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+	itemid = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False, index=True)
 	quantity = db.Column(db.Integer, db.ForeignKey('cart.quantity'), nullable=False)
 	price_at_purchase = db.Column(db.Float, nullable=True)  # Price at time of purchase for historical accuracy
 
@@ -82,6 +146,8 @@ class Inventory(db.Model):
 	stock_quantity = db.Column(db.Integer, nullable=False, default=0)
 	low_stock_threshold = db.Column(db.Integer, nullable=False, default=0)
 	is_published = db.Column(db.Boolean, nullable=False, default=True)
+	# Units held by unexpired checkout reservations; available stock is stock_quantity - reserved_quantity.
+	reserved_quantity = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 	updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
 	item = db.relationship("Item", back_populates="inventory")
@@ -89,6 +155,7 @@ class Inventory(db.Model):
 
 class InventoryLog(db.Model):
 	__tablename__ = "inventory_logs"
+	__table_args__ = (db.Index("ix_inventory_logs_item_id_created_at", "item_id", "created_at"),)
 	id = db.Column(db.Integer, primary_key=True)
 	item_id = db.Column(db.Integer, db.ForeignKey("items.id"), nullable=False)
 	user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
@@ -97,7 +164,83 @@ class InventoryLog(db.Model):
 	old_value = db.Column(db.String(250), nullable=True)
 	new_value = db.Column(db.String(250), nullable=True)
 	note = db.Column(db.String(250), nullable=True)
-	created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+	created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
 
 	item = db.relationship("Item", back_populates="logs")
 	user = db.relationship("User")
+
+
+class SearchToken(db.Model):
+	"""Tokenized search index used when the database has no FTS5 support."""
+	__tablename__ = "search_tokens"
+	id = db.Column(db.Integer, primary_key=True)
+	item_id = db.Column(db.Integer, db.ForeignKey("items.id"), nullable=False, index=True)
+	token = db.Column(db.String(64), nullable=False, index=True)
+	weight = db.Column(db.Integer, nullable=False, default=1)
+
+
+class DailySalesRollup(db.Model):
+	"""Units, revenue and order count per item and day, excluding cancelled orders."""
+	__tablename__ = "daily_sales_rollups"
+	__table_args__ = (db.UniqueConstraint("day", "item_id", name="uq_daily_sales_rollups_day_item"),)
+	id = db.Column(db.Integer, primary_key=True)
+	day = db.Column(db.Date, nullable=False)
+	item_id = db.Column(db.Integer, db.ForeignKey("items.id"), nullable=False)
+	units = db.Column(db.Integer, nullable=False, default=0)
+	revenue = db.Column(db.Float, nullable=False, default=0.0)
+	orders = db.Column(db.Integer, nullable=False, default=0)
+
+	item = db.relationship("Item")
+
+
+class WebhookEvent(db.Model):
+	"""Verified Stripe event queued for a webhook worker; event_id makes enqueueing idempotent."""
+	__tablename__ = "webhook_events"
+	id = db.Column(db.Integer, primary_key=True)
+	event_id = db.Column(db.String(255), nullable=False, unique=True)
+	event_type = db.Column(db.String(100), nullable=False)
+	payload = db.Column(db.Text, nullable=False)
+	status = db.Column(db.String(20), nullable=False, default="pending", index=True)
+	attempts = db.Column(db.Integer, nullable=False, default=0)
+	next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+	last_error = db.Column(db.Text, nullable=True)
+	created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+	updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+class ProcessedWebhookEvent(db.Model):
+	"""Ledger of Stripe events whose side effects have been committed."""
+	__tablename__ = "processed_webhook_events"
+	id = db.Column(db.Integer, primary_key=True)
+	event_id = db.Column(db.String(255), nullable=False, unique=True)
+	event_type = db.Column(db.String(100), nullable=False)
+	processed_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+
+class CacheVersion(db.Model):
+	"""Version stamp per cached dataset, bumped by writers so every worker can detect stale caches."""
+	__tablename__ = "cache_versions"
+	name = db.Column(db.String(50), primary_key=True)
+	version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SchemaMigration(db.Model):
+	"""Migrations from app.migrations that have been applied to this database."""
+	__tablename__ = "schema_migrations"
+	version = db.Column(db.String(20), primary_key=True)
+	description = db.Column(db.String(250), nullable=False)
+	applied_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+
+class StockReservation(db.Model):
+	"""Units of an item held for a checkout until it is paid or the hold expires."""
+	__tablename__ = "stock_reservations"
+	__table_args__ = (db.Index("ix_stock_reservations_status_expires_at", "status", "expires_at"),)
+	id = db.Column(db.Integer, primary_key=True)
+	reference = db.Column(db.String(64), nullable=False, index=True)
+	user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+	item_id = db.Column(db.Integer, db.ForeignKey("items.id"), nullable=False)
+	quantity = db.Column(db.Integer, nullable=False)
+	status = db.Column(db.String(20), nullable=False, default="held")
+	expires_at = db.Column(db.DateTime, nullable=False)
+	created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
@@ -4,20 +4,34 @@ import os
 import secrets
 from functools import wraps
 
-from flask import abort, current_app, redirect, render_template, request, url_for
+from flask import abort, current_app, g, redirect, render_template, request, url_for
 from dotenv import load_dotenv
 from flask_login import current_user
-from flask_mail import Mail, Message
 from itsdangerous import URLSafeTimedSerializer
+from sqlalchemy import bindparam, case
 
-from .db_models import Cart, Order, Ordered_item, User, db
+from .cart_codec import decode_cart, encode_cart, normalize_cart
+from .db_models import Cart, Inventory, InventoryLog, Item, Order, Ordered_item, User, db
+from .reservations import convert_reservation
+from .rollups import apply_sales
 
 
 load_dotenv()
-mail = Mail()
+
+
+def _mail():
+	"""The app's Flask-Mail state, set up on first use so workers that never send mail skip the import."""
+	from flask_mail import Mail
+
+	state = current_app.extensions.get("mail")
+	if state is None:
+		state = Mail().init_app(current_app)
+	return state
 
 def send_confirmation_email(user_email) -> None:
 	"""sends confirmation email (suppressed in dev without mail creds)"""
+	from flask_mail import Message
+
 	secret = current_app.config.get("SECRET_KEY", os.getenv("SECRET_KEY", "dev-secret-key"))
 	confirm_serializer = URLSafeTimedSerializer(secret)
 	confirm_url = url_for(
@@ -33,28 +47,76 @@ def send_confirmation_email(user_email) -> None:
 		sender=("Fnuc Marty SA - Confirmation Email", sender_email),
 		html=html,
 	)
-	mail.send(msg)
+	_mail().send(msg)
 
 def fulfill_order(session):
-	""" Fulfils order on successful payment """
+	""" Fulfils order on successful payment, as a single transaction """
+
+	uid = int(session['client_reference_id'])
+	lines = (
+		db.session.query(Cart.itemid, Cart.quantity, Item.price, Inventory.stock_quantity)
+		.join(Item, Item.id == Cart.itemid)
+		.outerjoin(Inventory, Inventory.item_id == Cart.itemid)
+		.filter(Cart.uid == uid)
+		.order_by(Cart.id)
+		.all()
+	)
 
-	uid = session['client_reference_id']
-	order = Order(uid=uid, date=datetime.datetime.now(), status="processing")
+	order = Order(uid=uid, date=datetime.datetime.utcnow(), status="processing")
 	db.session.add(order)
-	db.session.commit()
+	db.session.flush()
+
+	if lines:
+		# Store price at purchase time for historical accuracy
+		db.session.execute(
+			Ordered_item.__table__.insert(),
+			[
+				{"oid": order.id, "itemid": itemid, "quantity": quantity, "price_at_purchase": price}
+				for itemid, quantity, price, _ in lines
+			],
+		)
 
-	current_user = User.query.get(uid)
-	for cart in current_user.cart:
-		ordered_item = Ordered_item(
-			oid=order.id,
-			itemid=cart.item.id,
-			quantity=cart.quantity,
-			price_at_purchase=cart.item.price  # Store price at purchase time for historical accuracy
+		sold = bindparam("sold_quantity")
+		db.session.execute(
+			Inventory.__table__.update()
+			.where(Inventory.item_id == bindparam("sold_item_id"))
+			.values(
+				stock_quantity=case(
+					(Inventory.stock_quantity >= sold, Inventory.stock_quantity - sold),
+					else_=0,
+				)
+			),
+			[{"sold_item_id": itemid, "sold_quantity": quantity} for itemid, quantity, _, _ in lines],
 		)
-		db.session.add(ordered_item)
-		db.session.commit()
-		current_user.remove_from_cart(cart.item.id, cart.quantity)
-		db.session.commit()
+
+		stock = {itemid: stock for itemid, _, _, stock in lines if stock is not None}
+		logs = []
+		for itemid, quantity, _, _ in lines:
+			if itemid not in stock:
+				continue
+			new_stock = max(stock[itemid] - quantity, 0)
+			logs.append(
+				{
+					"item_id": itemid,
+					"user_id": uid,
+					"change_type": "order",
+					"field_name": "stock_quantity",
+					"old_value": str(stock[itemid]),
+					"new_value": str(new_stock),
+					"note": f"Order #{order.id}",
+					"created_at": datetime.datetime.utcnow(),
+				}
+			)
+			stock[itemid] = new_stock
+		if logs:
+			db.session.execute(InventoryLog.__table__.insert(), logs)
+
+	convert_reservation((session.get("metadata") or {}).get("reservation"))
+	Cart.query.filter_by(uid=uid).delete(synchronize_session=False)
+	User.query.filter_by(id=uid).update({User.cart_count: 0}, synchronize_session=False)
+	apply_sales(order.date.date(), [(itemid, quantity, price * quantity) for itemid, quantity, price, _ in lines])
+	db.session.commit()
+	return order
 
 def admin_only(func):
 	"""Decorator for giving access to authorized users only (token or admin session)."""
@@ -90,24 +152,45 @@ def admin_only(func):
 
 # Fonctions pour gérer le panier dans les cookies
 def get_cart_from_cookies():
-	"""Récupère le panier depuis les cookies"""
-	cart_cookie = request.cookies.get("cart")
-	if cart_cookie:
-		try:
-			return json.loads(cart_cookie)
-		except json.JSONDecodeError:
-			return {}
-	return {}
+	"""Récupère le panier signé depuis les cookies (décodé une seule fois par requête)"""
+	raw = request.cookies.get("cart")
+	cached = g.get("cart_cookie")
+	if cached is None or cached[0] != raw:
+		cached = g.cart_cookie = (raw, decode_cart(raw, current_app.config["SECRET_KEY"]))
+	return {str(itemid): quantity for itemid, quantity in cached[1].items()}
 
 
 def save_cart_to_cookies(response, cart_dict):
-	"""Sauvegarde le panier dans les cookies"""
+	"""Sauvegarde le panier dans les cookies (lève CartTooLarge au-delà de MAX_CART_ENTRIES articles)"""
 	max_age = 30 * 24 * 60 * 60  # expire après 30 jours
-	cart_json = json.dumps(cart_dict)
-	response.set_cookie("cart", cart_json, max_age=max_age, httponly=True)
+	response.set_cookie(
+		"cart",
+		encode_cart(cart_dict, current_app.config["SECRET_KEY"]),
+		max_age=max_age,
+		httponly=True,
+	)
+	# Ancien compteur séparé : le nombre d'articles se lit désormais dans le panier signé.
+	if "cart_count" in request.cookies:
+		response.set_cookie("cart_count", "", expires=0)
 	return response
 
 
+def clear_cart_cookies(response):
+	"""Supprime le panier cookie (et l'ancien compteur)"""
+	response.set_cookie("cart", "", expires=0)
+	response.set_cookie("cart_count", "", expires=0)
+	return response
+
+
+def positive_quantity(value):
+	"""La quantité envoyée par le client si c'est un entier strictement positif, sinon None"""
+	try:
+		quantity = int(str(value).strip())
+	except (TypeError, ValueError):
+		return None
+	return quantity if quantity > 0 else None
+
+
 def add_to_cart_cookie(itemid, quantity):
 	"""Ajoute un article au panier cookie"""
 	cart = get_cart_from_cookies()
@@ -138,21 +221,13 @@ def remove_from_cart_cookie(itemid, quantity):
 
 
 def sync_cart_cookie_to_db(user):
-	"""Synchronise le panier cookie vers la DB lors de la connexion"""
-	cart_cookie = get_cart_from_cookies()
-
-	if not cart_cookie:
+	"""Fusionne le panier cookie dans la DB lors de la connexion (une lecture, écritures groupées)"""
+	quantities = normalize_cart(get_cart_from_cookies())
+	if not quantities:
 		return None
 
-	for itemid_str, quantity in cart_cookie.items():
-		itemid = int(itemid_str)
-		existing_cart_item = Cart.query.filter_by(itemid=itemid, uid=user.id).first()
-		if existing_cart_item:
-			existing_cart_item.quantity += int(quantity)
-		else:
-			cart_item = Cart(itemid=itemid, uid=user.id, quantity=int(quantity))
-			db.session.add(cart_item)
-
+	Cart.add_quantities(user.id, quantities)
+	user.cart_count = (user.cart_count or 0) + sum(quantities.values())
 	db.session.commit()
 	return True
 
@@ -196,16 +271,28 @@ def sync_localstorage_to_cookies(cart_localstorage):
 	return merge_carts(cart_cookie, cart_localstorage)
 
 
+def refresh_cart_counts(user_ids):
+	"""Recalcule cart_count pour les utilisateurs dont les lignes de panier ont été modifiées en masse"""
+	user_ids = list(user_ids)
+	if not user_ids:
+		return
+	total = (
+		db.select(db.func.coalesce(db.func.sum(Cart.quantity), 0))
+		.where(Cart.uid == User.id)
+		.scalar_subquery()
+	)
+	User.query.filter(User.id.in_(user_ids)).update({User.cart_count: total}, synchronize_session=False)
+
+
 def get_cart_items_count():
-	"""Retourne le nombre total d'articles dans le panier (DB, cookie ou localStorage)"""
+	"""Retourne le nombre total d'articles dans le panier (DB, cookie ou localStorage)
+
+	Ne fait aucune requête panier : compteur dénormalisé lu par clé primaire pour
+	les utilisateurs connectés (le principal en cache ne le porte pas, il change à
+	chaque écriture panier), panier cookie (déjà décodé pour la requête) pour les visiteurs.
+	"""
 	if current_user.is_authenticated:
-		total = 0
-		for cart_item in current_user.cart:
-			total += cart_item.quantity
-		return total
-
-	cart = get_cart_combined()
-	total = 0
-	for quantity in cart.values():
-		total += int(quantity)
-	return total
+		return db.session.query(User.cart_count).filter(User.id == current_user.id).scalar() or 0
+
+	from .cart import get_cart_view
+	return get_cart_view().count
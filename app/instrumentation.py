@@ -0,0 +1,186 @@
+"""Per-request SQL and latency metrics, and a slow-query log.
+
+Cursor events on every engine count the statements a request runs and time
+them; the Flask request signals time the request itself. Each finished
+request adds one sample to its endpoint's rolling window (the last
+``METRICS_WINDOW`` requests), from which ``/admin/api/metrics`` reports
+percentiles in JSON or Prometheus text format. Statements run while a
+streamed response body is being sent come after the request has finished
+and are not counted.
+
+Statements slower than ``SLOW_QUERY_THRESHOLD_MS`` are logged with their
+bound parameters on the ``app.instrumentation`` logger, whether or not they
+run inside a request.
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+from flask import Flask, current_app, g, has_app_context, has_request_context, request, request_finished, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "request_metrics"
+DEFAULT_SLOW_QUERY_THRESHOLD_MS = 250
+DEFAULT_METRICS_WINDOW = 1000
+QUANTILES = (0.5, 0.95, 0.99)
+# Long executemany parameter lists are cut to this many characters in the log.
+MAX_LOGGED_PARAMETERS = 2000
+UNMATCHED_ENDPOINT = "<unmatched>"
+
+
+def _percentile(sorted_values: list[float], quantile: float) -> float:
+	"""Nearest-rank percentile of an already sorted, non-empty list."""
+	rank = max(1, math.ceil(quantile * len(sorted_values)))
+	return sorted_values[rank - 1]
+
+
+class RouteMetrics:
+	"""Totals since start and a rolling window of (seconds, db_seconds, queries) samples per endpoint."""
+
+	def __init__(self, window: int = DEFAULT_METRICS_WINDOW):
+		self.window = window
+		self._routes: dict[str, dict] = {}
+		self._lock = threading.Lock()
+
+	def observe(self, endpoint: str, seconds: float, db_seconds: float, queries: int) -> None:
+		with self._lock:
+			route = self._routes.get(endpoint)
+			if route is None:
+				route = {
+					"requests": 0,
+					"seconds_sum": 0.0,
+					"db_seconds_sum": 0.0,
+					"queries_sum": 0,
+					"samples": deque(maxlen=self.window),
+				}
+				self._routes[endpoint] = route
+			route["requests"] += 1
+			route["seconds_sum"] += seconds
+			route["db_seconds_sum"] += db_seconds
+			route["queries_sum"] += queries
+			route["samples"].append((seconds, db_seconds, queries))
+
+	def clear(self) -> None:
+		with self._lock:
+			self._routes.clear()
+
+	def snapshot(self) -> dict:
+		with self._lock:
+			routes = {
+				endpoint: (dict(route, samples=None), list(route["samples"]))
+				for endpoint, route in self._routes.items()
+			}
+
+		result = {}
+		for endpoint, (totals, samples) in sorted(routes.items()):
+			columns = {
+				"seconds": sorted(sample[0] for sample in samples),
+				"db_seconds": sorted(sample[1] for sample in samples),
+				"queries": sorted(sample[2] for sample in samples),
+			}
+			result[endpoint] = {
+				"requests": totals["requests"],
+				"seconds_sum": totals["seconds_sum"],
+				"db_seconds_sum": totals["db_seconds_sum"],
+				"queries_sum": totals["queries_sum"],
+				"window": len(samples),
+				**{
+					name: {f"p{round(q * 100)}": _percentile(values, q) for q in QUANTILES}
+					for name, values in columns.items()
+				},
+			}
+		return result
+
+
+def get_route_metrics(app: Flask | None = None) -> RouteMetrics:
+	app = app or current_app
+	return app.extensions[EXTENSION_KEY]
+
+
+def _escape_label(value: str) -> str:
+	return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(snapshot: dict, prefix: str = "app") -> str:
+	"""The snapshot in the Prometheus text exposition format, as one summary per measure."""
+	summaries = (
+		("request_duration_seconds", "seconds", "seconds_sum", "Wall time of requests, by endpoint."),
+		("request_db_seconds", "db_seconds", "db_seconds_sum", "Time spent in SQL statements per request, by endpoint."),
+		("request_queries", "queries", "queries_sum", "SQL statements run per request, by endpoint."),
+	)
+	lines = []
+	for metric, key, sum_key, description in summaries:
+		name = f"{prefix}_{metric}"
+		lines.append(f"# HELP {name} {description}")
+		lines.append(f"# TYPE {name} summary")
+		for endpoint, route in snapshot.items():
+			label = f'endpoint="{_escape_label(endpoint)}"'
+			for quantile in QUANTILES:
+				value = route[key][f"p{round(quantile * 100)}"]
+				lines.append(f'{name}{{{label},quantile="{quantile}"}} {value}')
+			lines.append(f"{name}_sum{{{label}}} {route[sum_key]}")
+			lines.append(f"{name}_count{{{label}}} {route['requests']}")
+	return "\n".join(lines) + "\n"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+	if context is not None:
+		context._instrumentation_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+	started = getattr(context, "_instrumentation_started", None)
+	if started is None:
+		return
+	elapsed = time.perf_counter() - started
+
+	if has_request_context():
+		stats = g.get("_sql_stats")
+		if stats is not None:
+			stats[0] += 1
+			stats[1] += elapsed
+
+	threshold_ms = DEFAULT_SLOW_QUERY_THRESHOLD_MS
+	if has_app_context():
+		threshold_ms = current_app.config.get("SLOW_QUERY_THRESHOLD_MS", threshold_ms)
+	if threshold_ms is not None and elapsed * 1000 >= threshold_ms:
+		logged_parameters = repr(parameters)
+		if len(logged_parameters) > MAX_LOGGED_PARAMETERS:
+			logged_parameters = logged_parameters[:MAX_LOGGED_PARAMETERS] + "..."
+		logger.warning(
+			"Slow query (%.1f ms%s): %s parameters=%s",
+			elapsed * 1000,
+			f", {request.endpoint or UNMATCHED_ENDPOINT}" if has_request_context() else "",
+			statement,
+			logged_parameters,
+		)
+
+
+def _on_request_started(sender, **extra):
+	# g can outlive a request (tests, CLI), so every request starts from zero.
+	g._sql_stats = [0, 0.0]
+	g._request_started = time.perf_counter()
+
+
+def _on_request_finished(sender, response, **extra):
+	started = g.pop("_request_started", None)
+	stats = g.pop("_sql_stats", None)
+	if started is None or stats is None:
+		return
+	get_route_metrics(sender).observe(
+		request.endpoint or UNMATCHED_ENDPOINT, time.perf_counter() - started, stats[1], stats[0]
+	)
+
+
+def init_instrumentation(app: Flask) -> None:
+	app.extensions[EXTENSION_KEY] = RouteMetrics(app.config.get("METRICS_WINDOW", DEFAULT_METRICS_WINDOW))
+	request_started.connect(_on_request_started, app)
+	request_finished.connect(_on_request_finished, app)
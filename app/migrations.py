@@ -0,0 +1,169 @@
+"""Schema migrations for databases created before a model change.
+
+``db.create_all()`` only creates missing tables; it never adds columns or
+indexes to tables that already exist. Each migration below brings an older
+database in line with the models and is recorded in ``schema_migrations`` once
+applied. Migrations check the live schema before changing it, so they are
+no-ops on a database that ``create_all`` has just built.
+"""
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.engine import Connection
+
+from .db_models import Cart, DailySalesRollup, SchemaMigration, db
+from .rollups import sales_by_day_select
+
+
+class MigrationError(RuntimeError):
+	pass
+
+
+@dataclass(frozen=True)
+class Migration:
+	version: str
+	description: str
+	apply: Callable[[Connection], None]
+
+
+def _column_names(connection: Connection, table: str) -> set[str]:
+	return {column["name"] for column in inspect(connection).get_columns(table)}
+
+
+def _add_price_at_purchase(connection: Connection) -> None:
+	if "price_at_purchase" not in _column_names(connection, "ordered_items"):
+		connection.execute(text("ALTER TABLE ordered_items ADD COLUMN price_at_purchase FLOAT"))
+
+
+def _add_user_cart_count(connection: Connection) -> None:
+	if "cart_count" in _column_names(connection, "users"):
+		return
+	connection.execute(text("ALTER TABLE users ADD COLUMN cart_count INTEGER NOT NULL DEFAULT 0"))
+	connection.execute(
+		text(
+			"UPDATE users SET cart_count = "
+			"(SELECT COALESCE(SUM(quantity), 0) FROM cart WHERE cart.uid = users.id)"
+		)
+	)
+
+
+def _backfill_inventory(connection: Connection) -> None:
+	"""Every legacy item created before inventory shipped receives an inventory row."""
+	# Only the columns of the inventory table at this point; later migrations add the others.
+	connection.execute(
+		text(
+			"INSERT INTO inventory (item_id, stock_quantity, low_stock_threshold, is_published, updated_at) "
+			"SELECT id, 0, 0, :published, CURRENT_TIMESTAMP FROM items "
+			"WHERE NOT EXISTS (SELECT 1 FROM inventory WHERE inventory.item_id = items.id)"
+		),
+		{"published": True},
+	)
+
+
+# Indexes introduced by migration 0004; later index changes get their own migration.
+_INDEXES_0004 = {
+	"ix_users_email",
+	"ix_cart_itemid",
+	"ix_orders_uid",
+	"ix_orders_date",
+	"ix_ordered_items_oid",
+	"ix_ordered_items_itemid",
+	"ix_inventory_logs_item_id_created_at",
+	"ix_inventory_logs_created_at",
+}
+
+
+def _create_model_indexes(connection: Connection) -> None:
+	duplicate_email = connection.execute(
+		text("SELECT email FROM users GROUP BY email HAVING COUNT(*) > 1 LIMIT 1")
+	).scalar()
+	if duplicate_email is not None:
+		raise MigrationError(
+			f"Cannot add the unique index on users.email: {duplicate_email!r} is used by several accounts."
+		)
+	for table in db.metadata.sorted_tables:
+		for index in table.indexes:
+			if index.name in _INDEXES_0004:
+				index.create(bind=connection, checkfirst=True)
+
+
+def _consolidate_cart_lines(connection: Connection) -> None:
+	"""Folds duplicate (uid, itemid) cart rows into the oldest one, then makes the pair unique."""
+	connection.execute(
+		text(
+			"UPDATE cart SET quantity = "
+			"(SELECT SUM(other.quantity) FROM cart AS other WHERE other.uid = cart.uid AND other.itemid = cart.itemid) "
+			"WHERE id IN (SELECT MIN(id) FROM cart GROUP BY uid, itemid HAVING COUNT(*) > 1)"
+		)
+	)
+	connection.execute(text("DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY uid, itemid)"))
+	connection.execute(text("DROP INDEX IF EXISTS ix_cart_uid_itemid"))
+	for index in Cart.__table__.indexes:
+		index.create(bind=connection, checkfirst=True)
+
+
+def _add_item_updated_at(connection: Connection) -> None:
+	if "updated_at" in _column_names(connection, "items"):
+		return
+	# SQLite only accepts a constant default when adding a NOT NULL column.
+	connection.execute(
+		text("ALTER TABLE items ADD COLUMN updated_at DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00'")
+	)
+	connection.execute(text("UPDATE items SET updated_at = CURRENT_TIMESTAMP"))
+
+
+def _add_inventory_reserved_quantity(connection: Connection) -> None:
+	if "reserved_quantity" not in _column_names(connection, "inventory"):
+		connection.execute(text("ALTER TABLE inventory ADD COLUMN reserved_quantity INTEGER NOT NULL DEFAULT 0"))
+
+
+def _backfill_daily_sales_rollup(connection: Connection) -> None:
+	"""Fills the rollup from the order history of a database that had orders before the rollup existed."""
+	rollups = DailySalesRollup.__table__
+	if connection.execute(select(func.count()).select_from(rollups)).scalar():
+		return
+	sales = sales_by_day_select().subquery()
+	connection.execute(
+		rollups.insert().from_select(
+			["day", "item_id", "units", "revenue", "orders"],
+			select(sales.c.day, sales.c.item_id, sales.c.units, sales.c.revenue, sales.c.orders),
+		)
+	)
+
+
+MIGRATIONS = [
+	Migration("0001", "Add ordered_items.price_at_purchase", _add_price_at_purchase),
+	Migration("0002", "Add users.cart_count", _add_user_cart_count),
+	Migration("0003", "Create inventory rows for legacy items", _backfill_inventory),
+	Migration("0004", "Index hot lookup columns", _create_model_indexes),
+	Migration("0005", "Add items.updated_at", _add_item_updated_at),
+	Migration("0006", "Add inventory.reserved_quantity", _add_inventory_reserved_quantity),
+	Migration("0007", "Merge duplicate cart lines and make (uid, itemid) unique", _consolidate_cart_lines),
+	Migration("0008", "Backfill the daily sales rollup from past orders", _backfill_daily_sales_rollup),
+]
+
+
+def applied_versions() -> set[str]:
+	return set(db.session.execute(db.select(SchemaMigration.version)).scalars())
+
+
+def pending_migrations() -> list[Migration]:
+	applied = applied_versions()
+	return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+def upgrade_database() -> list[str]:
+	"""Applies pending migrations in order, each in its own transaction. Returns the versions applied."""
+	applied = []
+	for migration in pending_migrations():
+		connection = db.session.connection()
+		try:
+			migration.apply(connection)
+			db.session.add(SchemaMigration(version=migration.version, description=migration.description))
+			db.session.commit()
+		except Exception:
+			db.session.rollback()
+			raise
+		applied.append(migration.version)
+	return applied
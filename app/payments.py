@@ -0,0 +1,336 @@
+"""Payment provider behind a small interface.
+
+Routes talk to the gateway returned by ``get_gateway()``: ``StripeGateway``
+in production and ``FakeGateway`` when ``PAYMENT_GATEWAY = "fake"``, which
+records the sessions it is asked for and never leaves the process. Tests and
+benchmarks can also install their own gateway with ``set_gateway``.
+
+``StripeGateway`` is shared by every request thread of the app. It keeps one
+pooled keep-alive HTTP session to the API, bounds each call with connect and
+read timeouts and a small retry budget, and stops calling a provider that
+keeps failing: once ``STRIPE_BREAKER_FAILURES`` calls in a row fail, the
+circuit opens and checkouts fail fast with ``PaymentUnavailable`` until
+``STRIPE_BREAKER_RESET_SECONDS`` have passed and a trial call succeeds.
+"""
+import itertools
+import logging
+import os
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable
+
+from flask import Flask, current_app
+
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "payment_gateway"
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.1
+DEFAULT_POOL_SIZE = 10
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_RESET_SECONDS = 30.0
+# Upper bounds, in seconds, of the call latency histogram.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PaymentError(Exception):
+	"""The provider refused or could not complete a call; nothing was charged."""
+
+
+class PaymentUnavailable(PaymentError):
+	"""The provider is unreachable, failing or shed by the circuit breaker."""
+
+
+@dataclass(frozen=True)
+class CheckoutSession:
+	id: str
+	url: str
+
+
+class CircuitBreaker:
+	"""Consecutive-failure breaker: closed, then open for ``reset_seconds``, then one trial call."""
+
+	def __init__(self, failure_threshold: int, reset_seconds: float, clock: Callable[[], float] = time.monotonic):
+		self.failure_threshold = failure_threshold
+		self.reset_seconds = reset_seconds
+		self._clock = clock
+		self._failures = 0
+		self._opened_at: float | None = None
+		self._trial_running = False
+		self._lock = threading.Lock()
+
+	@property
+	def state(self) -> str:
+		with self._lock:
+			if self._opened_at is None:
+				return "closed"
+			if self._clock() - self._opened_at >= self.reset_seconds:
+				return "half-open"
+			return "open"
+
+	def allow(self) -> bool:
+		"""True when a call may go out; while half-open only one trial call is let through."""
+		with self._lock:
+			if self._opened_at is None:
+				return True
+			if self._clock() - self._opened_at < self.reset_seconds or self._trial_running:
+				return False
+			self._trial_running = True
+			return True
+
+	def record_success(self) -> None:
+		with self._lock:
+			self._failures = 0
+			self._opened_at = None
+			self._trial_running = False
+
+	def record_failure(self) -> None:
+		with self._lock:
+			self._failures += 1
+			if self._trial_running or self._failures >= self.failure_threshold:
+				self._opened_at = self._clock()
+			self._trial_running = False
+
+
+class CallMetrics:
+	"""Per-operation call counts and a cumulative latency histogram."""
+
+	def __init__(self, buckets=LATENCY_BUCKETS):
+		self.buckets = tuple(buckets)
+		self._operations: dict[str, dict] = {}
+		self._lock = threading.Lock()
+
+	def _operation(self, name: str) -> dict:
+		operation = self._operations.get(name)
+		if operation is None:
+			operation = {
+				"calls": 0,
+				"errors": 0,
+				"rejected": 0,
+				"retries": 0,
+				"seconds_sum": 0.0,
+				"seconds_max": 0.0,
+				"buckets": [0] * len(self.buckets),
+			}
+			self._operations[name] = operation
+		return operation
+
+	def observe(self, name: str, seconds: float, error: bool = False, retries: int = 0) -> None:
+		with self._lock:
+			operation = self._operation(name)
+			operation["calls"] += 1
+			operation["errors"] += int(error)
+			operation["retries"] += retries
+			operation["seconds_sum"] += seconds
+			operation["seconds_max"] = max(operation["seconds_max"], seconds)
+			for index, bound in enumerate(self.buckets):
+				if seconds <= bound:
+					operation["buckets"][index] += 1
+
+	def reject(self, name: str) -> None:
+		with self._lock:
+			self._operation(name)["rejected"] += 1
+
+	def snapshot(self) -> dict:
+		with self._lock:
+			return {
+				name: {
+					**{key: value for key, value in operation.items() if key != "buckets"},
+					"buckets": {str(bound): count for bound, count in zip(self.buckets, operation["buckets"])},
+				}
+				for name, operation in self._operations.items()
+			}
+
+
+class PaymentGateway(ABC):
+	name = "abstract"
+
+	@abstractmethod
+	def create_checkout_session(
+		self,
+		*,
+		client_reference_id: str,
+		line_items: list[dict],
+		metadata: dict,
+		expires_at: int,
+		success_url: str,
+		cancel_url: str,
+	) -> CheckoutSession:
+		"""Creates a hosted checkout for ``line_items`` and returns where to send the buyer."""
+
+	def close(self) -> None:
+		"""Releases pooled connections."""
+
+
+class StripeGateway(PaymentGateway):
+	name = "stripe"
+
+	def __init__(
+		self,
+		api_key: str,
+		*,
+		api_base: str | None = None,
+		connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+		read_timeout: float = DEFAULT_READ_TIMEOUT,
+		max_retries: int = DEFAULT_MAX_RETRIES,
+		retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+		pool_size: int = DEFAULT_POOL_SIZE,
+		breaker: CircuitBreaker | None = None,
+	):
+		import requests
+		import stripe
+
+		self.max_retries = max_retries
+		self.retry_backoff = retry_backoff
+		self.breaker = breaker or CircuitBreaker(DEFAULT_BREAKER_FAILURES, DEFAULT_BREAKER_RESET_SECONDS)
+		self.metrics = CallMetrics()
+		self._stripe = stripe
+
+		session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
+		self._http_session = session
+		self._client = stripe.StripeClient(
+			api_key,
+			base_addresses={"api": api_base} if api_base else {},
+			# Retries are ours, so the breaker sees every attempt and backoff stays short.
+			max_network_retries=0,
+			http_client=stripe.RequestsClient(timeout=(connect_timeout, read_timeout), session=session),
+		)
+
+	@classmethod
+	def from_config(cls, config) -> "StripeGateway":
+		return cls(
+			config.get("STRIPE_PRIVATE") or os.getenv("STRIPE_PRIVATE", ""),
+			api_base=config.get("STRIPE_API_BASE"),
+			connect_timeout=config.get("STRIPE_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT),
+			read_timeout=config.get("STRIPE_READ_TIMEOUT", DEFAULT_READ_TIMEOUT),
+			max_retries=config.get("STRIPE_MAX_RETRIES", DEFAULT_MAX_RETRIES),
+			pool_size=config.get("STRIPE_POOL_SIZE", DEFAULT_POOL_SIZE),
+			breaker=CircuitBreaker(
+				config.get("STRIPE_BREAKER_FAILURES", DEFAULT_BREAKER_FAILURES),
+				config.get("STRIPE_BREAKER_RESET_SECONDS", DEFAULT_BREAKER_RESET_SECONDS),
+			),
+		)
+
+	def _is_transient(self, exc: Exception) -> bool:
+		stripe = self._stripe
+		if isinstance(exc, (stripe.APIConnectionError, stripe.RateLimitError)):
+			return True
+		status = getattr(exc, "http_status", None)
+		return status is not None and (status >= 500 or status == 409)
+
+	def _call(self, operation: str, send):
+		"""Runs ``send(options)`` within the retry budget, behind the circuit breaker."""
+		if not self.breaker.allow():
+			self.metrics.reject(operation)
+			raise PaymentUnavailable("The payment provider is unavailable, please try again later.")
+
+		# One key for every attempt, so a retried request that did reach Stripe is not applied twice.
+		options = {"idempotency_key": secrets.token_hex(16)}
+		started = time.perf_counter()
+		attempt = 0
+		while True:
+			try:
+				result = send(options)
+			except self._stripe.StripeError as exc:
+				transient = self._is_transient(exc)
+				if transient and attempt < self.max_retries:
+					attempt += 1
+					time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+					continue
+				elapsed = time.perf_counter() - started
+				self.metrics.observe(operation, elapsed, error=True, retries=attempt)
+				if not transient:
+					# The provider answered; a refused request says nothing about its health.
+					self.breaker.record_success()
+					raise PaymentError(exc.user_message or str(exc)) from exc
+				self.breaker.record_failure()
+				logger.warning("%s failed after %d attempts in %.3fs: %s", operation, attempt + 1, elapsed, exc)
+				raise PaymentUnavailable("The payment provider is unavailable, please try again later.") from exc
+			except Exception:
+				# Anything else (a bug, an unexpected client error) still ends the call for the
+				# breaker, or a failed half-open trial would leave it rejecting every later call.
+				self.metrics.observe(operation, time.perf_counter() - started, error=True, retries=attempt)
+				self.breaker.record_failure()
+				raise
+			self.metrics.observe(operation, time.perf_counter() - started, retries=attempt)
+			self.breaker.record_success()
+			return result
+
+	def create_checkout_session(self, *, client_reference_id, line_items, metadata, expires_at, success_url, cancel_url):
+		params = {
+			"client_reference_id": str(client_reference_id),
+			"line_items": line_items,
+			"metadata": metadata,
+			"expires_at": expires_at,
+			"payment_method_types": ["card"],
+			"mode": "payment",
+			"success_url": success_url,
+			"cancel_url": cancel_url,
+		}
+		session = self._call(
+			"checkout.sessions.create",
+			lambda options: self._client.v1.checkout.sessions.create(params=params, options=options),
+		)
+		return CheckoutSession(id=session.id, url=session.url)
+
+	def close(self) -> None:
+		self._http_session.close()
+
+
+class FakeGateway(PaymentGateway):
+	"""In-process stand-in for Stripe Checkout; set ``error`` to make the next calls fail."""
+
+	name = "fake"
+
+	def __init__(self):
+		self.sessions: list[dict] = []
+		self.error: Exception | None = None
+		self._ids = itertools.count(1)
+		self._lock = threading.Lock()
+
+	def create_checkout_session(self, **params) -> CheckoutSession:
+		if self.error is not None:
+			raise self.error
+		with self._lock:
+			session_id = f"cs_fake_{next(self._ids)}"
+			self.sessions.append({"id": session_id, **params})
+		return CheckoutSession(id=session_id, url=f"{params['success_url']}?session_id={session_id}")
+
+
+_gateway_lock = threading.Lock()
+
+GATEWAYS = {StripeGateway.name: StripeGateway.from_config, FakeGateway.name: lambda config: FakeGateway()}
+
+
+def set_gateway(app: Flask, gateway: PaymentGateway | None) -> None:
+	"""Installs ``gateway`` for ``app``; None goes back to the one named by PAYMENT_GATEWAY."""
+	previous = app.extensions.pop(EXTENSION_KEY, None)
+	if previous is not None and previous is not gateway:
+		previous.close()
+	if gateway is not None:
+		app.extensions[EXTENSION_KEY] = gateway
+
+
+def get_gateway() -> PaymentGateway:
+	"""The app's gateway, built once and shared by every request thread."""
+	gateway = current_app.extensions.get(EXTENSION_KEY)
+	if gateway is None:
+		with _gateway_lock:
+			gateway = current_app.extensions.get(EXTENSION_KEY)
+			if gateway is None:
+				name = current_app.config.get("PAYMENT_GATEWAY", StripeGateway.name)
+				if name not in GATEWAYS:
+					raise RuntimeError(f"Unknown PAYMENT_GATEWAY {name!r}")
+				gateway = GATEWAYS[name](current_app.config)
+				current_app.extensions[EXTENSION_KEY] = gateway
+	return gateway
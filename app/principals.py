@@ -0,0 +1,182 @@
+"""The logged-in user of a request, served from a process-local cache.
+
+``load_user`` runs before every authenticated request, so instead of a
+``users`` SELECT it returns a small read-only ``UserPrincipal`` cached by user
+id. Each entry carries the ``users`` version of ``cache_versions`` it was
+loaded under; a transaction that changes one of the cached columns bumps that
+version. The process that made the write evicts the changed users on commit,
+and other workers notice the new version the next time they poll the row (at
+most once every ``USER_VERSION_POLL_SECONDS``).
+
+The cart counter changes on every cart write, so it is not part of the
+principal: cart writes never touch the version row or the cache.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from .cache import LRUCache
+from .db_models import CacheVersion, User, db
+
+
+USERS_VERSION_NAME = "users"
+PRINCIPAL_CACHE_SIZE = 10_000
+PRINCIPAL_TTL_SECONDS = 300
+# User columns copied into the principal; writes to any other column leave the cache alone.
+PRINCIPAL_COLUMNS = ("name", "email", "admin", "email_confirmed")
+
+_principal_cache = LRUCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_TTL_SECONDS)
+_version_lock = threading.Lock()
+_version_state = {"version": None, "checked_at": 0.0}
+# session.info keys: ids of the users changed in the transaction (None for "any user"), and
+# whether the transaction already bumped the version row.
+_CHANGED_KEY = "users_changed"
+_BUMPED_KEY = "users_version_bumped"
+
+
+@dataclass(frozen=True)
+class UserPrincipal(UserMixin):
+	"""Read-only snapshot of the fields requests need about the logged-in user."""
+	id: int
+	name: str
+	email: str
+	admin: bool
+	email_confirmed: bool
+	version: int
+
+	def get_user(self) -> User | None:
+		"""The full ``User`` row, for the requests that write to it."""
+		return db.session.get(User, self.id)
+
+
+def clear_principal_cache() -> None:
+	"""Drops this process's cached users; the version row is read again on next access."""
+	with _version_lock:
+		_principal_cache.clear()
+		_version_state["version"] = None
+		_version_state["checked_at"] = 0.0
+
+
+def _users_version() -> int:
+	poll_interval = current_app.config.get("USER_VERSION_POLL_SECONDS", 1.0)
+	now = time.monotonic()
+	if _version_state["version"] is not None and now - _version_state["checked_at"] < poll_interval:
+		return _version_state["version"]
+
+	version = db.session.query(CacheVersion.version).filter_by(name=USERS_VERSION_NAME).scalar() or 0
+	with _version_lock:
+		_version_state["version"] = version
+		_version_state["checked_at"] = now
+	return version
+
+
+def get_principal(user_id) -> UserPrincipal | None:
+	"""The cached principal of ``user_id``, loaded with one narrow SELECT when missing or stale."""
+	try:
+		user_id = int(user_id)
+	except (TypeError, ValueError):
+		return None
+	version = _users_version()
+	principal = _principal_cache.get(user_id)
+	if principal is not None and principal.version == version:
+		return principal
+
+	row = db.session.execute(
+		select(*(getattr(User, column) for column in PRINCIPAL_COLUMNS)).where(User.id == user_id)
+	).first()
+	if row is None:
+		_principal_cache.pop(user_id)
+		return None
+	principal = UserPrincipal(
+		id=user_id,
+		name=row.name,
+		email=row.email,
+		admin=bool(row.admin),
+		email_confirmed=bool(row.email_confirmed),
+		version=version,
+	)
+	_principal_cache.set(user_id, principal)
+	return principal
+
+
+def _note_user_change(session: Session, user_ids) -> None:
+	"""Records changed users (``None`` for any) and bumps the version row once per transaction."""
+	changed = session.info.get(_CHANGED_KEY, set())
+	if user_ids is None or changed is None:
+		session.info[_CHANGED_KEY] = None
+	else:
+		session.info[_CHANGED_KEY] = changed | set(user_ids)
+	if session.info.get(_BUMPED_KEY):
+		return
+
+	versions = CacheVersion.__table__
+	connection = session.connection()
+	bumped = connection.execute(
+		versions.update()
+		.where(versions.c.name == USERS_VERSION_NAME)
+		.values(version=versions.c.version + 1)
+	).rowcount
+	if not bumped:
+		connection.execute(versions.insert().values(name=USERS_VERSION_NAME, version=1))
+	session.info[_BUMPED_KEY] = True
+
+
+def _changes_principal(user: User) -> bool:
+	state = inspect(user)
+	return any(state.attrs[column].history.has_changes() for column in PRINCIPAL_COLUMNS)
+
+
+def _updated_columns(statement) -> set[str] | None:
+	"""Names of the columns an UPDATE sets, or None when they cannot be told."""
+	values = getattr(statement, "_values", None) or dict(getattr(statement, "_ordered_values", None) or ())
+	if not values:
+		return None
+	return {getattr(key, "key", key) for key in values}
+
+
+@event.listens_for(Session, "after_flush")
+def _track_user_rows(session, flush_context):
+	changed = [user.id for user in session.dirty if isinstance(user, User) and _changes_principal(user)]
+	changed.extend(user.id for user in session.deleted if isinstance(user, User))
+	if changed:
+		_note_user_change(session, changed)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_user_writes(orm_execute_state):
+	if orm_execute_state.bind_mapper is not User.__mapper__:
+		return
+	if orm_execute_state.is_update:
+		columns = _updated_columns(orm_execute_state.statement)
+		if columns is not None and columns.isdisjoint(PRINCIPAL_COLUMNS):
+			return
+	elif not orm_execute_state.is_delete:
+		return
+	# Query.update()/delete() on users: the rows are not known, so every cached user goes.
+	_note_user_change(orm_execute_state.session, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_after_user_write(session):
+	session.info.pop(_BUMPED_KEY, None)
+	if _CHANGED_KEY not in session.info:
+		return
+	changed = session.info.pop(_CHANGED_KEY)
+	if changed is None:
+		clear_principal_cache()
+		return
+	for user_id in changed:
+		_principal_cache.pop(user_id)
+	# The version moved on; read it again instead of stamping new entries with the old one.
+	_version_state["checked_at"] = 0.0
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_changes(session):
+	session.info.pop(_CHANGED_KEY, None)
+	session.info.pop(_BUMPED_KEY, None)
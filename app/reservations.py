@@ -0,0 +1,213 @@
+"""Time-boxed stock holds for checkouts in progress.
+
+Creating a checkout session reserves the cart's units with one conditional
+UPDATE per item (``reserved_quantity + :q`` only while enough stock is
+available), so concurrent checkouts on the same item never oversell and never
+wait on a Python lock. Fulfillment converts the holds into the order's stock
+decrement in the same transaction; holds of abandoned checkouts are released
+when Stripe reports the session expired, or by ``flask reservations-sweep``.
+
+A hold lives as long as its Checkout Session plus a grace period, both derived
+from the single ``checkout_expires_at()`` value, and the sweeper leaves alone
+the holds of sessions whose completion event is still waiting in the webhook
+queue.
+"""
+import datetime
+import json
+import secrets
+
+from flask import current_app
+from sqlalchemy import select
+
+from .db_models import Inventory, StockReservation, WebhookEvent, db
+
+
+STATUS_HELD = "held"
+STATUS_CONVERTED = "converted"
+STATUS_RELEASED = "released"
+
+DEFAULT_HOLD_SECONDS = 30 * 60
+# Stripe only accepts Checkout Session expiries between 30 minutes and 24 hours.
+MIN_SESSION_SECONDS = 30 * 60
+MAX_SESSION_SECONDS = 24 * 60 * 60
+# Holds outlive the Stripe session by this much so a late webhook still finds them.
+RELEASE_GRACE_SECONDS = 5 * 60
+
+
+class InsufficientStock(Exception):
+	def __init__(self, item_ids: list[int]):
+		super().__init__(f"Not enough stock for items {', '.join(map(str, item_ids))}")
+		self.item_ids = item_ids
+
+
+def hold_seconds() -> int:
+	return int(current_app.config.get("RESERVATION_HOLD_SECONDS", DEFAULT_HOLD_SECONDS))
+
+
+def checkout_expires_at(now: datetime.datetime | None = None) -> datetime.datetime:
+	"""When a checkout started at ``now`` (UTC) expires: the hold length, clamped to what Stripe accepts."""
+	now = now or datetime.datetime.utcnow()
+	seconds = min(max(hold_seconds(), MIN_SESSION_SECONDS), MAX_SESSION_SECONDS)
+	return now + datetime.timedelta(seconds=seconds)
+
+
+def reserve_stock(
+	user_id: int | None,
+	lines,
+	now: datetime.datetime | None = None,
+	session_expires_at: datetime.datetime | None = None,
+) -> str:
+	"""Holds ``[(item_id, quantity)]`` and returns the reservation reference. The caller commits.
+
+	The hold lasts until ``session_expires_at`` (``checkout_expires_at(now)`` by
+	default) plus RELEASE_GRACE_SECONDS; pass the same value to the gateway so
+	the hold never ends before the session can no longer be paid.
+
+	Raises InsufficientStock, after rolling back, when any item lacks available
+	units; no hold is kept in that case. Items without an inventory row are not
+	stock-tracked and are not held.
+	"""
+	now = now or datetime.datetime.utcnow()
+	session_expires_at = session_expires_at or checkout_expires_at(now)
+	quantities: dict[int, int] = {}
+	for item_id, quantity in lines:
+		if quantity > 0:
+			quantities[item_id] = quantities.get(item_id, 0) + quantity
+
+	tracked = set(
+		db.session.execute(select(Inventory.item_id).where(Inventory.item_id.in_(quantities))).scalars()
+	)
+	inventory = Inventory.__table__
+	held, short = [], []
+	# A fixed order keeps concurrent multi-item checkouts from deadlocking on row locks.
+	for item_id in sorted(tracked):
+		quantity = quantities[item_id]
+		updated = db.session.execute(
+			inventory.update()
+			.where(
+				inventory.c.item_id == item_id,
+				inventory.c.stock_quantity - inventory.c.reserved_quantity >= quantity,
+			)
+			.values(reserved_quantity=inventory.c.reserved_quantity + quantity)
+		).rowcount
+		if updated:
+			held.append((item_id, quantity))
+		else:
+			short.append(item_id)
+	if short:
+		db.session.rollback()
+		raise InsufficientStock(short)
+
+	reference = secrets.token_urlsafe(24)
+	if held:
+		expires_at = session_expires_at + datetime.timedelta(seconds=RELEASE_GRACE_SECONDS)
+		db.session.execute(
+			StockReservation.__table__.insert(),
+			[
+				{
+					"reference": reference,
+					"user_id": user_id,
+					"item_id": item_id,
+					"quantity": quantity,
+					"status": STATUS_HELD,
+					"expires_at": expires_at,
+					"created_at": now,
+				}
+				for item_id, quantity in held
+			],
+		)
+	return reference
+
+
+def _finish_holds(rows, status: str) -> int:
+	"""Moves held reservations to ``status`` and gives their units back; returns how many it moved."""
+	reservations = StockReservation.__table__
+	inventory = Inventory.__table__
+	finished = 0
+	for reservation_id, item_id, quantity in rows:
+		# Only the transaction that flips the row out of "held" returns its units,
+		# so the sweeper and a late fulfillment can never both release a hold.
+		claimed = db.session.execute(
+			reservations.update()
+			.where(reservations.c.id == reservation_id, reservations.c.status == STATUS_HELD)
+			.values(status=status)
+		).rowcount
+		if not claimed:
+			continue
+		db.session.execute(
+			inventory.update()
+			.where(inventory.c.item_id == item_id)
+			.values(reserved_quantity=inventory.c.reserved_quantity - quantity)
+		)
+		finished += 1
+	return finished
+
+
+def _held_rows(reference: str):
+	return db.session.execute(
+		select(StockReservation.id, StockReservation.item_id, StockReservation.quantity).where(
+			StockReservation.reference == reference, StockReservation.status == STATUS_HELD
+		)
+	).all()
+
+
+def convert_reservation(reference: str | None) -> int:
+	"""Marks a checkout's holds as sold, inside the fulfillment transaction.
+
+	The held units leave ``reserved_quantity``; the order itself decrements
+	``stock_quantity``, so both change in the same commit.
+	"""
+	if not reference:
+		return 0
+	return _finish_holds(_held_rows(reference), STATUS_CONVERTED)
+
+
+def release_reservation(reference: str | None) -> int:
+	"""Gives a checkout's held units back. The caller commits."""
+	if not reference:
+		return 0
+	return _finish_holds(_held_rows(reference), STATUS_RELEASED)
+
+
+def _references_awaiting_fulfillment() -> set[str]:
+	"""Reservations of paid sessions whose completion event the webhook workers have not applied yet."""
+	from .webhooks import STATUS_DONE
+
+	payloads = db.session.execute(
+		select(WebhookEvent.payload).where(
+			WebhookEvent.event_type == "checkout.session.completed", WebhookEvent.status != STATUS_DONE
+		)
+	).scalars()
+	references = set()
+	for payload in payloads:
+		try:
+			session = json.loads(payload)["data"]["object"]
+		except (ValueError, KeyError, TypeError):
+			continue
+		reference = (session.get("metadata") or {}).get("reservation")
+		if reference:
+			references.add(reference)
+	return references
+
+
+def sweep_expired_reservations(now: datetime.datetime | None = None, batch_size: int = 500) -> int:
+	"""Releases every expired hold, committing once per batch. Returns the number released.
+
+	Holds of sessions with a queued (or failed) ``checkout.session.completed``
+	event are kept, however late the event is: fulfillment converts them.
+	"""
+	now = now or datetime.datetime.utcnow()
+	awaiting = _references_awaiting_fulfillment()
+	query = select(StockReservation.id, StockReservation.item_id, StockReservation.quantity).where(
+		StockReservation.status == STATUS_HELD, StockReservation.expires_at <= now
+	)
+	if awaiting:
+		query = query.where(StockReservation.reference.notin_(awaiting))
+	released = 0
+	while True:
+		rows = db.session.execute(query.order_by(StockReservation.expires_at).limit(batch_size)).all()
+		if not rows:
+			db.session.rollback()
+			return released
+		released += _finish_holds(rows, STATUS_RELEASED)
+		db.session.commit()
@@ -0,0 +1,153 @@
+"""Daily sales rollup maintained incrementally on fulfillment and order status changes.
+
+Days are UTC calendar days, the clock of ``Order.date`` and of the dashboard windows.
+"""
+import datetime
+from collections.abc import Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from .db_models import DailySalesRollup, Item, Order, Ordered_item, db
+
+
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def is_counted_status(status: str | None) -> bool:
+	"""Cancelled orders are kept out of the rollup."""
+	return (status or "").lower() != "cancelled"
+
+
+def apply_sales(day: datetime.date, lines: Iterable[tuple[int, int, float]], sign: int = 1) -> None:
+	"""Adds (sign=1) or subtracts (sign=-1) one order's (item_id, quantity, revenue) lines for ``day``.
+
+	The increments are computed by the database (``units = units + :units``),
+	so concurrent webhook workers never lose an update; new (day, item) rows
+	are inserted with ON CONFLICT DO UPDATE where the dialect supports it.
+	The caller commits.
+	"""
+	totals: dict[int, list[float]] = {}
+	for item_id, quantity, revenue in lines:
+		entry = totals.setdefault(item_id, [0, 0.0])
+		entry[0] += quantity
+		entry[1] += revenue
+	if not totals:
+		return
+
+	rows = [
+		{"day": day, "item_id": item_id, "units": sign * units, "revenue": sign * revenue, "orders": sign}
+		for item_id, (units, revenue) in totals.items()
+	]
+	if sign < 0:
+		# Nothing to take away from a day and item that were never counted.
+		_increment(rows)
+		return
+
+	dialect = db.session.get_bind().dialect.name
+	if dialect in _UPSERT_INSERTS:
+		table = DailySalesRollup.__table__
+		statement = _UPSERT_INSERTS[dialect](table)
+		statement = statement.on_conflict_do_update(
+			index_elements=[table.c.day, table.c.item_id],
+			set_={
+				"units": table.c.units + statement.excluded.units,
+				"revenue": table.c.revenue + statement.excluded.revenue,
+				"orders": table.c.orders + statement.excluded.orders,
+			},
+		)
+		db.session.execute(statement, rows)
+		return
+
+	missing = [row for row, updated in zip(rows, _increment(rows)) if not updated]
+	if missing:
+		try:
+			with db.session.begin_nested():
+				db.session.execute(DailySalesRollup.__table__.insert(), missing)
+		except IntegrityError:
+			# Another worker inserted the same day and item first; add to its row instead.
+			_increment(missing)
+
+
+def _increment(rows: list[dict]) -> list[bool]:
+	"""Adds each row's deltas to its existing (day, item) row; returns whether each one existed."""
+	table = DailySalesRollup.__table__
+	statement = (
+		table.update()
+		.where(table.c.day == db.bindparam("b_day"), table.c.item_id == db.bindparam("b_item_id"))
+		.values(
+			units=table.c.units + db.bindparam("b_units"),
+			revenue=table.c.revenue + db.bindparam("b_revenue"),
+			orders=table.c.orders + db.bindparam("b_orders"),
+		)
+	)
+	return [
+		db.session.execute(statement, {f"b_{key}": value for key, value in row.items()}).rowcount > 0
+		for row in rows
+	]
+
+
+def _order_lines(order_id: int) -> list[tuple[int, int, float]]:
+	revenue = func.coalesce(Ordered_item.price_at_purchase, Item.price, 0) * Ordered_item.quantity
+	return [
+		(item_id, quantity, float(line_revenue))
+		for item_id, quantity, line_revenue in db.session.query(Ordered_item.itemid, Ordered_item.quantity, revenue)
+		.outerjoin(Item, Item.id == Ordered_item.itemid)
+		.filter(Ordered_item.oid == order_id)
+	]
+
+
+def apply_order(order: Order, sign: int = 1) -> None:
+	apply_sales(order.date.date(), _order_lines(order.id), sign)
+
+
+def apply_status_change(order: Order, old_status: str | None, new_status: str | None) -> None:
+	"""Keeps the rollup in step when an order moves into or out of a cancelled status."""
+	was_counted = is_counted_status(old_status)
+	now_counted = is_counted_status(new_status)
+	if was_counted != now_counted:
+		apply_order(order, 1 if now_counted else -1)
+
+
+def sales_by_day_select():
+	"""(day, item_id, units, revenue, orders) per day and item over the order history, cancelled orders excluded."""
+	revenue = func.coalesce(Ordered_item.price_at_purchase, Item.price, 0) * Ordered_item.quantity
+	day = func.date(Order.date)
+	return (
+		select(
+			day.label("day"),
+			Ordered_item.itemid.label("item_id"),
+			func.sum(Ordered_item.quantity).label("units"),
+			func.sum(revenue).label("revenue"),
+			func.count(func.distinct(Order.id)).label("orders"),
+		)
+		.select_from(Ordered_item)
+		.join(Order, Order.id == Ordered_item.oid)
+		.outerjoin(Item, Item.id == Ordered_item.itemid)
+		.where(func.lower(Order.status) != "cancelled")
+		.group_by(day, Ordered_item.itemid)
+	)
+
+
+def rebuild_daily_sales_rollup() -> int:
+	"""Recomputes the whole rollup from the order history. Returns the number of rows written."""
+	rows = db.session.execute(sales_by_day_select()).all()
+
+	DailySalesRollup.query.delete(synchronize_session=False)
+	if rows:
+		db.session.execute(
+			DailySalesRollup.__table__.insert(),
+			[
+				{
+					"day": value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value)),
+					"item_id": item_id,
+					"units": int(units or 0),
+					"revenue": float(line_revenue or 0),
+					"orders": int(orders),
+				}
+				for value, item_id, units, line_revenue, orders in rows
+			],
+		)
+	db.session.commit()
+	return len(rows)
@@ -0,0 +1,200 @@
+"""Full-text search over item name, category and details.
+
+SQLite databases use an FTS5 virtual table (``items_fts``) whose rowid is the
+item id. Other backends, or SQLite builds without FTS5, use the tokenized
+``search_tokens`` table. Both indexes are written in the same transaction as
+the item change, by the admin routes that create, edit or delete items.
+"""
+import re
+
+from flask import current_app
+from sqlalchemy import event, func, literal, text, union_all
+
+from .db_models import Item, SearchToken, db
+
+
+FTS_TABLE = "items_fts"
+FIELD_WEIGHTS = {"name": 10, "category": 5, "details": 1}
+MAX_QUERY_TERMS = 8
+MAX_TOKEN_LENGTH = 64
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_fts5_support: dict[str, bool] = {}
+
+
+def tokenize(value) -> list[str]:
+	if not value:
+		return []
+	return [token[:MAX_TOKEN_LENGTH] for token in _TOKEN_RE.findall(str(value).lower())]
+
+
+def _sqlite_has_fts5(connection) -> bool:
+	if connection.dialect.name != "sqlite":
+		return False
+	key = str(connection.engine.url)
+	if key not in _fts5_support:
+		supported = connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar()
+		_fts5_support[key] = bool(supported)
+	return _fts5_support[key]
+
+
+def _create_fts_table(connection) -> None:
+	if _sqlite_has_fts5(connection):
+		connection.exec_driver_sql(
+			f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+			"USING fts5(name, category, details, tokenize='unicode61 remove_diacritics 2')"
+		)
+
+
+@event.listens_for(Item.__table__, "after_create")
+def _after_items_created(target, connection, **kw):
+	_create_fts_table(connection)
+
+
+@event.listens_for(Item.__table__, "before_drop")
+def _before_items_dropped(target, connection, **kw):
+	if connection.dialect.name == "sqlite":
+		connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def uses_fts() -> bool:
+	backend = current_app.config.get("SEARCH_BACKEND", "auto")
+	if backend == "tokens":
+		return False
+	return _sqlite_has_fts5(db.session.connection())
+
+
+def index_items(items) -> None:
+	"""(Re)indexes the given items; call after flush so new items have ids."""
+	items = [item for item in items if item.id is not None]
+	if not items:
+		return
+	remove_items([item.id for item in items])
+
+	if uses_fts():
+		db.session.execute(
+			text(f"INSERT INTO {FTS_TABLE} (rowid, name, category, details) VALUES (:id, :name, :category, :details)"),
+			[
+				{"id": item.id, "name": item.name, "category": item.category, "details": item.details}
+				for item in items
+			],
+		)
+		return
+
+	rows = []
+	for item in items:
+		weights: dict[str, int] = {}
+		for field, weight in FIELD_WEIGHTS.items():
+			for token in tokenize(getattr(item, field)):
+				weights[token] = weights.get(token, 0) + weight
+		rows.extend({"item_id": item.id, "token": token, "weight": weight} for token, weight in weights.items())
+	if rows:
+		db.session.execute(SearchToken.__table__.insert(), rows)
+
+
+def index_item(item: Item) -> None:
+	index_items([item])
+
+
+def remove_items(item_ids) -> None:
+	item_ids = list(item_ids)
+	if not item_ids:
+		return
+	if uses_fts():
+		params = {f"id{i}": item_id for i, item_id in enumerate(item_ids)}
+		placeholders = ", ".join(f":{name}" for name in params)
+		db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})"), params)
+	else:
+		SearchToken.query.filter(SearchToken.item_id.in_(item_ids)).delete(synchronize_session=False)
+
+
+def rebuild_search_index(batch_size: int = 1000) -> int:
+	"""Drops and refills the active index from the items table. Returns the number of items indexed."""
+	if uses_fts():
+		db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+	else:
+		SearchToken.query.delete(synchronize_session=False)
+
+	indexed = 0
+	last_id = 0
+	while True:
+		batch = Item.query.filter(Item.id > last_id).order_by(Item.id.asc()).limit(batch_size).all()
+		if not batch:
+			break
+		index_items(batch)
+		indexed += len(batch)
+		last_id = batch[-1].id
+	db.session.commit()
+	return indexed
+
+
+def ensure_search_index() -> None:
+	"""Creates the FTS table for existing databases and backfills the index when it is out of step."""
+	connection = db.session.connection()
+	_create_fts_table(connection)
+
+	item_count = Item.query.count()
+	if uses_fts():
+		indexed = db.session.execute(text(f"SELECT COUNT(*) FROM {FTS_TABLE}")).scalar()
+	else:
+		indexed = db.session.query(func.count(func.distinct(SearchToken.item_id))).scalar()
+	if indexed != item_count:
+		rebuild_search_index()
+
+
+def _fts_match_expression(terms: list[str]) -> str:
+	return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def _ranked_ids_fts(terms: list[str], limit: int, offset: int) -> list[int]:
+	weights = ", ".join(str(float(weight)) for weight in FIELD_WEIGHTS.values())
+	result = db.session.execute(
+		text(
+			f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+			f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT :limit OFFSET :offset"
+		),
+		{"match": _fts_match_expression(terms), "limit": limit, "offset": offset},
+	)
+	return [row[0] for row in result]
+
+
+def _ranked_ids_tokens(terms: list[str], limit: int, offset: int) -> list[int]:
+	matches = union_all(
+		*(
+			db.select(
+				SearchToken.item_id.label("item_id"),
+				literal(position).label("term"),
+				SearchToken.weight.label("weight"),
+			).where(SearchToken.token.like(f"{term}%"))
+			for position, term in enumerate(terms)
+		)
+	).subquery()
+	statement = (
+		db.select(matches.c.item_id)
+		.group_by(matches.c.item_id)
+		.having(func.count(func.distinct(matches.c.term)) == len(terms))
+		.order_by(func.sum(matches.c.weight).desc(), matches.c.item_id)
+		.limit(limit)
+		.offset(offset)
+	)
+	return list(db.session.execute(statement).scalars())
+
+
+def search_items(query: str, page: int = 1, per_page: int = 20):
+	"""Returns a ranked page of items matching every term of ``query`` and whether a next page exists."""
+	terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+	if not terms:
+		return [], False
+
+	offset = (max(page, 1) - 1) * per_page
+	if uses_fts():
+		ids = _ranked_ids_fts(terms, per_page + 1, offset)
+	else:
+		ids = _ranked_ids_tokens(terms, per_page + 1, offset)
+
+	has_next = len(ids) > per_page
+	ids = ids[:per_page]
+	if not ids:
+		return [], False
+	items_by_id = {item.id: item for item in Item.query.filter(Item.id.in_(ids)).all()}
+	return [items_by_id[item_id] for item_id in ids if item_id in items_by_id], has_next
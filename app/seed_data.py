@@ -1,4 +1,8 @@
-"""Seed data used to hydrate the dev database when it is empty."""
+"""Seed data for development databases, loaded by ``flask seed``."""
+from werkzeug.security import generate_password_hash
+
+from .db_models import Inventory, Item, User, db
+
 
 DEFAULT_ITEMS = [
 	{
@@ -57,3 +61,56 @@ DEFAULT_ITEMS = [
 	},
 ]
 
+
+def seed_default_items() -> int:
+	"""Adds DEFAULT_ITEMS with their inventory when the catalog is empty; returns how many were added."""
+	if Item.query.first() is not None:
+		return 0
+	for item_data in DEFAULT_ITEMS:
+		inventory_data = item_data.get("inventory", {})
+		item = Item(
+			name=item_data["name"],
+			price=item_data["price"],
+			category=item_data["category"],
+			image=item_data["image"],
+			details=item_data["details"],
+			price_id=item_data["price_id"],
+		)
+		db.session.add(item)
+		db.session.flush()
+
+		db.session.add(
+			Inventory(
+				item=item,
+				stock_quantity=inventory_data.get("stock_quantity", 0),
+				low_stock_threshold=inventory_data.get("low_stock_threshold", 0),
+				is_published=inventory_data.get("is_published", True),
+			)
+		)
+	return len(DEFAULT_ITEMS)
+
+
+def seed_default_admin() -> bool:
+	"""Create a default admin user if no admin exists. Returns True if admin was created."""
+	if User.query.filter_by(admin=True).first():
+		return False
+
+	admin_user = User(
+		name="Admin",
+		email="admin@example.com",
+		password=generate_password_hash("admin", method="pbkdf2:sha256", salt_length=8),
+		phone="0000000000",
+		admin=True,
+		email_confirmed=True,
+	)
+	db.session.add(admin_user)
+	return True
+
+
+def seed_database() -> tuple[int, bool]:
+	"""Seeds the demo catalog and the default admin, committing once. Safe to run again."""
+	items_added = seed_default_items()
+	admin_created = seed_default_admin()
+	if items_added or admin_created:
+		db.session.commit()
+	return items_added, admin_created
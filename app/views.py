@@ -0,0 +1,430 @@
+"""Storefront views, registered on the app by ``create_app``."""
+import calendar
+import json
+import os
+from datetime import datetime
+
+from flask import abort, current_app, flash, make_response, redirect, render_template, request, url_for
+from flask_login import current_user, login_required, login_user, logout_user
+from itsdangerous import URLSafeTimedSerializer
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .cart import checkout_lines, get_cart_view, invalidate_cart_view
+from .cart_codec import CartTooLarge
+from .catalog import clamp_page_size, get_item, get_items, published_items_page
+from .db_models import Order, User, db
+from .forms import LoginForm, RegisterForm
+from .funcs import (
+	add_to_cart_cookie,
+    clear_cart_cookies,
+    get_cart_combined,
+    get_cart_from_localstorage,
+    get_cart_items_count,
+    positive_quantity,
+    remove_from_cart_cookie,
+    save_cart_to_cookies,
+	send_confirmation_email,
+	sync_cart_cookie_to_db,
+	sync_localstorage_to_cookies,
+)
+from .payments import PaymentError, get_gateway
+from .principals import get_principal
+from .reservations import InsufficientStock, checkout_expires_at, release_reservation, reserve_stock
+from .search import search_items
+from .webhooks import enqueue_event, is_processed
+
+
+_routes = []
+
+
+def route(rule: str, **options):
+    """Collects a storefront view; ``register_views`` adds it to an app under the function's name."""
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
+
+
+def register_views(app, login_manager) -> None:
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.before_request(reset_cart_view)
+    app.context_processor(inject_now)
+    login_manager.user_loader(load_user)
+
+
+def reset_cart_view():
+    # g belongs to the app context, which can outlive a single request (tests, CLI).
+    invalidate_cart_view()
+
+
+def inject_now():
+    """sends datetime to templates as 'now' and cart items count"""
+    cart_count = get_cart_items_count()
+    return {"now": datetime.utcnow(), "cart_items_count": cart_count}
+
+
+def load_user(user_id):
+    return get_principal(user_id)
+
+
+@route("/")
+def home():
+    after = request.args.get("after", type=int)
+    limit = clamp_page_size(request.args.get("limit"), current_app.config["CATALOG_PAGE_SIZE"])
+    items, next_after = published_items_page(after=after, limit=limit)
+    return render_template(
+        "home.html", items=items, after=after, next_after=next_after, limit=limit
+    )
+
+
+@route("/login", methods=["POST", "GET"])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for("home"))
+    form = LoginForm()
+    if form.validate_on_submit():
+        email = form.email.data
+        user = User.query.filter_by(email=email).first()
+        if user == None:
+            flash(
+                f'User with email {email} doesn\'t exist!<br> <a href={url_for("register")}>Register now!</a>',
+                "error",
+            )
+            return redirect(url_for("login"))
+        elif check_password_hash(user.password, form.password.data):
+            login_user(user)
+            # Synchroniser le panier cookie vers la DB
+            if sync_cart_cookie_to_db(user):
+                # Si un panier a été synchronisé, supprimer le cookie et informer l'utilisateur
+                flash("Votre panier a été synchronisé avec votre compte!", "success")
+                response = make_response(redirect(url_for("home")))
+                return clear_cart_cookies(response)
+            return redirect(url_for("home"))
+        else:
+            flash("Email and password incorrect!!", "error")
+            return redirect(url_for("login"))
+    return render_template("login.html", form=form)
+
+
+@route("/register", methods=["POST", "GET"])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for("home"))
+    form = RegisterForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(email=form.email.data).first()
+        if user:
+            flash(
+                f"User with email {user.email} already exists!!<br> <a href={url_for('login')}>Login now!</a>",
+                "error",
+            )
+            return redirect(url_for("register"))
+        new_user = User(
+            name=form.name.data,
+            email=form.email.data,
+            password=generate_password_hash(
+                form.password.data, method="pbkdf2:sha256", salt_length=8
+            ),
+            phone=form.phone.data,
+        )
+        db.session.add(new_user)
+        db.session.commit()
+        # send_confirmation_email(new_user.email)
+        flash("Thanks for registering! You may login now.", "success")
+        return redirect(url_for("login"))
+    return render_template("register.html", form=form)
+
+
+@route("/confirm/<token>")
+def confirm_email(token):
+    try:
+        confirm_serializer = URLSafeTimedSerializer(current_app.config["SECRET_KEY"])
+        email = confirm_serializer.loads(
+            token, salt="email-confirmation-salt", max_age=3600
+        )
+    except:
+        flash("The confirmation link is invalid or has expired.", "error")
+        return redirect(url_for("login"))
+    user = User.query.filter_by(email=email).first()
+    if user.email_confirmed:
+        flash(f"Account already confirmed. Please login.", "success")
+    else:
+        user.email_confirmed = True
+        db.session.add(user)
+        db.session.commit()
+        flash("Email address successfully confirmed!", "success")
+    return redirect(url_for("login"))
+
+
+@route("/logout")
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for("login"))
+
+
+@route("/resend")
+@login_required
+def resend():
+    send_confirmation_email(current_user.email)
+    logout_user()
+    flash("Confirmation email sent successfully.", "success")
+    return redirect(url_for("login"))
+
+
+@route("/add/<id>", methods=["POST"])
+def add_to_cart(id):
+    item = get_item(int(id)) if str(id).isdigit() else None
+    if not item:
+        flash("Item not found!", "error")
+        return redirect(url_for("home"))
+    
+    if request.method == "POST":
+        quantity = positive_quantity(request.form.get("quantity"))
+        if quantity is None:
+            flash("Quantity must be a positive whole number.", "error")
+            return redirect(url_for("item", id=item.id))
+        
+        if current_user.is_authenticated:
+            # Utilisateur connecté : utiliser la DB
+            current_user.get_user().add_to_cart(id, quantity)
+            invalidate_cart_view()
+            flash(
+                f"""{item.name} successfully added to the <a href=cart>cart</a>.<br> <a href={url_for("cart")}>view cart!</a>""",
+                "success",
+            )
+            return redirect(url_for("home"))
+        else:
+            # Utilisateur non connecté : utiliser les cookies (ou localStorage si cookies désactivés)
+            cart = add_to_cart_cookie(id, quantity)
+            # Si localStorage est présent, le fusionner
+            cart_localstorage = get_cart_from_localstorage()
+            if cart_localstorage:
+                from .funcs import merge_carts
+                cart = merge_carts(cart, cart_localstorage)
+            
+            response = make_response(redirect(url_for("home")))
+            # Essayer de sauvegarder dans les cookies
+            try:
+                response = save_cart_to_cookies(response, cart)
+            except CartTooLarge as exc:
+                flash(str(exc), "error")
+                return redirect(url_for("cart"))
+            except:
+                # Si les cookies ne fonctionnent pas, on laisse le client gérer avec localStorage
+                pass
+            flash(
+                f"""{item.name} successfully added to the <a href=cart>cart</a>.<br> <a href={url_for("cart")}>view cart!</a>""",
+                "success",
+            )
+            return response
+
+
+@route("/cart")
+def cart():
+    cart_view = get_cart_view()
+    return render_template(
+        "cart.html",
+        items=cart_view.items,
+        price=cart_view.total,
+        quantity=cart_view.quantities,
+    )
+
+
+@route("/orders")
+@login_required
+def orders():
+    return render_template("orders.html", orders=Order.query.filter_by(uid=current_user.id).all())
+
+
+@route("/remove/<id>/<quantity>")
+def remove(id, quantity):
+    quantity = positive_quantity(quantity)
+    if quantity is None or not str(id).isdigit():
+        flash("Quantity must be a positive whole number.", "error")
+        return redirect(url_for("cart"))
+    if current_user.is_authenticated:
+        # Utilisateur connecté : utiliser la DB
+        current_user.get_user().remove_from_cart(id, quantity)
+        invalidate_cart_view()
+        return redirect(url_for("cart"))
+    else:
+        # Utilisateur non connecté : utiliser les cookies (ou localStorage)
+        cart = remove_from_cart_cookie(id, quantity)
+        # Si localStorage est présent, le fusionner
+        cart_localstorage = get_cart_from_localstorage()
+        if cart_localstorage:
+            from .funcs import merge_carts
+            cart = merge_carts(cart, cart_localstorage)
+        
+        response = make_response(redirect(url_for("cart")))
+        # Essayer de sauvegarder dans les cookies
+        try:
+            response = save_cart_to_cookies(response, cart)
+        except:
+            # Si les cookies ne fonctionnent pas, on laisse le client gérer avec localStorage
+            pass
+        return response
+
+
+@route("/item/<int:id>")
+def item(id):
+    item = get_item(id)
+    if item is None:
+        abort(404)
+    return render_template("item.html", item=item)
+
+
+@route("/cgu")
+def cgu():
+    """Page des conditions générales d'utilisation"""
+    return render_template("cgu.html")
+
+
+@route("/spydeweb")
+def spydeweb():
+    """Page de présentation de Spy de web"""
+    return render_template("spydeweb.html")
+
+
+@route("/search")
+def search():
+    query = request.args["query"]
+    page = max(request.args.get("page", 1, type=int), 1)
+    items, has_next = search_items(query, page=page, per_page=current_app.config["SEARCH_PAGE_SIZE"])
+    return render_template(
+        "home.html", items=items, search=True, query=query, page=page, has_next=has_next
+    )
+
+
+# stripe stuffs
+@route("/payment_success")
+def payment_success():
+    return render_template("success.html")
+
+
+@route("/payment_failure")
+def payment_failure():
+    return render_template("failure.html")
+
+
+@route("/create-checkout-session", methods=["POST"])
+def create_checkout_session():
+    # Nécessite une authentification pour passer à la caisse
+    if not current_user.is_authenticated:
+        flash(
+            f'Vous devez vous connecter pour passer à la caisse!<br> <a href={url_for("login")}>Connexion</a>',
+            "error",
+        )
+        return redirect(url_for("login"))
+    
+    # In development without Stripe config, disable checkout gracefully
+    if current_app.config.get("STRIPE_DISABLED"):
+        flash("Payments are disabled (Stripe not configured).", "error")
+        return redirect(url_for("payment_failure"))
+
+    lines = checkout_lines(current_user.id)
+    if not lines:
+        flash("Cart is empty!", "error")
+        return redirect(url_for("cart"))
+
+    # One expiry for both the Stripe session and the stock hold (which adds its grace period).
+    expires_at = checkout_expires_at()
+    try:
+        reservation = reserve_stock(
+            current_user.id, [(line.item_id, line.quantity) for line in lines], session_expires_at=expires_at
+        )
+        db.session.commit()
+    except InsufficientStock as exc:
+        names = ", ".join(item.name for item in get_items(exc.item_ids).values())
+        flash(f"Not enough stock left for: {names}", "error")
+        return redirect(url_for("cart"))
+
+    try:
+        checkout_session = get_gateway().create_checkout_session(
+            client_reference_id=current_user.id,
+            line_items=[{"price": line.price_id, "quantity": line.quantity} for line in lines],
+            metadata={"reservation": reservation},
+            expires_at=calendar.timegm(expires_at.utctimetuple()),
+            success_url=url_for("payment_success", _external=True),
+            cancel_url=url_for("payment_failure", _external=True),
+        )
+    except Exception as exc:
+        release_reservation(reservation)
+        db.session.commit()
+        if not isinstance(exc, PaymentError):
+            raise
+        flash(str(exc), "error")
+        return redirect(url_for("payment_failure"))
+    return redirect(checkout_session.url, code=303)
+
+
+@route("/stripe-webhook", methods=["POST"])
+def stripe_webhook():
+    # In development without Stripe config, acknowledge and exit
+    if current_app.config.get("STRIPE_DISABLED"):
+        return {}, 200
+
+    if request.content_length > 1024 * 1024:
+        print("Request too big!")
+        abort(400)
+
+    payload = request.get_data()
+    sig_header = request.environ.get("HTTP_STRIPE_SIGNATURE")
+    ENDPOINT_SECRET = os.environ.get("ENDPOINT_SECRET")
+    event = None
+
+    import stripe
+
+    try:
+        event = stripe.Webhook.construct_event(payload, sig_header, ENDPOINT_SECRET)
+    except ValueError as e:
+        # Invalid payload
+        return {}, 400
+    except stripe.error.SignatureVerificationError as e:
+        # Invalid signature
+        return {}, 400
+
+    # Passed signature verification: replays of handled events stop here, new ones are
+    # queued for the webhook workers and acknowledged right away
+    if not is_processed(event["id"]):
+        enqueue_event(event["id"], event["type"], payload.decode("utf-8"))
+    return {}, 200
+
+
+# API endpoints pour localStorage
+@route("/api/sync-cart", methods=["POST"])
+def api_sync_cart():
+    """Endpoint API pour synchroniser le panier localStorage avec les cookies"""
+    if current_user.is_authenticated:
+        return {"error": "User is authenticated, use DB"}, 400
+    
+    try:
+        cart_data = request.get_json()
+        if not cart_data:
+            cart_data = {}
+        
+        # Synchroniser localStorage vers cookies
+        merged_cart = sync_localstorage_to_cookies(cart_data)
+        
+        # Sauvegarder dans les cookies
+        response = make_response(json.dumps({"success": True, "cart": merged_cart}))
+        response.headers["Content-Type"] = "application/json"
+        response = save_cart_to_cookies(response, merged_cart)
+        
+        return response
+    except Exception as e:
+        return json.dumps({"error": str(e)}), 400
+
+
+@route("/api/get-cart", methods=["GET"])
+def api_get_cart():
+    """Endpoint API pour récupérer le panier (cookies ou localStorage)"""
+    if current_user.is_authenticated:
+        # Retourner le panier depuis la DB
+        return json.dumps({"cart": get_cart_view().as_dict()})
+    else:
+        # Retourner le panier depuis cookies ou localStorage
+        cart = get_cart_combined()
+        return json.dumps({"cart": cart})
@@ -0,0 +1,216 @@
+"""Durable queue for verified Stripe webhook events.
+
+``/stripe-webhook`` only verifies the signature and stores the event; worker
+threads started by ``flask webhook-worker`` claim queued events, run their
+handler and retry failures with exponential backoff.
+
+Handled events are recorded in the ``processed_webhook_events`` ledger in the
+same transaction as their side effects, and a process-local LRU cache in front
+of the ledger answers replays without a database round-trip.
+"""
+import datetime
+import json
+import logging
+import threading
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from .cache import LRUCache
+from .db_models import ProcessedWebhookEvent, WebhookEvent, db
+from .funcs import fulfill_order
+from .reservations import release_reservation
+
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+MAX_ATTEMPTS = 8
+BASE_BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 60 * 60
+# A worker that dies mid-event leaves it "processing"; it is claimable again after this lease.
+PROCESSING_LEASE_SECONDS = 5 * 60
+
+_processed_cache = LRUCache(maxsize=10_000)
+
+
+def _handle_checkout_completed(event: dict) -> None:
+	fulfill_order(event["data"]["object"])
+
+
+def _handle_checkout_expired(event: dict) -> None:
+	release_reservation((event["data"]["object"].get("metadata") or {}).get("reservation"))
+
+
+EVENT_HANDLERS = {
+	"checkout.session.completed": _handle_checkout_completed,
+	"checkout.session.expired": _handle_checkout_expired,
+}
+
+
+def is_processed(event_id: str) -> bool:
+	"""True when the event's side effects are already committed."""
+	if _processed_cache.get(event_id):
+		return True
+	processed = (
+		db.session.query(ProcessedWebhookEvent.id)
+		.filter(ProcessedWebhookEvent.event_id == event_id)
+		.first()
+		is not None
+	)
+	if processed:
+		_processed_cache.set(event_id, True)
+	return processed
+
+
+def enqueue_event(event_id: str, event_type: str, payload: str) -> bool:
+	"""Stores a verified event. Returns False when the event id is already queued."""
+	db.session.add(WebhookEvent(event_id=event_id, event_type=event_type, payload=payload))
+	try:
+		db.session.commit()
+	except IntegrityError:
+		db.session.rollback()
+		return False
+	return True
+
+
+def backoff_seconds(attempts: int) -> int:
+	return min(BASE_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), MAX_BACKOFF_SECONDS)
+
+
+def claim_next(now: datetime.datetime | None = None) -> WebhookEvent | None:
+	"""Atomically moves the oldest due event to "processing" and returns it."""
+	now = now or datetime.datetime.utcnow()
+	lease_expired = now - datetime.timedelta(seconds=PROCESSING_LEASE_SECONDS)
+	claimable = or_(
+		(WebhookEvent.status == STATUS_PENDING) & (WebhookEvent.next_attempt_at <= now),
+		(WebhookEvent.status == STATUS_PROCESSING) & (WebhookEvent.updated_at <= lease_expired),
+	)
+	while True:
+		candidate = (
+			db.session.query(WebhookEvent.id, WebhookEvent.status, WebhookEvent.updated_at)
+			.filter(claimable)
+			.order_by(WebhookEvent.next_attempt_at, WebhookEvent.id)
+			.first()
+		)
+		if candidate is None:
+			db.session.rollback()
+			return None
+
+		claimed = (
+			WebhookEvent.query.filter(
+				WebhookEvent.id == candidate.id,
+				WebhookEvent.status == candidate.status,
+				WebhookEvent.updated_at == candidate.updated_at,
+			)
+			.update(
+				{
+					WebhookEvent.status: STATUS_PROCESSING,
+					WebhookEvent.attempts: WebhookEvent.attempts + 1,
+					WebhookEvent.updated_at: now,
+				},
+				synchronize_session=False,
+			)
+		)
+		db.session.commit()
+		if claimed:
+			return db.session.get(WebhookEvent, candidate.id)
+		# Another worker claimed it first; look for the next one.
+
+
+def process_event(queued: WebhookEvent) -> bool:
+	"""Runs the handler for a claimed event. Returns True on success.
+
+	The event is marked done and added to the ledger in the same transaction
+	as the handler's writes, so a crash cannot leave an order fulfilled but its
+	event still queued, and a duplicate delivery cannot be applied twice.
+	"""
+	queued_id = queued.id
+	event_id = queued.event_id
+	if is_processed(event_id):
+		queued.status = STATUS_DONE
+		db.session.commit()
+		return True
+
+	queued.status = STATUS_DONE
+	queued.last_error = None
+	db.session.add(ProcessedWebhookEvent(event_id=event_id, event_type=queued.event_type))
+	try:
+		db.session.flush()
+	except IntegrityError:
+		# The ledger already holds this event: another delivery won the race.
+		db.session.rollback()
+		queued = db.session.get(WebhookEvent, queued_id)
+		queued.status = STATUS_DONE
+		db.session.commit()
+		_processed_cache.set(event_id, True)
+		return True
+
+	handler = EVENT_HANDLERS.get(queued.event_type)
+	try:
+		if handler is not None:
+			handler(json.loads(queued.payload))
+		db.session.commit()
+	except Exception as exc:
+		db.session.rollback()
+		logger.exception("Webhook event %s failed", event_id)
+		queued = db.session.get(WebhookEvent, queued_id)
+		queued.last_error = f"{type(exc).__name__}: {exc}"[:2000]
+		if queued.attempts >= MAX_ATTEMPTS:
+			queued.status = STATUS_FAILED
+		else:
+			queued.status = STATUS_PENDING
+			queued.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(
+				seconds=backoff_seconds(queued.attempts)
+			)
+		db.session.commit()
+		return False
+
+	_processed_cache.set(event_id, True)
+	return True
+
+
+def drain(limit: int | None = None) -> int:
+	"""Processes due events until the queue is empty or ``limit`` is reached. Returns the number handled."""
+	handled = 0
+	while limit is None or handled < limit:
+		queued = claim_next()
+		if queued is None:
+			break
+		process_event(queued)
+		handled += 1
+	return handled
+
+
+def run_worker(app, stop: threading.Event, poll_interval: float = 1.0) -> None:
+	with app.app_context():
+		while not stop.is_set():
+			try:
+				handled = drain(limit=100)
+			except Exception:
+				logger.exception("Webhook worker loop failed")
+				handled = 0
+			finally:
+				db.session.remove()
+			if not handled:
+				stop.wait(poll_interval)
+
+
+def start_workers(app, count: int, poll_interval: float = 1.0) -> tuple[list[threading.Thread], threading.Event]:
+	stop = threading.Event()
+	threads = [
+		threading.Thread(
+			target=run_worker,
+			args=(app, stop, poll_interval),
+			name=f"webhook-worker-{index}",
+			daemon=True,
+		)
+		for index in range(count)
+	]
+	for thread in threads:
+		thread.start()
+	return threads, stop
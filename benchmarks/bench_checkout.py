@@ -0,0 +1,80 @@
+"""Latency of POST /create-checkout-session against the in-process fake payment gateway.
+
+Usage: python benchmarks/bench_checkout.py [--lines N] [--requests N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("FLASK_DEBUG", "1")
+# create_app() reads DB_URI, so point it at a scratch database.
+_TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DB_URI"] = f"sqlite:///{_TMP_DIR.name}/bench.sqlite"
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.db_models import Cart, Inventory, Item, User, db  # noqa: E402
+from app.payments import FakeGateway, get_gateway  # noqa: E402
+
+
+def _create_buyer(lines: int) -> str:
+	user = User(
+		name="Bench buyer",
+		email="bench-buyer@example.com",
+		phone="000",
+		password=generate_password_hash("bench-pass", method="pbkdf2:sha256", salt_length=8),
+	)
+	items = [
+		Item(name=f"Item {i}", price=1.0, category="Bench", image="/x.png", details="d", price_id=f"p{i}")
+		for i in range(lines)
+	]
+	db.session.add(user)
+	db.session.add_all(items)
+	db.session.flush()
+	db.session.add_all(Inventory(item=item, stock_quantity=1_000_000_000) for item in items)
+	db.session.add_all(Cart(uid=user.id, itemid=item.id, quantity=1) for item in items)
+	db.session.commit()
+	return user.email
+
+
+def run(lines: int, requests: int) -> None:
+	with _TMP_DIR:
+		app = create_app({"TESTING": True, "WTF_CSRF_ENABLED": False, "PAYMENT_GATEWAY": FakeGateway.name})
+		client = app.test_client()
+		with app.app_context():
+			db.create_all()
+			email = _create_buyer(lines)
+			gateway = get_gateway()
+		client.post("/login", data={"email": email, "password": "bench-pass"})
+
+		timings = []
+		for _ in range(requests):
+			start = time.perf_counter()
+			response = client.post("/create-checkout-session")
+			timings.append(time.perf_counter() - start)
+			assert response.status_code == 303, response.get_data(as_text=True)
+		assert len(gateway.sessions) == requests
+
+		timings.sort()
+		print(f"{lines} cart lines, {requests} checkouts")
+		print(f"mean {statistics.mean(timings) * 1000:.2f} ms")
+		print(f"p50  {timings[len(timings) // 2] * 1000:.2f} ms")
+		print(f"p95  {timings[int(len(timings) * 0.95) - 1] * 1000:.2f} ms")
+
+		with app.app_context():
+			db.session.remove()
+			db.engine.dispose()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--lines", type=int, default=20)
+	parser.add_argument("--requests", type=int, default=200)
+	args = parser.parse_args()
+	run(args.lines, args.requests)
@@ -0,0 +1,79 @@
+"""Commit count and latency of fulfill_order for 1, 10 and 100-line carts.
+
+Usage: python benchmarks/bench_fulfill_order.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("FLASK_DEBUG", "1")
+# create_app() reads DB_URI, so point it at a scratch database.
+_TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DB_URI"] = f"sqlite:///{_TMP_DIR.name}/bench.sqlite"
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.db_models import Cart, Inventory, Item, User, db  # noqa: E402
+from app.funcs import fulfill_order  # noqa: E402
+
+
+CART_SIZES = (1, 10, 100)
+
+
+def _fill_cart(user_id: int, items: list[Item], size: int) -> None:
+	db.session.execute(
+		Cart.__table__.insert(),
+		[{"uid": user_id, "itemid": item.id, "quantity": 1} for item in items[:size]],
+	)
+	db.session.commit()
+
+
+def run(repeat: int) -> None:
+	with _TMP_DIR:
+		app = create_app()
+		with app.app_context():
+			db.create_all()
+			user = User(name="Bench", email="bench@example.com", phone="000", password="x")
+			db.session.add(user)
+			items = [
+				Item(name=f"Item {i}", price=1.0 + i, category="Bench", image="/x.png", details="d", price_id=f"p{i}")
+				for i in range(max(CART_SIZES))
+			]
+			db.session.add_all(items)
+			db.session.flush()
+			db.session.add_all(Inventory(item=item, stock_quantity=1_000_000) for item in items)
+			db.session.commit()
+
+			commits = []
+
+			def count_commit(conn):
+				commits.append(conn)
+
+			event.listen(db.engine, "commit", count_commit)
+			print(f"{'lines':>6} {'commits':>8} {'mean ms':>9} {'min ms':>8}")
+			for size in CART_SIZES:
+				timings = []
+				commit_counts = []
+				for _ in range(repeat):
+					_fill_cart(user.id, items, size)
+					commits.clear()
+					start = time.perf_counter()
+					fulfill_order({"client_reference_id": user.id})
+					timings.append((time.perf_counter() - start) * 1000)
+					commit_counts.append(len(commits))
+				per_call = sum(commit_counts) / repeat
+				print(f"{size:>6} {per_call:>8.1f} {sum(timings) / len(timings):>9.2f} {min(timings):>8.2f}")
+			event.remove(db.engine, "commit", count_commit)
+			db.session.remove()
+			db.engine.dispose()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--repeat", type=int, default=20)
+	run(parser.parse_args().repeat)
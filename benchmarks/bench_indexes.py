@@ -0,0 +1,172 @@
+"""Query plans and latency of the hot lookups, with and without the model indexes.
+
+Builds a scratch database with synthetic users, carts, orders and inventory
+logs, then runs each lookup twice: once after dropping the secondary indexes
+(the schema of databases created before migration 0004) and once after
+``upgrade_database()`` has created them again.
+
+Usage: python benchmarks/bench_indexes.py [--users N] [--repeat N]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("FLASK_DEBUG", "1")
+# create_app() reads DB_URI, so point it at a scratch database.
+_TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DB_URI"] = f"sqlite:///{_TMP_DIR.name}/bench.sqlite"
+
+from sqlalchemy import text  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.db_models import (  # noqa: E402
+	Cart,
+	InventoryLog,
+	Item,
+	Order,
+	Ordered_item,
+	SchemaMigration,
+	User,
+	db,
+)
+from app.migrations import upgrade_database  # noqa: E402
+
+
+ITEM_COUNT = 500
+
+QUERIES = {
+	"login by email": ("SELECT id FROM users WHERE email = :email", lambda n: {"email": f"user{n // 2}@example.com"}),
+	"cart of a user": ("SELECT itemid, quantity FROM cart WHERE uid = :uid", lambda n: {"uid": n // 2}),
+	"cart line lookup": (
+		"SELECT id FROM cart WHERE uid = :uid AND itemid = :itemid",
+		lambda n: {"uid": n // 2, "itemid": 7},
+	),
+	"orders of a user": ("SELECT id FROM orders WHERE uid = :uid", lambda n: {"uid": n // 2}),
+	"orders in a date range": (
+		"SELECT COUNT(*) FROM orders WHERE date >= :since",
+		lambda n: {"since": datetime.datetime.utcnow() - datetime.timedelta(days=1)},
+	),
+	"lines of an order": ("SELECT itemid, quantity FROM ordered_items WHERE oid = :oid", lambda n: {"oid": n}),
+	"orders containing an item": ("SELECT COUNT(*) FROM ordered_items WHERE itemid = :itemid", lambda n: {"itemid": 7}),
+	"stock history of an item": (
+		"SELECT id FROM inventory_logs WHERE item_id = :item_id ORDER BY created_at DESC LIMIT 20",
+		lambda n: {"item_id": 7},
+	),
+}
+
+
+def _populate(user_count: int) -> None:
+	rng = random.Random(0)
+	now = datetime.datetime.utcnow()
+	db.session.execute(
+		Item.__table__.insert(),
+		[
+			{"name": f"Item {i}", "price": 1.0, "category": "Bench", "image": "/x.png", "details": "d", "price_id": f"p{i}"}
+			for i in range(1, ITEM_COUNT + 1)
+		],
+	)
+	db.session.execute(
+		User.__table__.insert(),
+		[
+			{"id": i, "name": f"User {i}", "email": f"user{i}@example.com", "phone": "0", "password": "x"}
+			for i in range(1, user_count + 1)
+		],
+	)
+	db.session.execute(
+		Cart.__table__.insert(),
+		[
+			{"uid": uid, "itemid": itemid, "quantity": 1}
+			for uid in range(1, user_count + 1)
+			for itemid in rng.sample(range(1, ITEM_COUNT + 1), 3)
+		],
+	)
+	order_count = user_count * 2
+	db.session.execute(
+		Order.__table__.insert(),
+		[
+			{
+				"id": oid,
+				"uid": rng.randint(1, user_count),
+				"date": now - datetime.timedelta(minutes=rng.randint(0, 60 * 24 * 365)),
+				"status": "Delivered",
+			}
+			for oid in range(1, order_count + 1)
+		],
+	)
+	db.session.execute(
+		Ordered_item.__table__.insert(),
+		[
+			{"oid": oid, "itemid": rng.randint(1, ITEM_COUNT), "quantity": 1, "price_at_purchase": 1.0}
+			for oid in range(1, order_count + 1)
+			for _ in range(3)
+		],
+	)
+	db.session.execute(
+		InventoryLog.__table__.insert(),
+		[
+			{
+				"item_id": rng.randint(1, ITEM_COUNT),
+				"change_type": "order",
+				"field_name": "stock_quantity",
+				"created_at": now - datetime.timedelta(minutes=rng.randint(0, 60 * 24 * 365)),
+			}
+			for _ in range(order_count * 3)
+		],
+	)
+	db.session.commit()
+
+
+def _drop_secondary_indexes() -> None:
+	for table in (User, Cart, Order, Ordered_item, InventoryLog):
+		for index in table.__table__.indexes:
+			db.session.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+	# Migrations 0004 and 0007 create these indexes; forget them so the upgrade runs them again.
+	db.session.query(SchemaMigration).filter(SchemaMigration.version.in_(["0004", "0007"])).delete()
+	db.session.commit()
+
+
+def _measure(label: str, user_count: int, repeat: int) -> dict[str, float]:
+	print(f"\n== {label}")
+	timings = {}
+	for name, (sql, params) in QUERIES.items():
+		plan = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params(user_count)).all()
+		detail = "; ".join(str(row[-1]) for row in plan)
+		start = time.perf_counter()
+		for _ in range(repeat):
+			db.session.execute(text(sql), params(user_count)).all()
+		timings[name] = (time.perf_counter() - start) * 1000 / repeat
+		print(f"{name:<28} {timings[name]:>8.3f} ms  {detail}")
+	return timings
+
+
+def run(user_count: int, repeat: int) -> None:
+	with _TMP_DIR:
+		app = create_app()
+		with app.app_context():
+			db.create_all()
+			upgrade_database()
+			_populate(user_count)
+			_drop_secondary_indexes()
+			before = _measure("without indexes", user_count, repeat)
+			upgrade_database()
+			after = _measure("after upgrade_database()", user_count, repeat)
+
+			print(f"\n{'query':<28} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+			for name in QUERIES:
+				print(f"{name:<28} {before[name]:>10.3f} {after[name]:>10.3f} {before[name] / after[name]:>7.1f}x")
+			db.session.remove()
+			db.engine.dispose()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--users", type=int, default=20_000)
+	parser.add_argument("--repeat", type=int, default=50)
+	args = parser.parse_args()
+	run(args.users, args.repeat)
@@ -0,0 +1,146 @@
+"""Multi-threaded HTTP load against the WSGI app, on a synthetic data set.
+
+The app is served by a threaded Werkzeug server on localhost; each client
+thread keeps one keep-alive connection and requests a weighted mix of
+storefront and admin routes until ``--duration`` runs out. Reports
+throughput and p50/p95/p99 latency per route.
+
+Usage: python benchmarks/bench_load.py [--threads N] [--duration S] [--users N] [--items N] [--output results.json] [--compare old.json]
+"""
+import argparse
+import http.client
+import logging
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from werkzeug.serving import make_server
+
+from common import BENCH_ADMIN_TOKEN, percentile, print_comparison, save_results, scratch_app
+from datagen import generate
+
+from app.cart_codec import encode_cart
+from app.db_models import Item, db
+
+
+def _routes(item_ids: list[int], cart_cookie: str) -> list[tuple[str, int, callable]]:
+	"""(name, weight, factory of (path, headers)) for every route of the mix."""
+	admin = {"Authorization": f"Bearer {BENCH_ADMIN_TOKEN}", "Accept": "application/json"}
+	return [
+		("GET /", 30, lambda rng: ("/", {})),
+		("GET /?after=", 10, lambda rng: (f"/?after={rng.choice(item_ids)}", {})),
+		("GET /item/<id>", 25, lambda rng: (f"/item/{rng.choice(item_ids)}", {})),
+		("GET /search", 10, lambda rng: (f"/search?query={rng.choice(['pro', 'max', 'apple', 'air'])}", {})),
+		("GET /cart (guest)", 15, lambda rng: ("/cart", {"Cookie": f"cart={cart_cookie}"})),
+		("GET /admin/api/items", 5, lambda rng: ("/admin/api/items?limit=100", admin)),
+		("GET /admin/", 5, lambda rng: ("/admin/", {"Authorization": admin["Authorization"]})),
+	]
+
+
+def _client(port: int, routes, deadline: float, seed: int, samples: dict, lock: threading.Lock) -> None:
+	rng = random.Random(seed)
+	names = [route[0] for route in routes]
+	weights = [route[1] for route in routes]
+	factories = {route[0]: route[2] for route in routes}
+	connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+	local: dict[str, list] = {name: [] for name in names}
+	errors: dict[str, int] = {name: 0 for name in names}
+	while time.perf_counter() < deadline:
+		name = rng.choices(names, weights)[0]
+		path, headers = factories[name](rng)
+		start = time.perf_counter()
+		try:
+			connection.request("GET", path, headers=headers)
+			response = connection.getresponse()
+			response.read()
+			ok = response.status < 400
+		except (OSError, http.client.HTTPException):
+			connection.close()
+			connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+			ok = False
+		elapsed = time.perf_counter() - start
+		if ok:
+			local[name].append(elapsed)
+		else:
+			errors[name] += 1
+	connection.close()
+	with lock:
+		for name in names:
+			samples[name]["latencies"].extend(local[name])
+			samples[name]["errors"] += errors[name]
+
+
+def run(threads: int, duration: float, users: int, items: int, output: str | None, baseline: str | None) -> None:
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		app = scratch_app(Path(tmp_dir) / "bench.sqlite")
+		with app.app_context():
+			counts = generate(users=users, items=items, years=2)
+			item_ids = [item_id for (item_id,) in db.session.query(Item.id)]
+			db.session.remove()
+		cart_cookie = encode_cart({item_id: 1 for item_id in item_ids[:20]}, app.config["SECRET_KEY"])
+		routes = _routes(item_ids, cart_cookie)
+
+		# One log line per request would dominate the output and the timings.
+		logging.getLogger("werkzeug").setLevel(logging.WARNING)
+		server = make_server("127.0.0.1", 0, app, threaded=True)
+		server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+		server_thread.start()
+		try:
+			samples = {name: {"latencies": [], "errors": 0} for name, _, _ in routes}
+			lock = threading.Lock()
+			started = time.perf_counter()
+			deadline = started + duration
+			clients = [
+				threading.Thread(target=_client, args=(server.server_port, routes, deadline, seed, samples, lock))
+				for seed in range(threads)
+			]
+			for client in clients:
+				client.start()
+			for client in clients:
+				client.join()
+			elapsed = time.perf_counter() - started
+		finally:
+			server.shutdown()
+			with app.app_context():
+				db.engine.dispose()
+
+	results = {}
+	print(f"{'route':<24} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+	for name, sample in samples.items():
+		latencies = sorted(value * 1000 for value in sample["latencies"])
+		if not latencies and not sample["errors"]:
+			continue
+		# A route that only failed still shows up, with its error count and no latencies.
+		results[name] = {
+			"requests": len(latencies),
+			"errors": sample["errors"],
+			"throughput_rps": len(latencies) / elapsed,
+			"p50_ms": percentile(latencies, 0.50) if latencies else None,
+			"p95_ms": percentile(latencies, 0.95) if latencies else None,
+			"p99_ms": percentile(latencies, 0.99) if latencies else None,
+		}
+		entry = results[name]
+		timings = " ".join(
+			f"{entry[key]:>8.2f}" if entry[key] is not None else f"{'-':>8}" for key in ("p50_ms", "p95_ms", "p99_ms")
+		)
+		print(f"{name:<24} {entry['requests']:>9} {entry['errors']:>7} {entry['throughput_rps']:>8.1f} {timings}")
+	total = sum(entry["requests"] for entry in results.values())
+	print(f"{'all routes':<24} {total:>9} {'':>7} {total / elapsed:>8.1f}")
+
+	params = {"threads": threads, "duration_s": duration, "data": counts}
+	save_results(output, "load", params, results)
+	print_comparison(baseline, results, "p95_ms")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--threads", type=int, default=8)
+	parser.add_argument("--duration", type=float, default=10.0)
+	parser.add_argument("--users", type=int, default=2_000)
+	parser.add_argument("--items", type=int, default=1_000)
+	parser.add_argument("--output", help="Write the results to this JSON file.")
+	parser.add_argument("--compare", help="A results file from another commit to compare with.")
+	args = parser.parse_args()
+	run(args.threads, args.duration, args.users, args.items, args.output, args.compare)
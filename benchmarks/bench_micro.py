@@ -0,0 +1,112 @@
+"""Micro-benchmarks of hot functions on a synthetic data set.
+
+Each benchmark runs a warm-up round, then ``--rounds`` timed rounds; fast
+functions are called many times per round and reported per call.
+
+Usage: python benchmarks/bench_micro.py [--rounds N] [--users N] [--items N] [--output results.json] [--compare old.json]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.orm import joinedload
+
+from common import BENCH_ADMIN_TOKEN, print_comparison, save_results, scratch_app, summarize
+from datagen import generate
+
+from app.admin.routes import _item_to_dict, dashboard
+from app.cart_codec import decode_cart, encode_cart
+from app.db_models import Cart, Item, User, db
+from app.funcs import fulfill_order, get_cart_from_cookies, save_cart_to_cookies
+
+
+CART_LINES = 10
+COOKIE_ITEMS = 40
+
+
+def bench(name: str, func, rounds: int, iterations: int = 1, setup=None) -> dict:
+	for _ in range(2):
+		if setup:
+			setup()
+		func()
+	timings = []
+	for _ in range(rounds):
+		if setup:
+			setup()
+		start = time.perf_counter()
+		for _ in range(iterations):
+			func()
+		timings.append((time.perf_counter() - start) / iterations)
+	result = summarize(timings)
+	result["ops_per_s"] = 1000 / result["mean_ms"] if result["mean_ms"] else float("inf")
+	print(f"{name:<32} {result['mean_ms']:>10.4f} {result['p50_ms']:>10.4f} {result['p95_ms']:>10.4f} {result['ops_per_s']:>12.0f}")
+	return result
+
+
+def run(rounds: int, users: int, items: int, output: str | None, baseline: str | None) -> None:
+	results = {}
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		app = scratch_app(Path(tmp_dir) / "bench.sqlite")
+		with app.app_context():
+			counts = generate(users=users, items=items, years=2)
+			buyer = User.query.filter(User.admin.is_(False)).order_by(User.id).first()
+			item_ids = [item_id for (item_id,) in db.session.query(Item.id).order_by(Item.id).limit(COOKIE_ITEMS)]
+			item = Item.query.options(joinedload(Item.inventory)).filter(Item.id == item_ids[0]).one()
+
+			print(f"{'benchmark':<32} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'ops/s':>12}")
+
+			def fill_cart():
+				Cart.query.filter_by(uid=buyer.id).delete()
+				Cart.add_quantities(buyer.id, {item_id: 1 for item_id in item_ids[:CART_LINES]})
+				db.session.commit()
+
+			results[f"fulfill_order[{CART_LINES} lines]"] = bench(
+				f"fulfill_order[{CART_LINES} lines]",
+				lambda: fulfill_order({"client_reference_id": buyer.id}),
+				rounds,
+				setup=fill_cart,
+			)
+			results["_item_to_dict"] = bench("_item_to_dict", lambda: _item_to_dict(item), rounds, iterations=1000)
+
+		cart = {str(item_id): 2 for item_id in item_ids}
+		secret = app.config["SECRET_KEY"]
+		cookie = encode_cart(cart, secret)
+		results[f"encode_cart[{COOKIE_ITEMS} items]"] = bench(
+			f"encode_cart[{COOKIE_ITEMS} items]", lambda: encode_cart(cart, secret), rounds, iterations=1000
+		)
+		results[f"decode_cart[{COOKIE_ITEMS} items]"] = bench(
+			f"decode_cart[{COOKIE_ITEMS} items]", lambda: decode_cart(cookie, secret), rounds, iterations=1000
+		)
+
+		def cookie_round_trip():
+			# Includes building the request context: the helpers read the request's cookie.
+			with app.test_request_context("/cart", headers={"Cookie": f"cart={cookie}"}):
+				save_cart_to_cookies(app.response_class(), get_cart_from_cookies())
+
+		results["cart cookie read+write"] = bench("cart cookie read+write", cookie_round_trip, rounds, iterations=100)
+
+		def render_dashboard():
+			with app.test_request_context("/admin/", headers={"Authorization": f"Bearer {BENCH_ADMIN_TOKEN}"}):
+				dashboard()
+
+		results["dashboard()"] = bench("dashboard()", render_dashboard, rounds)
+
+		with app.app_context():
+			db.session.remove()
+			db.engine.dispose()
+
+	params = {"rounds": rounds, "data": counts}
+	save_results(output, "micro", params, results)
+	print_comparison(baseline, results, "mean_ms")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--rounds", type=int, default=30)
+	parser.add_argument("--users", type=int, default=2_000)
+	parser.add_argument("--items", type=int, default=500)
+	parser.add_argument("--output", help="Write the results to this JSON file.")
+	parser.add_argument("--compare", help="A results file from another commit to compare with.")
+	args = parser.parse_args()
+	run(args.rounds, args.users, args.items, args.output, args.compare)
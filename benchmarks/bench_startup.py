@@ -0,0 +1,58 @@
+"""Cold start of a worker: import the package and build the app, in a fresh interpreter each run.
+
+Also reports the queries run while building the app (expected: none) and
+whether the optional heavy modules were imported.
+
+Usage: python benchmarks/bench_startup.py [--repeat N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+queries = []
+event.listen(Engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+from app import create_app
+create_app()
+ready = time.perf_counter()
+print(json.dumps({
+	"seconds": ready - start,
+	"queries": len(queries),
+	"modules": {name: name in sys.modules for name in ("stripe", "flask_mail")},
+}))
+"""
+
+
+def run(repeat: int) -> None:
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		env = dict(os.environ, FLASK_DEBUG="1", DB_URI=f"sqlite:///{tmp_dir}/bench.sqlite")
+		results = []
+		for _ in range(repeat):
+			output = subprocess.run(
+				[sys.executable, "-c", _CHILD], cwd=ROOT, env=env, check=True, capture_output=True, text=True
+			).stdout
+			results.append(json.loads(output.strip().splitlines()[-1]))
+
+	timings = [result["seconds"] * 1000 for result in results]
+	print(f"import app + create_app(): mean {statistics.mean(timings):.1f} ms, min {min(timings):.1f} ms ({repeat} runs)")
+	print(f"queries while starting: {results[-1]['queries']}")
+	for name, loaded in results[-1]["modules"].items():
+		print(f"{name} imported at startup: {'yes' if loaded else 'no'}")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--repeat", type=int, default=10)
+	args = parser.parse_args()
+	run(args.repeat)
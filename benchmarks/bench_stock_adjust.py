@@ -0,0 +1,80 @@
+"""Throughput of stock adjustments: one request per line vs. POST /admin/api/inventory/adjust.
+
+Usage: python benchmarks/bench_stock_adjust.py [--lines N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("FLASK_DEBUG", "1")
+# create_app() reads DB_URI, so point it at a scratch database.
+_TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DB_URI"] = f"sqlite:///{_TMP_DIR.name}/bench.sqlite"
+
+from app import create_app  # noqa: E402
+from app.db_models import Inventory, Item, db  # noqa: E402
+
+
+HEADERS = {"Authorization": "Bearer bench-token", "Accept": "application/json"}
+
+
+def _create_items(count: int) -> list[int]:
+	items = [
+		Item(name=f"Item {i}", price=1.0, category="Bench", image="/x.png", details="d", price_id=f"p{i}")
+		for i in range(count)
+	]
+	db.session.add_all(items)
+	db.session.flush()
+	db.session.add_all(Inventory(item=item, stock_quantity=1_000_000) for item in items)
+	db.session.commit()
+	return [item.id for item in items]
+
+
+def _single_requests(client, item_ids: list[int]) -> None:
+	for item_id in item_ids:
+		response = client.post(f"/admin/api/items/{item_id}/stock", json={"delta": -1}, headers=HEADERS)
+		assert response.status_code == 200, response.get_json()
+
+
+def _batch_request(client, item_ids: list[int]) -> None:
+	response = client.post(
+		"/admin/api/inventory/adjust",
+		json=[{"item_id": item_id, "delta": -1} for item_id in item_ids],
+		headers=HEADERS,
+	)
+	assert response.status_code == 200, response.get_json()
+
+
+def run(lines: int, repeat: int) -> None:
+	with _TMP_DIR:
+		app = create_app({"TESTING": True, "ADMIN_API_TOKEN": "bench-token"})
+		client = app.test_client()
+		with app.app_context():
+			db.create_all()
+			item_ids = _create_items(lines)
+
+		print(f"{'mode':<22} {'mean ms':>9} {'lines/s':>10}")
+		for label, apply in (("one request per line", _single_requests), ("batch endpoint", _batch_request)):
+			timings = []
+			for _ in range(repeat):
+				start = time.perf_counter()
+				apply(client, item_ids)
+				timings.append(time.perf_counter() - start)
+			mean = sum(timings) / len(timings)
+			print(f"{label:<22} {mean * 1000:>9.1f} {lines / mean:>10.0f}")
+
+		with app.app_context():
+			db.session.remove()
+			db.engine.dispose()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--lines", type=int, default=200)
+	parser.add_argument("--repeat", type=int, default=5)
+	args = parser.parse_args()
+	run(args.lines, args.repeat)
@@ -0,0 +1,97 @@
+"""Helpers shared by the benchmark suite: scratch apps, timing summaries and JSON results."""
+import datetime
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app import create_app  # noqa: E402
+from app.db_models import db  # noqa: E402
+from app.migrations import upgrade_database  # noqa: E402
+
+BENCH_ADMIN_TOKEN = "bench-token"
+
+
+def scratch_app(db_path: Path, **config):
+	"""An app on a fresh SQLite database at ``db_path``, with the schema created."""
+	app = create_app(
+		{
+			"TESTING": True,
+			"WTF_CSRF_ENABLED": False,
+			"ADMIN_API_TOKEN": BENCH_ADMIN_TOKEN,
+			"SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+			**config,
+		}
+	)
+	with app.app_context():
+		db.create_all()
+		upgrade_database()
+	return app
+
+
+def percentile(sorted_values: list[float], quantile: float) -> float:
+	"""Nearest-rank percentile of an already sorted, non-empty list."""
+	return sorted_values[max(1, math.ceil(quantile * len(sorted_values))) - 1]
+
+
+def summarize(seconds: list[float]) -> dict:
+	"""Milliseconds statistics of a list of timings in seconds."""
+	values = sorted(value * 1000 for value in seconds)
+	return {
+		"rounds": len(values),
+		"min_ms": values[0],
+		"mean_ms": statistics.fmean(values),
+		"stddev_ms": statistics.stdev(values) if len(values) > 1 else 0.0,
+		"p50_ms": percentile(values, 0.50),
+		"p95_ms": percentile(values, 0.95),
+		"p99_ms": percentile(values, 0.99),
+	}
+
+
+def git_revision() -> str | None:
+	try:
+		return subprocess.run(
+			["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def save_results(path: str | None, benchmark: str, params: dict, results: dict) -> None:
+	"""Writes the results with what is needed to compare them across commits."""
+	if not path:
+		return
+	document = {
+		"benchmark": benchmark,
+		"revision": git_revision(),
+		"created_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"params": params,
+		"results": results,
+	}
+	Path(path).write_text(json.dumps(document, indent=2, sort_keys=True) + "\n")
+	print(f"Results saved to {path}")
+
+
+def print_comparison(baseline_path: str | None, results: dict, metric: str) -> None:
+	"""Prints ``metric`` of each entry next to the same entry of a saved results file."""
+	if not baseline_path:
+		return
+	baseline = json.loads(Path(baseline_path).read_text())
+	print(f"\nCompared with {baseline_path} ({baseline.get('revision') or 'unknown revision'}), {metric}:")
+	for name, entry in results.items():
+		before = baseline["results"].get(name, {}).get(metric)
+		if entry[metric] is None:
+			before_text = f"{before:>10.3f}" if before is not None else f"{'-':>10}"
+			print(f"{name:<32} {before_text} -> {'-':>10} (no successful samples)")
+		elif before:
+			print(f"{name:<32} {before:>10.3f} -> {entry[metric]:>10.3f} ({(entry[metric] / before - 1) * 100:+.1f}%)")
+		else:
+			print(f"{name:<32} {'-':>10} -> {entry[metric]:>10.3f}")
@@ -0,0 +1,226 @@
+"""Synthetic data at realistic scale: users, items with inventory, carts and years of history.
+
+Rows are written with bulk executemany inserts in batches, then the derived
+tables (cart counts, the daily sales rollup and the search index) are
+rebuilt the way the app maintains them. The same ``--seed`` always produces
+the same rows (dates are relative to today), so runs on different commits
+measure the same workload.
+
+Usage: python benchmarks/datagen.py --db /tmp/shop.sqlite [--users N] [--items N] [--years N] [--seed N]
+"""
+import argparse
+import datetime
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import func, update  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.db_models import Cart, Inventory, InventoryLog, Item, Order, Ordered_item, User, db  # noqa: E402
+from app.migrations import upgrade_database  # noqa: E402
+from app.rollups import rebuild_daily_sales_rollup  # noqa: E402
+from app.search import rebuild_search_index  # noqa: E402
+
+
+BATCH_SIZE = 5_000
+CATEGORIES = ("Apple", "Samsung", "Google", "Audio", "Accessories", "Laptops", "Tablets", "Wearables")
+WORDS = ("Pro", "Max", "Mini", "Ultra", "Lite", "Plus", "Air", "Neo", "Edge", "One")
+STATUSES = ("processing", "shipped", "completed", "completed", "completed", "cancelled")
+# Every generated account logs in with this password.
+PASSWORD = "bench-pass"
+ADMIN_EMAIL = "admin@bench.example"
+
+
+def _insert(table, rows) -> None:
+	batch = []
+	for row in rows:
+		batch.append(row)
+		if len(batch) >= BATCH_SIZE:
+			db.session.execute(table.insert(), batch)
+			batch = []
+	if batch:
+		db.session.execute(table.insert(), batch)
+
+
+def _next_id(model) -> int:
+	return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def generate(
+	users: int = 1_000,
+	items: int = 500,
+	years: int = 2,
+	orders_per_user: float = 3.0,
+	cart_fill: float = 0.3,
+	seed: int = 0,
+	now: datetime.datetime | None = None,
+) -> dict:
+	"""Adds the synthetic data set to the database of the current app; returns row counts."""
+	rng = random.Random(seed)
+	# History ends today, so the dashboard's "last 7 days" windows have data.
+	now = now or datetime.datetime.combine(datetime.datetime.utcnow().date(), datetime.time())
+	history_days = max(1, int(365 * years))
+	# One hash for everyone: hashing is deliberately slow and would dominate generation.
+	password = generate_password_hash(PASSWORD, method="pbkdf2:sha256", salt_length=8)
+
+	first_user = _next_id(User)
+	user_ids = list(range(first_user, first_user + users))
+	# Extending an earlier data set keeps its admin; emails are unique.
+	admin_id = db.session.query(User.id).filter_by(email=ADMIN_EMAIL).scalar() or first_user
+	_insert(
+		User.__table__,
+		(
+			{
+				"id": user_id,
+				"name": f"User {user_id}",
+				"email": ADMIN_EMAIL if user_id == admin_id else f"user{user_id}@bench.example",
+				"phone": f"0{rng.randrange(10**8, 10**9)}",
+				"password": password,
+				"admin": user_id == admin_id,
+				"email_confirmed": True,
+				"cart_count": 0,
+			}
+			for user_id in user_ids
+		),
+	)
+
+	first_item = _next_id(Item)
+	item_ids = list(range(first_item, first_item + items))
+	prices = {item_id: round(rng.uniform(5, 1500), 2) for item_id in item_ids}
+	_insert(
+		Item.__table__,
+		(
+			{
+				"id": item_id,
+				"name": f"{rng.choice(CATEGORIES)} {rng.choice(WORDS)} {item_id}",
+				"price": prices[item_id],
+				"category": rng.choice(CATEGORIES),
+				"image": "/static/uploads/placeholder.png",
+				"details": " ".join(rng.choices(WORDS, k=12)),
+				"price_id": f"price_bench_{item_id}",
+				"updated_at": now,
+			}
+			for item_id in item_ids
+		),
+	)
+	_insert(
+		Inventory.__table__,
+		(
+			{
+				"item_id": item_id,
+				"stock_quantity": rng.randrange(0, 500),
+				"low_stock_threshold": rng.randrange(0, 10),
+				"is_published": rng.random() > 0.05,
+				"reserved_quantity": 0,
+				"updated_at": now,
+			}
+			for item_id in item_ids
+		),
+	)
+
+	cart_rows = 0
+
+	def carts():
+		nonlocal cart_rows
+		for user_id in user_ids:
+			if rng.random() < cart_fill:
+				for item_id in rng.sample(item_ids, min(len(item_ids), rng.randint(1, 8))):
+					cart_rows += 1
+					yield {"uid": user_id, "itemid": item_id, "quantity": rng.randint(1, 3)}
+
+	_insert(Cart.__table__, carts())
+
+	order_count = int(users * orders_per_user)
+	first_order = _next_id(Order)
+	order_ids = range(first_order, first_order + order_count)
+	order_dates = sorted(now - datetime.timedelta(minutes=rng.randrange(history_days * 24 * 60)) for _ in order_ids)
+	_insert(
+		Order.__table__,
+		(
+			{"id": order_id, "uid": rng.choice(user_ids), "date": date, "status": rng.choice(STATUSES)}
+			for order_id, date in zip(order_ids, order_dates)
+		),
+	)
+	line_rows = 0
+
+	def order_lines():
+		nonlocal line_rows
+		for order_id in order_ids:
+			for item_id in rng.sample(item_ids, min(len(item_ids), rng.randint(1, 5))):
+				line_rows += 1
+				yield {
+					"oid": order_id,
+					"itemid": item_id,
+					"quantity": rng.randint(1, 3),
+					"price_at_purchase": prices[item_id],
+				}
+
+	_insert(Ordered_item.__table__, order_lines())
+
+	log_rows = 0
+
+	def inventory_logs():
+		nonlocal log_rows
+		for item_id in item_ids:
+			for _ in range(rng.randint(1, 2 * years + 2)):
+				log_rows += 1
+				old = rng.randrange(0, 500)
+				yield {
+					"item_id": item_id,
+					"user_id": admin_id,
+					"change_type": "update",
+					"field_name": "stock_quantity",
+					"old_value": str(old),
+					"new_value": str(max(0, old + rng.randint(-20, 50))),
+					"note": "synthetic",
+					"created_at": now - datetime.timedelta(minutes=rng.randrange(history_days * 24 * 60)),
+				}
+
+	_insert(InventoryLog.__table__, inventory_logs())
+
+	cart_totals = (
+		db.session.query(func.coalesce(func.sum(Cart.quantity), 0)).filter(Cart.uid == User.id).scalar_subquery()
+	)
+	db.session.execute(update(User).where(User.id.in_(user_ids)).values(cart_count=cart_totals))
+	db.session.commit()
+	rebuild_daily_sales_rollup()
+	rebuild_search_index()
+	db.session.commit()
+	return {
+		"users": users,
+		"items": items,
+		"carts": cart_rows,
+		"orders": order_count,
+		"ordered_items": line_rows,
+		"inventory_logs": log_rows,
+		"admin_email": ADMIN_EMAIL,
+	}
+
+
+def create_database(app) -> None:
+	with app.app_context():
+		db.create_all()
+		upgrade_database()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--db", required=True, help="SQLite file to create or extend.")
+	parser.add_argument("--users", type=int, default=1_000)
+	parser.add_argument("--items", type=int, default=500)
+	parser.add_argument("--years", type=int, default=2)
+	parser.add_argument("--orders-per-user", type=float, default=3.0)
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	app = create_app({"DEV_MODE": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{Path(args.db).resolve()}"})
+	create_database(app)
+	with app.app_context():
+		started = time.perf_counter()
+		counts = generate(args.users, args.items, args.years, args.orders_per_user, seed=args.seed)
+		print(f"Generated in {time.perf_counter() - started:.1f}s: {counts}")
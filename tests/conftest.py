@@ -1,15 +1,17 @@
-import os
+from contextlib import contextmanager
 from pathlib import Path
 
 import pytest
+from sqlalchemy import event
 
-from app import app as flask_app
-from app import configure_app, db
+from app import create_app, db
+from app.catalog import clear_catalog_cache
+from app.principals import clear_principal_cache
 
 
 @pytest.fixture(scope="session")
 def _test_db_path():
-	db_file = Path("tests/test_admin.sqlite")
+	db_file = Path("tests/test_admin.sqlite").resolve()
 	if db_file.exists():
 		db_file.unlink()
 	yield db_file
@@ -19,8 +21,7 @@ def _test_db_path():
 
 @pytest.fixture
 def app(_test_db_path):
-	configure_app(
-		flask_app,
+	flask_app = create_app(
 		{
 			"TESTING": True,
 			"SQLALCHEMY_DATABASE_URI": f"sqlite:///{_test_db_path}",
@@ -29,6 +30,8 @@ def app(_test_db_path):
 			"MAIL_SUPPRESS_SEND": True,
 		},
 	)
+	clear_catalog_cache()
+	clear_principal_cache()
 	with flask_app.app_context():
 		db.session.remove()
 		db.drop_all()
@@ -36,6 +39,7 @@ def app(_test_db_path):
 		yield flask_app
 		db.session.remove()
 		db.drop_all()
+		db.engine.dispose()
 
 
 @pytest.fixture
@@ -46,3 +50,59 @@ def client(app):
 @pytest.fixture
 def admin_headers():
 	return {"Authorization": "Bearer test-token", "Accept": "application/json"}
+
+
+@pytest.fixture
+def create_item(client, admin_headers):
+	"""``create_item(**overrides)`` creates an item through the admin API and returns its JSON."""
+
+	def create(**overrides):
+		payload = {
+			"name": "Test Item",
+			"price": 19.99,
+			"category": "Books",
+			"details": "A test inventory item",
+			"price_id": "price_test",
+			"stock_quantity": 10,
+			"low_stock_threshold": 3,
+			"is_published": True,
+		}
+		payload.update(overrides)
+		response = client.post("/admin/api/items", json=payload, headers=admin_headers)
+		assert response.status_code == 201, response.get_json()
+		return response.get_json()
+
+	return create
+
+
+class QueryBudgetExceeded(AssertionError):
+	pass
+
+
+@pytest.fixture
+def query_budget(app):
+	"""``with query_budget(n): ...`` fails the test when the block runs more than ``n`` SQL statements.
+
+	Read streamed response bodies inside the block: their queries run while
+	the body is consumed. The recorded statements are on the yielded list.
+	"""
+
+	@contextmanager
+	def budget(max_queries: int):
+		statements: list[str] = []
+
+		def record(conn, cursor, statement, parameters, context, executemany):
+			statements.append(statement)
+
+		event.listen(db.engine, "before_cursor_execute", record)
+		try:
+			yield statements
+		finally:
+			event.remove(db.engine, "before_cursor_execute", record)
+		if len(statements) > max_queries:
+			listing = "\n".join(f"  {index}. {statement}" for index, statement in enumerate(statements, 1))
+			raise QueryBudgetExceeded(
+				f"{len(statements)} queries, budget is {max_queries}:\n{listing}"
+			)
+
+	return budget
@@ -19,7 +19,8 @@ cleanup() {
 }
 trap cleanup EXIT
 
-python -m flask run --port "${PORT}" --no-debugger --no-reload >/tmp/integration_flask.log 2>&1 &
+python -m flask init-db >/tmp/integration_flask.log 2>&1
+python -m flask run --port "${PORT}" --no-debugger --no-reload >>/tmp/integration_flask.log 2>&1 &
 FLASK_PID=$!
 
 echo "Waiting for Flask app to start on port ${PORT}..."
@@ -0,0 +1,123 @@
+import threading
+from datetime import datetime, timedelta
+
+from app.admin.stats import dashboard_stats
+from app.db_models import DailySalesRollup, Inventory, Item, Order, Ordered_item, User, db
+from app import rollups
+from app.rollups import apply_sales, apply_status_change, rebuild_daily_sales_rollup
+
+
+def _seed_orders():
+	user = User(name="Buyer", email="buyer@example.com", phone="000", password="x")
+	cheap = Item(name="Cheap", price=5.0, category="Misc", image="/x.png", details="d", price_id="p1")
+	pricey = Item(name="Pricey", price=100.0, category="Misc", image="/x.png", details="d", price_id="p2")
+	db.session.add_all([user, cheap, pricey])
+	db.session.flush()
+	db.session.add(Inventory(item=cheap, stock_quantity=1, low_stock_threshold=2))
+	db.session.add(Inventory(item=pricey, stock_quantity=50, low_stock_threshold=2))
+
+	now = datetime.utcnow()
+	orders = [
+		(now, "processing", [(cheap, 4, 5.0), (pricey, 1, 90.0)]),
+		(now - timedelta(days=30), "completed", [(cheap, 2, None)]),
+		(now - timedelta(days=1), "Cancelled", [(pricey, 3, 100.0)]),
+	]
+	for date, status, lines in orders:
+		order = Order(uid=user.id, date=date, status=status)
+		db.session.add(order)
+		db.session.flush()
+		for item, quantity, price in lines:
+			db.session.add(Ordered_item(oid=order.id, itemid=item.id, quantity=quantity, price_at_purchase=price))
+	db.session.commit()
+	rebuild_daily_sales_rollup()
+	return cheap, pricey
+
+
+def test_dashboard_stats_are_aggregated_in_sql(app):
+	cheap, pricey = _seed_orders()
+
+	stats = dashboard_stats()
+	assert stats["total_revenue"] == 4 * 5.0 + 90.0 + 2 * 5.0
+	assert stats["recent_revenue"] == 4 * 5.0 + 90.0
+	assert stats["total_orders"] == 3
+	assert stats["recent_orders_count"] == 2
+	assert stats["orders_by_status"] == {"processing": 1, "completed": 1, "cancelled": 1}
+	assert [day["count"] for day in stats["orders_per_day"]][-2:] == [1, 1]
+	assert sum(day["count"] for day in stats["orders_per_day"]) == 2
+	assert [entry["item"].name for entry in stats["top_items"]] == ["Cheap", "Pricey"]
+	assert [item.name for item in stats["low_stock_items"]] == ["Cheap"]
+	assert stats["orders"][0]["total"] == 110.0
+
+
+def test_dashboard_renders(app, client, admin_headers):
+	_seed_orders()
+	response = client.get("/admin/", headers={"Authorization": admin_headers["Authorization"]})
+	assert response.status_code == 200
+	assert "$120.00" in response.get_data(as_text=True)
+
+
+def test_rollup_follows_order_cancellation(app):
+	cheap, _ = _seed_orders()
+	day = datetime.utcnow().date()
+	row = DailySalesRollup.query.filter_by(day=day, item_id=cheap.id).one()
+	assert (row.units, row.revenue, row.orders) == (4, 20.0, 1)
+
+	order = Order.query.filter_by(status="processing").one()
+	apply_status_change(order, order.status, "cancelled")
+	order.status = "cancelled"
+	db.session.commit()
+	row = DailySalesRollup.query.filter_by(day=day, item_id=cheap.id).one()
+	assert (row.units, row.revenue, row.orders) == (0, 0.0, 0)
+	assert dashboard_stats()["total_revenue"] == 10.0
+
+	apply_status_change(order, order.status, "processing")
+	order.status = "processing"
+	db.session.commit()
+	assert dashboard_stats()["total_revenue"] == 120.0
+
+
+def test_concurrent_sales_for_the_same_day_are_all_counted(app):
+	item = Item(name="Hot", price=2.0, category="Misc", image="/x.png", details="d", price_id="p_hot")
+	db.session.add(item)
+	db.session.commit()
+	item_id, day, workers = item.id, datetime.utcnow().date(), 20
+	db.session.remove()
+
+	start = threading.Barrier(workers)
+	errors = []
+
+	def fulfill():
+		with app.app_context():
+			start.wait()
+			try:
+				apply_sales(day, [(item_id, 1, 2.0)])
+				db.session.commit()
+			except Exception as exc:
+				errors.append(exc)
+			finally:
+				db.session.remove()
+
+	threads = [threading.Thread(target=fulfill) for _ in range(workers)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	assert errors == []
+	row = DailySalesRollup.query.filter_by(day=day, item_id=item_id).one()
+	assert (row.units, row.revenue, row.orders) == (workers, 2.0 * workers, workers)
+
+
+def test_sales_increment_without_upsert_support(app, monkeypatch):
+	monkeypatch.setattr(rollups, "_UPSERT_INSERTS", {})
+	item = Item(name="Plain", price=2.0, category="Misc", image="/x.png", details="d", price_id="p_plain")
+	db.session.add(item)
+	db.session.commit()
+	day = datetime.utcnow().date()
+
+	for sign in (1, 1, -1):
+		apply_sales(day, [(item.id, 3, 6.0)], sign)
+		db.session.commit()
+
+	row = DailySalesRollup.query.filter_by(day=day, item_id=item.id).one()
+	assert (row.units, row.revenue, row.orders) == (3, 6.0, 1)
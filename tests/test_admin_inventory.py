@@ -1,21 +1,10 @@
-from app.db_models import InventoryLog, Item
-
-
-def _create_item(client, admin_headers, **overrides):
-	payload = {
-		"name": "Test Item",
-		"price": 19.99,
-		"category": "Books",
-		"details": "A test inventory item",
-		"price_id": "price_test",
-		"stock_quantity": 10,
-		"low_stock_threshold": 3,
-		"is_published": True,
-	}
-	payload.update(overrides)
-	response = client.post("/admin/api/items", json=payload, headers=admin_headers)
-	assert response.status_code == 201, response.get_json()
-	return response.get_json()
+import csv
+import datetime
+import gzip
+import io
+import json
+
+from app.db_models import Inventory, InventoryLog, Item, db
 
 
 def test_admin_api_requires_token(client):
@@ -23,8 +12,8 @@ def test_admin_api_requires_token(client):
 	assert response.status_code == 401
 
 
-def test_create_item_creates_inventory_and_logs(app, client, admin_headers):
-	result = _create_item(client, admin_headers, stock_quantity=5, low_stock_threshold=2)
+def test_create_item_creates_inventory_and_logs(app, create_item):
+	result = create_item(stock_quantity=5, low_stock_threshold=2)
 	assert result["stock_quantity"] == 5
 	assert result["low_stock_threshold"] == 2
 
@@ -41,8 +30,8 @@ def test_create_item_creates_inventory_and_logs(app, client, admin_headers):
 		assert "is_published" in field_names
 
 
-def test_patch_item_updates_fields_and_logging(app, client, admin_headers):
-	result = _create_item(client, admin_headers)
+def test_patch_item_updates_fields_and_logging(app, client, admin_headers, create_item):
+	result = create_item()
 	item_id = result["id"]
 
 	update_response = client.patch(
@@ -77,8 +66,8 @@ def test_patch_item_updates_fields_and_logging(app, client, admin_headers):
 		assert "is_published" in field_names
 
 
-def test_adjust_stock_delta(app, client, admin_headers):
-	result = _create_item(client, admin_headers, stock_quantity=2)
+def test_adjust_stock_delta(app, client, admin_headers, create_item):
+	result = create_item(stock_quantity=2)
 	item_id = result["id"]
 
 	response = client.post(
@@ -99,8 +88,8 @@ def test_adjust_stock_delta(app, client, admin_headers):
 		assert latest_log.new_value == "5"
 
 
-def test_low_stock_flag_and_export(client, admin_headers):
-	result = _create_item(client, admin_headers, stock_quantity=1, low_stock_threshold=2)
+def test_low_stock_flag_and_export(client, admin_headers, create_item):
+	result = create_item(stock_quantity=1, low_stock_threshold=2)
 	item_id = result["id"]
 
 	items_response = client.get("/admin/api/items", headers=admin_headers)
@@ -133,9 +122,9 @@ def test_create_item_rejects_negative_stock(client, admin_headers):
 	assert "non-negative integer" in response.get_json()["error"]
 
 
-def test_home_filters_unpublished_items(app, client, admin_headers):
-	_create_item(client, admin_headers, name="Visible Item", is_published=True)
-	_create_item(client, admin_headers, name="Hidden Item", is_published=False)
+def test_home_filters_unpublished_items(client, create_item):
+	create_item(name="Visible Item", is_published=True)
+	create_item(name="Hidden Item", is_published=False)
 
 	response = client.get("/")
 	assert response.status_code == 200
@@ -144,8 +133,8 @@ def test_home_filters_unpublished_items(app, client, admin_headers):
 	assert "Hidden Item" not in body
 
 
-def test_patch_item_without_image_preserves_existing_image(app, client, admin_headers):
-	result = _create_item(client, admin_headers, image="/static/uploads/original.png")
+def test_patch_item_without_image_preserves_existing_image(app, client, admin_headers, create_item):
+	result = create_item(image="/static/uploads/original.png")
 	item_id = result["id"]
 
 	response = client.patch(
@@ -163,3 +152,243 @@ def test_patch_item_without_image_preserves_existing_image(app, client, admin_he
 		item = Item.query.get(item_id)
 		assert item.name == "Updated Name"
 		assert item.image == "/static/uploads/original.png"
+
+
+def test_api_items_pages_by_keyset_with_projection(client, admin_headers, create_item):
+	created = [create_item(name=f"Item {i}", stock_quantity=i) for i in range(3)]
+
+	response = client.get("/admin/api/items?limit=2&fields=id,stock_quantity", headers=admin_headers)
+	assert response.status_code == 200
+	assert response.get_json() == [
+		{"id": created[0]["id"], "stock_quantity": 0},
+		{"id": created[1]["id"], "stock_quantity": 1},
+	]
+	assert f"after={created[1]['id']}" in response.headers["Link"]
+
+	response = client.get(f"/admin/api/items?limit=2&after={created[1]['id']}&fields=name", headers=admin_headers)
+	assert response.get_json() == [{"name": "Item 2"}]
+	assert "Link" not in response.headers
+
+	response = client.get("/admin/api/items?fields=id,password", headers=admin_headers)
+	assert response.status_code == 400
+
+
+def test_api_items_streams_ndjson_from_one_query(app, client, admin_headers, query_budget, create_item):
+	created = [create_item(name=f"Item {i}", stock_quantity=1, low_stock_threshold=2) for i in range(3)]
+	with app.app_context():
+		db.session.add(
+			Item(name="Legacy", price=1.0, category="Old", image="/x.png", details="d", price_id="p_legacy")
+		)
+		db.session.commit()
+
+	with query_budget(1):
+		response = client.get("/admin/api/items?format=ndjson", headers=admin_headers)
+		lines = response.get_data(as_text=True).splitlines()
+
+	assert response.mimetype == "application/x-ndjson"
+	rows = [json.loads(line) for line in lines]
+	assert [row["id"] for row in rows[:3]] == [item["id"] for item in created]
+	assert rows[0]["low_stock"] is True
+	assert rows[-1]["name"] == "Legacy"
+	assert rows[-1]["stock_quantity"] == 0
+	assert rows[-1]["is_published"] is True
+	assert rows[-1]["low_stock"] is False
+
+
+def test_export_streams_without_writes(app, client, admin_headers, query_budget, create_item):
+	created = create_item(name="Exported", stock_quantity=4)
+	with app.app_context():
+		db.session.add(Item(name="Legacy", price=1.0, category="Old", image="/x.png", details="d", price_id="p_legacy"))
+		db.session.commit()
+
+	with query_budget(1) as statements:
+		response = client.get("/admin/api/inventory/export", headers=admin_headers)
+		body = response.get_data(as_text=True)
+	assert Inventory.query.count() == 1
+
+	assert [s for s in statements if not s.lstrip().upper().startswith("SELECT")] == []
+	rows = list(csv.reader(io.StringIO(body)))
+	assert rows[0] == ["id", "name", "price", "stock_quantity", "low_stock_threshold", "is_published"]
+	assert rows[1][:4] == [str(created["id"]), "Exported", "19.99", "4"]
+	assert rows[2][1:] == ["Legacy", "1.0", "0", "0", "True"]
+
+
+def test_export_gzip_and_since(app, client, admin_headers, create_item):
+	old = create_item(name="Old Item")
+	recent = create_item(name="Recent Item")
+	long_ago = datetime.datetime(2000, 1, 1)
+	with app.app_context():
+		Item.query.filter_by(id=old["id"]).update({Item.updated_at: long_ago})
+		Inventory.query.filter_by(item_id=old["id"]).update({Inventory.updated_at: long_ago})
+		db.session.commit()
+
+	response = client.get(
+		"/admin/api/inventory/export?since=2020-01-01T00:00:00Z",
+		headers={**admin_headers, "Accept-Encoding": "gzip"},
+	)
+	assert response.status_code == 200
+	assert response.headers["Content-Encoding"] == "gzip"
+	assert "X-Exported-At" in response.headers
+	rows = list(csv.reader(io.StringIO(gzip.decompress(response.data).decode())))
+	assert [row[0] for row in rows[1:]] == [str(recent["id"])]
+
+	assert client.get("/admin/api/inventory/export?since=yesterday", headers=admin_headers).status_code == 400
+
+
+def test_import_csv_applies_rows_and_reports_errors(app, client, admin_headers, create_item):
+	first = create_item(name="First", stock_quantity=1)
+	second = create_item(name="Second", stock_quantity=2)
+	with app.app_context():
+		legacy = Item(name="Legacy", price=1.0, category="Old", image="/x.png", details="d", price_id="p_legacy")
+		db.session.add(legacy)
+		db.session.commit()
+		legacy_id = legacy.id
+
+	body = (
+		"id,name,price,stock_quantity,low_stock_threshold,is_published\n"
+		f"{first['id']},First,19.99,7,,\n"
+		f"{second['id']},Second,19.99,-1,,\n"
+		"999999,Ghost,1,1,1,True\n"
+		f"{legacy_id},Legacy,1.0,3,1,False\n"
+	)
+	response = client.post(
+		"/admin/api/inventory/import",
+		data=body,
+		headers={**admin_headers, "Content-Type": "text/csv"},
+	)
+	assert response.status_code == 200
+	report = response.get_json()
+	assert report["changed"] == 2
+	assert report["failed"] == 2
+	assert [(error["line"], error["error"]) for error in report["errors"]] == [
+		(3, "stock_quantity must be a non-negative integer"),
+		(4, "Item not found"),
+	]
+
+	with app.app_context():
+		assert db.session.get(Item, first["id"]).inventory.stock_quantity == 7
+		assert db.session.get(Item, second["id"]).inventory.stock_quantity == 2
+		legacy_inventory = db.session.get(Item, legacy_id).inventory
+		assert (legacy_inventory.stock_quantity, legacy_inventory.is_published) == (3, False)
+		logs = InventoryLog.query.filter_by(change_type="import").all()
+		assert {(log.item_id, log.field_name, log.new_value) for log in logs} == {
+			(first["id"], "stock_quantity", "7"),
+			(legacy_id, "stock_quantity", "3"),
+			(legacy_id, "low_stock_threshold", "1"),
+			(legacy_id, "is_published", "False"),
+		}
+
+
+def test_import_ndjson_dry_run_writes_nothing(app, client, admin_headers, create_item):
+	item = create_item(name="Before", stock_quantity=1)
+	body = "\n".join(
+		[
+			json.dumps({"id": item["id"], "name": "After", "stock_quantity": 9}),
+			"{not json",
+		]
+	)
+	response = client.post(
+		"/admin/api/inventory/import?dry_run=1",
+		data=gzip.compress(body.encode()),
+		headers={**admin_headers, "Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+	)
+	report = response.get_json()
+	assert report["dry_run"] is True
+	assert (report["changed"], report["failed"]) == (1, 1)
+	assert report["errors"][0]["line"] == 2
+
+	with app.app_context():
+		stored = db.session.get(Item, item["id"])
+		assert stored.name == "Before"
+		assert stored.inventory.stock_quantity == 1
+		assert InventoryLog.query.filter_by(change_type="import").count() == 0
+
+	response = client.post("/admin/api/inventory/import", data=body, headers={**admin_headers, "Content-Type": "application/x-ndjson"})
+	assert response.get_json()["changed"] == 1
+	assert "After" in client.get("/search?query=after").get_data(as_text=True)
+	with app.app_context():
+		assert db.session.get(Item, item["id"]).name == "After"
+
+
+def test_batch_adjust_applies_all_lines_atomically(app, client, admin_headers, create_item):
+	first = create_item(name="First", stock_quantity=5)
+	second = create_item(name="Second", stock_quantity=1)
+
+	response = client.post(
+		"/admin/api/inventory/adjust",
+		json={
+			"adjustments": [
+				{"item_id": first["id"], "delta": -2, "note": "Pick list"},
+				{"item_id": second["id"], "quantity": 8},
+				{"item_id": first["id"], "delta": 1},
+			]
+		},
+		headers=admin_headers,
+	)
+	assert response.status_code == 200
+	assert [(line["item_id"], line["old_quantity"], line["stock_quantity"]) for line in response.get_json()["results"]] == [
+		(first["id"], 5, 3),
+		(second["id"], 1, 8),
+		(first["id"], 3, 4),
+	]
+
+	response = client.post(
+		"/admin/api/inventory/adjust",
+		json=[{"item_id": first["id"], "delta": -1}, {"item_id": second["id"], "delta": -9}, {"item_id": 999999, "delta": 1}],
+		headers=admin_headers,
+	)
+	assert response.status_code == 409
+	assert [line["status"] for line in response.get_json()["results"]] == ["ok", "error", "error"]
+
+	with app.app_context():
+		assert db.session.get(Item, first["id"]).inventory.stock_quantity == 4
+		assert db.session.get(Item, second["id"]).inventory.stock_quantity == 8
+		logs = InventoryLog.query.filter_by(change_type="adjust").order_by(InventoryLog.id).all()
+		assert [(log.item_id, log.old_value, log.new_value, log.note) for log in logs] == [
+			(first["id"], "5", "3", "Pick list"),
+			(second["id"], "1", "8", "Quantity override"),
+			(first["id"], "3", "4", "Delta update"),
+		]
+
+
+def test_batch_adjust_rejects_invalid_lines(client, admin_headers):
+	response = client.post(
+		"/admin/api/inventory/adjust",
+		json=[{"item_id": 1, "delta": 1, "quantity": 2}, {"item_id": "x", "delta": 1}, {"item_id": 1, "quantity": -1}],
+		headers=admin_headers,
+	)
+	assert response.status_code == 400
+	assert [error["index"] for error in response.get_json()["errors"]] == [0, 1, 2]
+	assert client.post("/admin/api/inventory/adjust", json=[], headers=admin_headers).status_code == 400
+
+
+def test_import_that_breaks_midway_reports_what_was_committed(app, client, admin_headers):
+	items = [
+		Item(name=f"Bulk {index}", price=1.0, category="Bulk", image="/x.png", details="d", price_id=f"p_bulk_{index}")
+		for index in range(1200)
+	]
+	db.session.add_all(items)
+	db.session.flush()
+	db.session.add_all(Inventory(item=item, stock_quantity=1) for item in items)
+	db.session.commit()
+	item_ids = [item.id for item in items]
+	db.session.remove()
+
+	header = "id,name,price,stock_quantity,low_stock_threshold,is_published\n"
+	rows = "".join(f"{item_id},Bulk {index},1.0,5,,\n" for index, item_id in enumerate(item_ids))
+	# Valid rows, then bytes that are not UTF-8: the stream breaks after the first batch committed.
+	body = gzip.compress(header.encode() + rows.encode() + b"\xff\xfe broken\n")
+	response = client.post(
+		"/admin/api/inventory/import",
+		data=body,
+		headers={**admin_headers, "Content-Type": "text/csv", "Content-Encoding": "gzip"},
+	)
+
+	assert response.status_code == 400
+	report = response.get_json()
+	assert "Could not read the import" in report["error"]
+	assert report["last_line"] == report["rows"] + 1
+	assert report["changed"] == report["rows"] > 500
+	stocks = dict(db.session.query(Inventory.item_id, Inventory.stock_quantity))
+	assert [stocks[item_id] for item_id in item_ids[: report["rows"]]] == [5] * report["rows"]
+	assert [stocks[item_id] for item_id in item_ids[report["rows"] :]] == [1] * (1200 - report["rows"])
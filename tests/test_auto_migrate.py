@@ -1,45 +1,64 @@
-from app import (
-	_auto_migrate_dev_database,
-	app as flask_app,
-	configure_app,
-	db,
-)
-from app.db_models import Inventory, Item
+import datetime
+
+import pytest
+from sqlalchemy import inspect, text
+
+from app import create_app, db
+from app.db_models import DailySalesRollup, Inventory, Item, SchemaMigration, User
+from app.migrations import MIGRATIONS, upgrade_database
 from app.seed_data import DEFAULT_ITEMS
 
 
-def _prepare_empty_db(tmp_path):
-	test_db = tmp_path / "auto_seed.sqlite"
-	configure_app(
-		flask_app,
+@pytest.fixture
+def flask_app(tmp_path):
+	flask_app = create_app(
 		{
 			"TESTING": True,
-			"SQLALCHEMY_DATABASE_URI": f"sqlite:///{test_db}",
+			"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'auto_seed.sqlite'}",
 			"ADMIN_API_TOKEN": "test-token",
 			"WTF_CSRF_ENABLED": False,
 			"MAIL_SUPPRESS_SEND": True,
 		},
 	)
+	yield flask_app
+	with flask_app.app_context():
+		db.session.remove()
+		db.engine.dispose()
+
+
+def _prepare_empty_db(flask_app):
 	with flask_app.app_context():
 		db.session.remove()
 		db.drop_all()
 		db.create_all()
-	return test_db
 
 
-def test_auto_migrate_seeds_items_when_db_empty(tmp_path, monkeypatch):
-	_prepare_empty_db(tmp_path)
-	monkeypatch.setenv("FLASK_DEBUG", "1")
+def test_creating_the_app_does_not_touch_the_database(flask_app):
+	with flask_app.app_context():
+		assert inspect(db.engine).get_table_names() == []
+
+
+def test_init_db_and_seed_commands_prepare_an_empty_database(flask_app):
+	runner = flask_app.test_cli_runner()
+
+	result = runner.invoke(args=["init-db"])
+	assert result.exit_code == 0, result.output
+	result = runner.invoke(args=["seed"])
+	assert result.exit_code == 0, result.output
+	assert f"Added {len(DEFAULT_ITEMS)} items and the default admin" in result.output
 
 	with flask_app.app_context():
-		_auto_migrate_dev_database()
 		assert Item.query.count() == len(DEFAULT_ITEMS)
 		assert Inventory.query.count() == len(DEFAULT_ITEMS)
+		assert User.query.filter_by(admin=True).count() == 1
+		assert SchemaMigration.query.count() == len(MIGRATIONS)
 
+	assert "Added 0 items" in runner.invoke(args=["seed"]).output
+	assert "up to date" in runner.invoke(args=["migrate"]).output
 
-def test_auto_migrate_adds_inventory_for_existing_items(tmp_path, monkeypatch):
-	_prepare_empty_db(tmp_path)
-	monkeypatch.setenv("FLASK_DEBUG", "1")
+
+def test_upgrade_adds_inventory_for_existing_items(flask_app):
+	_prepare_empty_db(flask_app)
 
 	with flask_app.app_context():
 		item = Item(
@@ -54,7 +73,84 @@ def test_auto_migrate_adds_inventory_for_existing_items(tmp_path, monkeypatch):
 		db.session.commit()
 		assert Inventory.query.count() == 0
 
-		_auto_migrate_dev_database()
+		upgrade_database()
 		db.session.refresh(item)
 		assert Inventory.query.count() == 1
 		assert item.inventory.is_published is True
+		assert upgrade_database() == []
+
+
+# The schema of the first release, before any migration: no cart_count, no indexes, no newer tables.
+_BASELINE_SCHEMA = [
+	"CREATE TABLE items (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, price FLOAT NOT NULL, "
+	"category TEXT NOT NULL, image VARCHAR(250) NOT NULL, details VARCHAR(250) NOT NULL, price_id VARCHAR(250) NOT NULL)",
+	"CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL, email VARCHAR(50) NOT NULL, "
+	"phone VARCHAR(50) NOT NULL, password VARCHAR(250) NOT NULL, admin BOOLEAN, email_confirmed BOOLEAN)",
+	"CREATE TABLE cart (id INTEGER PRIMARY KEY, uid INTEGER NOT NULL REFERENCES users (id), "
+	"itemid INTEGER NOT NULL REFERENCES items (id), quantity INTEGER NOT NULL)",
+	"CREATE TABLE inventory (id INTEGER PRIMARY KEY, item_id INTEGER NOT NULL UNIQUE REFERENCES items (id), "
+	"stock_quantity INTEGER NOT NULL, low_stock_threshold INTEGER NOT NULL, is_published BOOLEAN NOT NULL, "
+	"updated_at DATETIME NOT NULL)",
+	"CREATE TABLE inventory_logs (id INTEGER PRIMARY KEY, item_id INTEGER NOT NULL REFERENCES items (id), "
+	"user_id INTEGER REFERENCES users (id), change_type VARCHAR(50) NOT NULL, field_name VARCHAR(50) NOT NULL, "
+	"old_value VARCHAR(250), new_value VARCHAR(250), note VARCHAR(250), created_at DATETIME NOT NULL)",
+	"CREATE TABLE orders (id INTEGER PRIMARY KEY, uid INTEGER NOT NULL REFERENCES users (id), "
+	"date DATETIME NOT NULL, status VARCHAR(50) NOT NULL)",
+	"CREATE TABLE ordered_items (id INTEGER PRIMARY KEY, oid INTEGER NOT NULL REFERENCES orders (id), "
+	"itemid INTEGER NOT NULL REFERENCES items (id), quantity INTEGER NOT NULL REFERENCES cart (quantity), "
+	"price_at_purchase FLOAT)",
+]
+
+
+def test_migrate_brings_a_baseline_database_up_to_date(flask_app):
+	with flask_app.app_context():
+		for statement in _BASELINE_SCHEMA:
+			db.session.execute(text(statement))
+		db.session.execute(text("INSERT INTO users (id, name, email, phone, password) VALUES (1, 'A', 'a@example.com', '0', 'x')"))
+		db.session.execute(
+			text(
+				"INSERT INTO items (id, name, price, category, image, details, price_id) "
+				"VALUES (1, 'One', 5.0, 'Misc', '/x.png', 'd', 'p1'), (2, 'Two', 7.0, 'Misc', '/x.png', 'd', 'p2')"
+			)
+		)
+		db.session.execute(text("INSERT INTO cart (uid, itemid, quantity) VALUES (1, 1, 2), (1, 2, 3), (1, 1, 4)"))
+		db.session.execute(
+			text(
+				"INSERT INTO orders (id, uid, date, status) VALUES "
+				"(1, 1, '2024-03-01 10:00:00', 'completed'), (2, 1, '2024-03-01 18:00:00', 'processing'), "
+				"(3, 1, '2024-03-02 09:00:00', 'Cancelled')"
+			)
+		)
+		db.session.execute(
+			text(
+				"INSERT INTO ordered_items (oid, itemid, quantity, price_at_purchase) VALUES "
+				"(1, 1, 2, 4.0), (2, 1, 1, NULL), (3, 2, 5, 7.0)"
+			)
+		)
+		db.session.commit()
+
+	result = flask_app.test_cli_runner().invoke(args=["migrate"])
+	assert result.exit_code == 0, result.output
+	assert "Applied migrations: " + ", ".join(migration.version for migration in MIGRATIONS) in result.output
+
+	with flask_app.app_context():
+		inspector = inspect(db.engine)
+		assert set(db.metadata.tables) <= set(inspector.get_table_names())
+		assert SchemaMigration.query.count() == len(MIGRATIONS)
+		user_indexes = {index["name"]: index for index in inspector.get_indexes("users")}
+		assert user_indexes["ix_users_email"]["unique"]
+		cart_indexes = {index["name"]: index for index in inspector.get_indexes("cart")}
+		assert cart_indexes["uq_cart_uid_itemid"]["unique"]
+		assert "ix_orders_date" in {index["name"] for index in inspector.get_indexes("orders")}
+		assert Inventory.query.count() == 2
+		assert db.session.execute(text("SELECT cart_count FROM users WHERE id = 1")).scalar() == 9
+		lines = db.session.execute(text("SELECT itemid, quantity FROM cart ORDER BY itemid")).all()
+		assert [tuple(line) for line in lines] == [(1, 6), (2, 3)]
+		# Past orders reach the dashboard rollup without a manual rollup-rebuild.
+		rollups = [(row.day, row.item_id, row.units, row.revenue, row.orders) for row in DailySalesRollup.query]
+		assert rollups == [(datetime.date(2024, 3, 1), 1, 3, 13.0, 2)]
+
+		plan = db.session.execute(text("EXPLAIN QUERY PLAN SELECT * FROM users WHERE email = 'a@example.com'")).all()
+		assert "ix_users_email" in " ".join(str(row[-1]) for row in plan)
+
+	assert "up to date" in flask_app.test_cli_runner().invoke(args=["migrate"]).output
@@ -0,0 +1,23 @@
+from app.cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+	cache = LRUCache(maxsize=2)
+	cache.set("a", 1)
+	cache.set("b", 2)
+	assert cache.get("a") == 1
+	cache.set("c", 3)
+	assert "b" not in cache
+	assert cache.get("a") == 1
+	assert cache.get("c") == 3
+
+
+def test_lru_cache_expires_entries_after_ttl():
+	now = [100.0]
+	cache = LRUCache(maxsize=4, ttl=10, clock=lambda: now[0])
+	cache.set("a", 1)
+	now[0] += 9.9
+	assert cache.get("a") == 1
+	now[0] += 0.2
+	assert cache.get("a", "gone") == "gone"
+	assert len(cache) == 0
@@ -0,0 +1,178 @@
+import json
+
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+
+from app.cart_codec import encode_cart
+from app.db_models import Cart, Item, User, db
+
+
+def _items(count):
+	items = [
+		Item(name=f"Cart item {i}", price=1.5 + i, category="Misc", image="/x.png", details="d", price_id=f"price_{i}")
+		for i in range(count)
+	]
+	db.session.add_all(items)
+	db.session.commit()
+	return items
+
+
+def _selects(statements):
+	return [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+
+def _login(client, email="buyer@example.com", password="secret-pass"):
+	user = User(
+		name="Buyer",
+		email=email,
+		phone="000",
+		password=generate_password_hash(password, method="pbkdf2:sha256", salt_length=8),
+	)
+	db.session.add(user)
+	db.session.commit()
+	client.post("/login", data={"email": email, "password": password})
+	return user
+
+
+def test_guest_cart_resolves_items_with_one_query(app, client, query_budget):
+	items = _items(3)
+	cookie = {str(item.id): 2 for item in items}
+	cookie["999999"] = 1
+	client.set_cookie("cart", encode_cart(cookie, app.config["SECRET_KEY"]))
+
+	with query_budget(2) as statements:
+		response = client.get("/cart")
+		body = response.get_data(as_text=True)
+	assert response.status_code == 200
+	assert all(item.name in body for item in items)
+	assert len([s for s in _selects(statements) if "FROM items" in s]) == 1
+	# The navbar badge counts what the cookie holds without a second load.
+	assert 'cart-badge">7<' in body
+
+
+def test_user_cart_page_and_api_share_one_load(app, client, query_budget):
+	items = _items(2)
+	user = _login(client)
+	db.session.add_all([
+		Cart(uid=user.id, itemid=items[0].id, quantity=1),
+		Cart(uid=user.id, itemid=items[1].id, quantity=2),
+	])
+	db.session.commit()
+
+	with query_budget(5) as statements:
+		response = client.get("/cart")
+		body = response.get_data(as_text=True)
+	assert response.status_code == 200
+	assert "Grand Total: $" in body
+	assert len([s for s in _selects(statements) if "FROM cart" in s]) == 1
+
+	api = json.loads(client.get("/api/get-cart").get_data(as_text=True))
+	assert api == {"cart": {str(items[0].id): 1, str(items[1].id): 2}}
+
+
+def test_user_cart_count_is_denormalized(app, client, query_budget):
+	items = _items(2)
+	user = _login(client)
+	client.post(f"/add/{items[0].id}", data={"quantity": "2"})
+	client.post(f"/add/{items[1].id}", data={"quantity": "3"})
+	db.session.refresh(user)
+	assert user.cart_count == 5
+
+	with query_budget(1) as statements:
+		body = client.get("/cgu").get_data(as_text=True)
+	assert 'cart-badge">5<' in body
+	assert not [s for s in statements if "FROM cart" in s]
+
+	client.get(f"/remove/{items[1].id}/3")
+	db.session.refresh(user)
+	assert user.cart_count == 2
+
+
+def test_invalid_quantities_leave_the_cart_and_its_count_alone(app, client):
+	items = _items(1)
+	user = _login(client)
+	client.post(f"/add/{items[0].id}", data={"quantity": "2"})
+
+	for quantity in ("-5", "0", "abc", ""):
+		response = client.post(f"/add/{items[0].id}", data={"quantity": quantity})
+		assert response.status_code == 302
+	for quantity in ("-3", "0", "abc"):
+		response = client.get(f"/remove/{items[0].id}/{quantity}")
+		assert response.status_code == 302
+
+	db.session.refresh(user)
+	assert user.cart_count == 2
+	assert [line.quantity for line in Cart.query.filter_by(uid=user.id)] == [2]
+
+	guest = app.test_client()
+	assert guest.post(f"/add/{items[0].id}", data={"quantity": "-1"}).status_code == 302
+	assert guest.get_cookie("cart") is None
+
+
+def test_guest_cart_count_comes_from_signed_cart_cookie(app, client, query_budget):
+	items = _items(1)
+	client.post(f"/add/{items[0].id}", data={"quantity": "4"})
+
+	with query_budget(0):
+		body = client.get("/cgu").get_data(as_text=True)
+	assert 'cart-badge">4<' in body
+
+	# A tampered cart is ignored rather than trusted.
+	forged = client.get_cookie("cart").value.replace(".", "x.", 1)
+	client.set_cookie("cart", forged)
+	response = client.get("/cgu")
+	assert 'cart-badge' not in response.get_data(as_text=True)
+
+
+def test_adding_an_item_twice_keeps_one_line(app, client):
+	items = _items(1)
+	user = _login(client)
+	client.post(f"/add/{items[0].id}", data={"quantity": "2"})
+	client.post(f"/add/{items[0].id}", data={"quantity": "3"})
+
+	lines = Cart.query.filter_by(uid=user.id).all()
+	assert [(line.itemid, line.quantity) for line in lines] == [(items[0].id, 5)]
+
+	client.get(f"/remove/{items[0].id}/2")
+	db.session.expire_all()
+	assert Cart.query.filter_by(uid=user.id).one().quantity == 3
+	assert db.session.get(User, user.id).cart_count == 3
+
+
+def test_login_merges_guest_cart_with_one_cart_read(app, client, query_budget):
+	items = _items(3)
+	user = User(
+		name="Buyer",
+		email="buyer@example.com",
+		phone="000",
+		password=generate_password_hash("secret-pass", method="pbkdf2:sha256", salt_length=8),
+		cart_count=4,
+	)
+	db.session.add(user)
+	db.session.flush()
+	# Two lines for the same item, as older versions could leave behind.
+	db.session.execute(text("DROP INDEX uq_cart_uid_itemid"))
+	db.session.execute(
+		Cart.__table__.insert(),
+		[
+			{"uid": user.id, "itemid": items[0].id, "quantity": 1},
+			{"uid": user.id, "itemid": items[1].id, "quantity": 2},
+			{"uid": user.id, "itemid": items[0].id, "quantity": 1},
+		],
+	)
+	db.session.commit()
+
+	cookie = {str(items[0].id): 2, str(items[2].id): 5}
+	client.set_cookie("cart", encode_cart(cookie, app.config["SECRET_KEY"]))
+	with query_budget(6) as statements:
+		client.post("/login", data={"email": "buyer@example.com", "password": "secret-pass"})
+
+	assert len([s for s in _selects(statements) if "FROM cart" in s]) == 1
+	db.session.expire_all()
+	lines = Cart.query.filter_by(uid=user.id).order_by(Cart.itemid).all()
+	assert [(line.itemid, line.quantity) for line in lines] == [
+		(items[0].id, 4),
+		(items[1].id, 2),
+		(items[2].id, 5),
+	]
+	assert db.session.get(User, user.id).cart_count == 11
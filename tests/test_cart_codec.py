@@ -0,0 +1,59 @@
+import base64
+import json
+
+import pytest
+from itsdangerous import Signer
+
+from app.cart_codec import (
+	MAX_CART_ENTRIES,
+	MAX_QUANTITY,
+	CartTooLarge,
+	decode_cart,
+	encode_cart,
+	pack_cart,
+	unpack_cart,
+)
+
+
+SECRET = "test-secret"
+
+
+def _signed(payload: bytes) -> str:
+	encoded = base64.urlsafe_b64encode(payload).rstrip(b"=")
+	return Signer(SECRET, salt="cart").sign(encoded).decode()
+
+
+def test_round_trip_is_smaller_than_json():
+	cart = {"3": 2, "150": 1, "70000": 12, "4": "5"}
+	value = encode_cart(cart, SECRET)
+	assert decode_cart(value, SECRET) == {3: 2, 4: 5, 150: 1, 70000: 12}
+	assert len(value) < len(json.dumps(cart)) + len("40.signature-of-the-count-cookie")
+
+	large = {str(item_id): 3 for item_id in range(1000, 1000 + MAX_CART_ENTRIES)}
+	assert len(encode_cart(large, SECRET)) < len(json.dumps(large)) / 2
+
+
+def test_normalizes_entries_and_caps_the_cart():
+	assert unpack_cart(pack_cart({"1": 0, "x": 3, "2": -1, "5": 10**6})) == {5: MAX_QUANTITY}
+	with pytest.raises(CartTooLarge):
+		encode_cart({str(item_id): 1 for item_id in range(1, MAX_CART_ENTRIES + 2)}, SECRET)
+
+
+@pytest.mark.parametrize(
+	"value",
+	[
+		None,
+		"",
+		'{"1": 2}',
+		encode_cart({"1": 2}, "another-secret"),
+		encode_cart({"1": 2}, SECRET)[:-1] + "x",
+		_signed(bytes([1, 1, 0x80])),  # truncated varint
+		_signed(bytes([1, 1, 1, 1, 0])),  # trailing byte
+		_signed(bytes([1, 2, 1, 1, 0, 1])),  # repeated id
+		_signed(bytes([1, MAX_CART_ENTRIES + 1])),
+		_signed(bytes([9, 0])),
+		"a" * 5000,
+	],
+)
+def test_forged_or_malformed_cookies_decode_to_an_empty_cart(value):
+	assert decode_cart(value, SECRET) == {}
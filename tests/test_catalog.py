@@ -0,0 +1,62 @@
+from app import catalog
+from app.db_models import CacheVersion, Item, db
+
+
+def test_item_page_and_listing_are_served_from_cache(client, query_budget, create_item):
+	created = create_item(name="Cached Item")
+
+	with query_budget(2) as statements:
+		assert client.get("/").status_code == 200
+	assert len([s for s in statements if "FROM items" in s]) == 1
+	with query_budget(0):
+		assert client.get("/").status_code == 200
+		response = client.get(f"/item/{created['id']}")
+		assert "Cached Item" in response.get_data(as_text=True)
+
+
+def test_home_paginates_published_items_by_keyset(client, create_item):
+	first = create_item(name="Page One Item")
+	create_item(name="Hidden Between", is_published=False)
+	second = create_item(name="Page Two Item")
+
+	response = client.get("/?limit=1")
+	assert response.status_code == 200
+	body = response.get_data(as_text=True)
+	assert "Page One Item" in body
+	assert "Page Two Item" not in body
+	assert f"after={first['id']}" in body
+
+	response = client.get(f"/?after={first['id']}&limit=1")
+	body = response.get_data(as_text=True)
+	assert "Page Two Item" in body
+	assert "Hidden Between" not in body
+	assert f"after={second['id']}" not in body
+
+
+def test_admin_writes_bump_version_and_invalidate(client, admin_headers, create_item):
+	created = create_item(name="Cached Item")
+	client.get(f"/item/{created['id']}")
+	version = db.session.get(CacheVersion, catalog.CATALOG_VERSION_NAME).version
+
+	client.patch(f"/admin/api/items/{created['id']}", json={"name": "Renamed"}, headers=admin_headers)
+	db.session.expire_all()
+	assert db.session.get(CacheVersion, catalog.CATALOG_VERSION_NAME).version == version + 1
+	assert "Renamed" in client.get(f"/item/{created['id']}").get_data(as_text=True)
+
+	client.patch(f"/admin/api/items/{created['id']}", json={"is_published": False}, headers=admin_headers)
+	assert "Renamed" not in client.get("/").get_data(as_text=True)
+
+
+def test_other_workers_detect_version_change(app, client, create_item):
+	created = create_item(name="Cached Item")
+	client.get(f"/item/{created['id']}")
+
+	# Simulate a write made by another process: data and version change, local cache untouched.
+	Item.query.filter_by(id=created["id"]).update({Item.name: "Changed elsewhere"})
+	CacheVersion.query.filter_by(name=catalog.CATALOG_VERSION_NAME).update({CacheVersion.version: CacheVersion.version + 1})
+	db.session.commit()
+
+	app.config["CATALOG_VERSION_POLL_SECONDS"] = 3600
+	assert "Cached Item" in client.get(f"/item/{created['id']}").get_data(as_text=True)
+	app.config["CATALOG_VERSION_POLL_SECONDS"] = 0
+	assert "Changed elsewhere" in client.get(f"/item/{created['id']}").get_data(as_text=True)
@@ -0,0 +1,90 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.db_models import Cart, Inventory, Item, StockReservation, User, db
+from app.payments import FakeGateway, PaymentGateway, PaymentUnavailable, set_gateway
+from app.reservations import STATUS_RELEASED
+
+
+@pytest.fixture
+def gateway(app, monkeypatch):
+	monkeypatch.setitem(app.config, "STRIPE_DISABLED", False)
+	fake = FakeGateway()
+	set_gateway(app, fake)
+	yield fake
+	set_gateway(app, None)
+
+
+def _buyer(client, lines):
+	user = User(
+		name="Buyer",
+		email="buyer@example.com",
+		phone="000",
+		password=generate_password_hash("secret-pass", method="pbkdf2:sha256", salt_length=8),
+	)
+	db.session.add(user)
+	db.session.flush()
+	items = []
+	for index, quantity in enumerate(lines):
+		item = Item(name=f"Item {index}", price=3.0, category="Misc", image="/x.png", details="d", price_id=f"price_{index}")
+		db.session.add(item)
+		db.session.flush()
+		db.session.add(Inventory(item=item, stock_quantity=10))
+		db.session.add(Cart(uid=user.id, itemid=item.id, quantity=quantity))
+		items.append(item)
+	db.session.commit()
+	client.post("/login", data={"email": user.email, "password": "secret-pass"})
+	return user, items
+
+
+def test_checkout_builds_line_items_from_the_cart(app, client, gateway):
+	user, items = _buyer(client, [2, 1])
+
+	response = client.post("/create-checkout-session", data={"price_ids": "[{'price': 'price_free', 'quantity': 99}]"})
+
+	assert response.status_code == 303
+	session = gateway.sessions[0]
+	assert response.headers["Location"].endswith(f"session_id={session['id']}")
+	assert session["client_reference_id"] == user.id
+	assert session["line_items"] == [{"price": "price_0", "quantity": 2}, {"price": "price_1", "quantity": 1}]
+	assert StockReservation.query.count() == 2
+
+
+def test_price_edit_reaches_the_next_checkout(app, client, gateway, admin_headers):
+	_, items = _buyer(client, [1])
+	client.post("/create-checkout-session")
+
+	response = client.patch(f"/admin/api/items/{items[0].id}", json={"price_id": "price_new"}, headers=admin_headers)
+	assert response.status_code == 200
+	client.post("/create-checkout-session")
+
+	assert [session["line_items"][0]["price"] for session in gateway.sessions] == ["price_0", "price_new"]
+
+
+def test_gateway_failure_fails_fast_and_releases_the_hold(app, client, gateway):
+	_, items = _buyer(client, [2])
+	gateway.error = PaymentUnavailable("Gateway down")
+
+	response = client.post("/create-checkout-session")
+
+	assert response.status_code == 302
+	assert response.headers["Location"].endswith("/payment_failure")
+	assert StockReservation.query.one().status == STATUS_RELEASED
+	db.session.expire_all()
+	assert Inventory.query.filter_by(item_id=items[0].id).one().reserved_quantity == 0
+
+
+def test_payment_metrics_are_admin_only(app, client, gateway, admin_headers):
+	assert client.get("/admin/api/payments/metrics", headers={"Accept": "application/json"}).status_code == 401
+
+	response = client.get("/admin/api/payments/metrics", headers=admin_headers)
+
+	assert response.get_json() == {"gateway": "fake", "circuit": None, "operations": {}}
+
+
+def test_gateways_must_implement_checkout():
+	class Incomplete(PaymentGateway):
+		name = "incomplete"
+
+	with pytest.raises(TypeError):
+		Incomplete()
@@ -0,0 +1,60 @@
+import logging
+
+from app.db_models import Inventory, Item, db
+from app.instrumentation import get_route_metrics
+
+
+def _items(count):
+	for index in range(count):
+		item = Item(name=f"Item {index}", price=1.0, category="Misc", image="/x.png", details="d", price_id=f"p{index}")
+		db.session.add(item)
+		db.session.flush()
+		db.session.add(Inventory(item=item, stock_quantity=3))
+	db.session.commit()
+
+
+def test_requests_are_recorded_per_endpoint(app, client, admin_headers):
+	_items(3)
+	get_route_metrics(app).clear()
+
+	for _ in range(4):
+		assert client.get("/").status_code == 200
+	client.get("/no-such-page")
+
+	routes = client.get("/admin/api/metrics", headers=admin_headers).get_json()["routes"]
+	home = routes["home"]
+	assert home["requests"] == home["window"] == 4
+	# The first request fills the catalog cache; the others are served from it.
+	assert home["queries_sum"] >= 1
+	assert home["queries"]["p50"] <= home["queries"]["p99"] and home["queries"]["p99"] >= 1
+	assert 0 < home["db_seconds_sum"] <= home["seconds_sum"]
+	assert home["seconds"]["p50"] <= home["seconds"]["p99"]
+	assert routes["<unmatched>"]["requests"] == 1
+
+
+def test_metrics_in_prometheus_format(app, client, admin_headers):
+	client.get("/")
+
+	response = client.get("/admin/api/metrics?format=prometheus", headers=admin_headers)
+
+	assert response.content_type.startswith("text/plain; version=0.0.4")
+	body = response.get_data(as_text=True)
+	assert "# TYPE app_request_duration_seconds summary" in body
+	assert 'app_request_queries{endpoint="home",quantile="0.99"}' in body
+	assert 'app_request_db_seconds_count{endpoint="home"} 1' in body
+
+
+def test_metrics_are_admin_only(app, client):
+	assert client.get("/admin/api/metrics", headers={"Accept": "application/json"}).status_code == 401
+
+
+def test_slow_queries_are_logged_with_their_parameters(app, client, caplog, monkeypatch):
+	_items(1)
+	monkeypatch.setitem(app.config, "SLOW_QUERY_THRESHOLD_MS", 0)
+
+	with caplog.at_level(logging.WARNING, logger="app.instrumentation"):
+		client.get("/item/1")
+
+	messages = [record.getMessage() for record in caplog.records if record.name == "app.instrumentation"]
+	assert any("Slow query" in message and "item" in message and "FROM items" in message for message in messages)
+	assert any("parameters=(1," in message for message in messages)
@@ -0,0 +1,52 @@
+from sqlalchemy import event
+
+from app.db_models import Cart, DailySalesRollup, Inventory, InventoryLog, Item, Order, Ordered_item, User, db
+from app.funcs import fulfill_order
+
+
+def _make_cart(lines):
+	user = User(name="Buyer", email="buyer@example.com", phone="000", password="x")
+	db.session.add(user)
+	db.session.flush()
+	items = []
+	for index, (price, stock, quantity) in enumerate(lines):
+		item = Item(name=f"Item {index}", price=price, category="Misc", image="/x.png", details="d", price_id=f"p{index}")
+		db.session.add(item)
+		db.session.flush()
+		db.session.add(Inventory(item=item, stock_quantity=stock))
+		db.session.add(Cart(uid=user.id, itemid=item.id, quantity=quantity))
+		items.append(item)
+	db.session.commit()
+	return user, items
+
+
+def test_fulfill_order_runs_in_a_single_commit(app):
+	user, items = _make_cart([(10.0, 5, 2), (3.5, 1, 4)])
+	commits = []
+
+	def count_commit(conn):
+		commits.append(conn)
+
+	event.listen(db.engine, "commit", count_commit)
+	try:
+		order = fulfill_order({"client_reference_id": str(user.id)})
+	finally:
+		event.remove(db.engine, "commit", count_commit)
+
+	assert len(commits) == 1
+	lines = Ordered_item.query.filter_by(oid=order.id).order_by(Ordered_item.itemid).all()
+	assert [(line.itemid, line.quantity, line.price_at_purchase) for line in lines] == [
+		(items[0].id, 2, 10.0),
+		(items[1].id, 4, 3.5),
+	]
+	assert Cart.query.filter_by(uid=user.id).count() == 0
+	assert [db.session.get(Inventory, item.inventory.id).stock_quantity for item in items] == [3, 0]
+	assert {log.note for log in InventoryLog.query.filter_by(change_type="order")} == {f"Order #{order.id}"}
+	assert db.session.query(db.func.sum(DailySalesRollup.revenue)).scalar() == 2 * 10.0 + 4 * 3.5
+
+
+def test_fulfill_order_with_empty_cart_still_records_order(app):
+	user, _ = _make_cart([])
+	order = fulfill_order({"client_reference_id": user.id})
+	assert Order.query.count() == 1
+	assert Ordered_item.query.filter_by(oid=order.id).count() == 0
@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from app.payments import CircuitBreaker, PaymentError, PaymentUnavailable, StripeGateway
+
+
+class _StandIn(BaseHTTPRequestHandler):
+	"""Answers POST /v1/checkout/sessions like the Stripe API, as scripted by the test."""
+
+	protocol_version = "HTTP/1.1"
+
+	def do_POST(self):
+		server = self.server
+		body = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+		server.requests.append(
+			{
+				"path": self.path,
+				"port": self.client_address[1],
+				"idempotency_key": self.headers.get("Idempotency-Key"),
+				"body": body,
+			}
+		)
+		status, payload = server.responses.pop(0) if server.responses else (200, None)
+		if server.delay:
+			time.sleep(server.delay)
+		if payload is None:
+			payload = {
+				"id": f"cs_test_{len(server.requests)}",
+				"object": "checkout.session",
+				"url": "https://checkout.example/pay",
+			}
+		data = json.dumps(payload).encode()
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+	def log_message(self, *args):
+		pass
+
+
+@pytest.fixture
+def stand_in():
+	server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+	server.requests, server.responses, server.delay = [], [], 0
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	yield server
+	server.shutdown()
+	server.server_close()
+
+
+class _Clock:
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+
+def _gateway(server, **overrides):
+	options = {"api_base": f"http://127.0.0.1:{server.server_port}", "retry_backoff": 0}
+	options.update(overrides)
+	return StripeGateway("sk_test_stand_in", **options)
+
+
+def _checkout(gateway):
+	return gateway.create_checkout_session(
+		client_reference_id=7,
+		line_items=[{"price": "price_1", "quantity": 2}],
+		metadata={"reservation": "r1"},
+		expires_at=2_000_000_000,
+		success_url="http://shop.example/payment_success",
+		cancel_url="http://shop.example/payment_failure",
+	)
+
+
+def test_calls_share_one_keep_alive_connection(stand_in):
+	gateway = _gateway(stand_in)
+
+	sessions = [_checkout(gateway) for _ in range(3)]
+
+	assert [session.id for session in sessions] == ["cs_test_1", "cs_test_2", "cs_test_3"]
+	assert {request["port"] for request in stand_in.requests} == {stand_in.requests[0]["port"]}
+	assert stand_in.requests[0]["path"] == "/v1/checkout/sessions"
+	assert stand_in.requests[0]["body"]["line_items[0][price]"] == ["price_1"]
+	assert gateway.metrics.snapshot()["checkout.sessions.create"]["calls"] == 3
+	gateway.close()
+
+
+def test_server_errors_are_retried_with_the_same_idempotency_key(stand_in):
+	stand_in.responses.append((503, {"error": {"message": "Try again"}}))
+	gateway = _gateway(stand_in, max_retries=2)
+
+	assert _checkout(gateway).id == "cs_test_2"
+	keys = [request["idempotency_key"] for request in stand_in.requests]
+	assert len(keys) == 2 and keys[0] and keys[0] == keys[1]
+	assert gateway.metrics.snapshot()["checkout.sessions.create"]["retries"] == 1
+
+
+def test_timeouts_open_the_circuit_until_a_trial_call_succeeds(stand_in):
+	clock = _Clock()
+	gateway = _gateway(
+		stand_in, read_timeout=0.1, max_retries=1, breaker=CircuitBreaker(2, reset_seconds=30, clock=clock)
+	)
+	stand_in.delay = 0.3
+
+	for _ in range(2):
+		with pytest.raises(PaymentUnavailable):
+			_checkout(gateway)
+	assert len(stand_in.requests) == 4
+	assert gateway.breaker.state == "open"
+
+	with pytest.raises(PaymentUnavailable):
+		_checkout(gateway)
+	assert len(stand_in.requests) == 4
+
+	stand_in.delay = 0
+	clock.now += 30
+	assert gateway.breaker.state == "half-open"
+	_checkout(gateway)
+	assert gateway.breaker.state == "closed"
+	metrics = gateway.metrics.snapshot()["checkout.sessions.create"]
+	assert (metrics["calls"], metrics["errors"], metrics["rejected"]) == (3, 2, 1)
+
+
+def test_refused_requests_do_not_trip_the_breaker(stand_in):
+	gateway = _gateway(stand_in, breaker=CircuitBreaker(1, reset_seconds=30))
+	stand_in.responses.append(
+		(400, {"error": {"type": "invalid_request_error", "message": "No such price: 'price_1'"}})
+	)
+
+	with pytest.raises(PaymentError) as excinfo:
+		_checkout(gateway)
+
+	assert not isinstance(excinfo.value, PaymentUnavailable)
+	assert len(stand_in.requests) == 1
+	assert gateway.breaker.state == "closed"
+
+
+def test_unexpected_errors_end_the_half_open_trial(stand_in):
+	clock = _Clock()
+	gateway = _gateway(stand_in, max_retries=0, breaker=CircuitBreaker(1, reset_seconds=30, clock=clock))
+	stand_in.responses.append((500, {"error": {"message": "Down"}}))
+	with pytest.raises(PaymentUnavailable):
+		_checkout(gateway)
+	clock.now += 30
+
+	def broken(options):
+		raise RuntimeError("unexpected")
+
+	with pytest.raises(RuntimeError):
+		gateway._call("checkout.sessions.create", broken)
+	assert gateway.breaker.state == "open"
+
+	clock.now += 30
+	assert _checkout(gateway).id == "cs_test_2"
+	assert gateway.breaker.state == "closed"
@@ -0,0 +1,85 @@
+from app import principals
+from app.db_models import CacheVersion, Cart, Item, User, db
+from app.principals import UserPrincipal, get_principal
+
+
+def _user(**overrides):
+	fields = {"name": "Cached User", "email": "cached@example.com", "phone": "000", "password": "x"}
+	fields.update(overrides)
+	user = User(**fields)
+	db.session.add(user)
+	db.session.commit()
+	return user
+
+
+def test_principal_is_served_from_cache(app, query_budget):
+	user_id = _user(admin=True).id
+
+	principal = get_principal(user_id)
+	assert isinstance(principal, UserPrincipal)
+	assert (principal.name, principal.admin, principal.email_confirmed) == ("Cached User", True, False)
+	assert principal.get_id() == str(user_id)
+
+	app.config["USER_VERSION_POLL_SECONDS"] = 3600
+	with query_budget(0):
+		assert get_principal(str(user_id)) is principal
+
+
+def test_user_row_changes_evict_the_principal(app):
+	user = _user()
+	app.config["USER_VERSION_POLL_SECONDS"] = 3600
+	get_principal(user.id)
+
+	user.email_confirmed = True
+	db.session.commit()
+	assert get_principal(user.id).email_confirmed is True
+
+	User.query.filter_by(id=user.id).update({User.name: "Renamed"}, synchronize_session=False)
+	db.session.commit()
+	assert get_principal(user.id).name == "Renamed"
+
+	Cart.query.filter_by(uid=user.id).delete()
+	db.session.delete(user)
+	db.session.commit()
+	assert get_principal(user.id) is None
+
+
+def test_cart_writes_keep_the_principal_and_the_version(app, client):
+	user = _user()
+	item = Item(name="Thing", price=2.0, category="Misc", image="/x.png", details="d", price_id="price_thing")
+	db.session.add(item)
+	db.session.commit()
+	cached = get_principal(user.id)
+
+	user.add_to_cart(item.id, 3)
+	user.remove_from_cart(item.id, 1)
+	# Fulfillment and bulk cart edits reset the counter with a bulk update.
+	User.query.filter_by(id=user.id).update({User.cart_count: 0}, synchronize_session=False)
+	db.session.commit()
+
+	assert get_principal(user.id) is cached
+	assert CacheVersion.query.filter_by(name=principals.USERS_VERSION_NAME).count() == 0
+
+
+def test_rolled_back_changes_keep_the_principal(app):
+	user = _user()
+	cached = get_principal(user.id)
+	user.name = "Never saved"
+	db.session.flush()
+	db.session.rollback()
+	assert get_principal(user.id) is cached
+
+
+def test_other_workers_detect_version_change(app):
+	user = _user()
+	assert get_principal(user.id).admin is False
+
+	# Simulate a write made by another process: row and version change, local cache untouched.
+	db.session.execute(User.__table__.update().where(User.__table__.c.id == user.id).values(admin=True))
+	db.session.merge(CacheVersion(name=principals.USERS_VERSION_NAME, version=1))
+	db.session.commit()
+
+	app.config["USER_VERSION_POLL_SECONDS"] = 3600
+	assert get_principal(user.id).admin is False
+	app.config["USER_VERSION_POLL_SECONDS"] = 0
+	assert get_principal(user.id).admin is True
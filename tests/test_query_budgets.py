@@ -0,0 +1,117 @@
+"""SQL statement budgets of the hot pages; a failure lists the statements that ran."""
+import datetime
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.cart_codec import encode_cart
+from app.db_models import Cart, Inventory, Item, Order, Ordered_item, User, db
+from app.rollups import rebuild_daily_sales_rollup
+
+
+ITEM_COUNT = 1_000
+
+
+@pytest.fixture
+def catalog(app):
+	"""ITEM_COUNT published items with inventory, inserted in bulk."""
+	db.session.execute(
+		Item.__table__.insert(),
+		[
+			{
+				"name": f"Item {index}",
+				"price": 1.0 + index % 50,
+				"category": "Bulk",
+				"image": "/x.png",
+				"details": "d",
+				"price_id": f"price_{index}",
+			}
+			for index in range(ITEM_COUNT)
+		],
+	)
+	item_ids = [row[0] for row in db.session.query(Item.id).order_by(Item.id)]
+	db.session.execute(
+		Inventory.__table__.insert(),
+		[{"item_id": item_id, "stock_quantity": item_id % 7, "low_stock_threshold": 2} for item_id in item_ids],
+	)
+	db.session.commit()
+	return item_ids
+
+
+def _buyer(client, item_ids):
+	user = User(
+		name="Buyer",
+		email="buyer@example.com",
+		phone="000",
+		password=generate_password_hash("secret-pass", method="pbkdf2:sha256", salt_length=8),
+	)
+	db.session.add(user)
+	db.session.flush()
+	db.session.add_all(Cart(uid=user.id, itemid=item_id, quantity=2) for item_id in item_ids)
+	user.cart_count = 2 * len(item_ids)
+	now = datetime.datetime.utcnow()
+	for day in range(20):
+		order = Order(uid=user.id, date=now - datetime.timedelta(days=day), status="processing")
+		db.session.add(order)
+		db.session.flush()
+		db.session.add_all(
+			Ordered_item(oid=order.id, itemid=item_id, quantity=1, price_at_purchase=3.0) for item_id in item_ids[:5]
+		)
+	db.session.commit()
+	rebuild_daily_sales_rollup()
+	client.post("/login", data={"email": user.email, "password": "secret-pass"})
+	return user
+
+
+def test_home_page(client, catalog, query_budget):
+	# Catalog version check and the keyset page; later pages cost the page query alone.
+	with query_budget(2):
+		assert client.get("/").status_code == 200
+	with query_budget(2):
+		assert client.get(f"/?after={catalog[500]}").status_code == 200
+
+
+def test_guest_cart(app, client, catalog, query_budget):
+	client.set_cookie("cart", encode_cart({item_id: 1 for item_id in catalog[:40]}, app.config["SECRET_KEY"]))
+
+	with query_budget(2):
+		assert client.get("/cart").status_code == 200
+
+
+def test_user_cart(client, catalog, query_budget):
+	_buyer(client, catalog[:40])
+
+	# Navbar cart counter, cart rows, catalog version, then the 40 items in one IN (...) query.
+	with query_budget(4):
+		assert client.get("/cart").status_code == 200
+
+
+def test_admin_dashboard(client, catalog, admin_headers, query_budget):
+	_buyer(client, catalog[:3])
+	client.get("/logout")
+
+	with query_budget(9):
+		assert client.get("/admin/", headers={"Authorization": admin_headers["Authorization"]}).status_code == 200
+
+
+def test_admin_items_api(client, catalog, admin_headers, query_budget):
+	with query_budget(3):
+		response = client.get("/admin/api/items", headers=admin_headers)
+		assert len(response.get_json()) == ITEM_COUNT
+
+	with query_budget(3):
+		response = client.get("/admin/api/items?format=ndjson", headers=admin_headers)
+		assert response.get_data(as_text=True).count("\n") == ITEM_COUNT
+
+
+def test_csv_export(client, catalog, admin_headers, query_budget):
+	with query_budget(3):
+		response = client.get("/admin/api/inventory/export", headers={"Authorization": admin_headers["Authorization"]})
+		assert response.get_data(as_text=True).count("\n") == ITEM_COUNT + 1
+
+
+def test_budget_failure_lists_the_statements(app, query_budget):
+	with pytest.raises(AssertionError, match=r"2 queries, budget is 1:\n  1\. SELECT"):
+		with query_budget(1):
+			Item.query.count()
+			Item.query.count()
@@ -0,0 +1,191 @@
+import calendar
+import datetime
+import json
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.db_models import Cart, Inventory, Item, StockReservation, User, db
+from app.funcs import fulfill_order
+from app.payments import FakeGateway, PaymentUnavailable, set_gateway
+from app.reservations import (
+	RELEASE_GRACE_SECONDS,
+	STATUS_CONVERTED,
+	STATUS_HELD,
+	STATUS_RELEASED,
+	InsufficientStock,
+	release_reservation,
+	reserve_stock,
+	sweep_expired_reservations,
+)
+from app.webhooks import enqueue_event
+
+
+def _item(stock, name="Hot item"):
+	item = Item(name=name, price=5.0, category="Misc", image="/x.png", details="d", price_id=f"price_{name}")
+	db.session.add(item)
+	db.session.flush()
+	db.session.add(Inventory(item=item, stock_quantity=stock))
+	db.session.commit()
+	return item
+
+
+def _stock(item_id):
+	db.session.expire_all()
+	inventory = Inventory.query.filter_by(item_id=item_id).one()
+	return inventory.stock_quantity, inventory.reserved_quantity
+
+
+def test_reservation_is_all_or_nothing(app):
+	plenty = _item(10, "Plenty")
+	scarce = _item(1, "Scarce")
+
+	with pytest.raises(InsufficientStock) as excinfo:
+		reserve_stock(None, [(plenty.id, 4), (scarce.id, 2)])
+	assert excinfo.value.item_ids == [scarce.id]
+	assert _stock(plenty.id) == (10, 0)
+	assert StockReservation.query.count() == 0
+
+	reserve_stock(None, [(plenty.id, 4), (scarce.id, 1)])
+	db.session.commit()
+	assert _stock(plenty.id) == (10, 4)
+	with pytest.raises(InsufficientStock):
+		reserve_stock(None, [(scarce.id, 1)])
+
+
+def test_fulfillment_converts_the_hold(app):
+	item = _item(5)
+	user = User(name="Buyer", email="buyer@example.com", phone="000", password="x")
+	db.session.add(user)
+	db.session.flush()
+	db.session.add(Cart(uid=user.id, itemid=item.id, quantity=2))
+	db.session.commit()
+
+	reference = reserve_stock(user.id, [(item.id, 2)])
+	db.session.commit()
+	fulfill_order({"client_reference_id": str(user.id), "metadata": {"reservation": reference}})
+
+	assert _stock(item.id) == (3, 0)
+	assert StockReservation.query.one().status == STATUS_CONVERTED
+	# A late release (expired session event, sweeper) cannot hand the units back twice.
+	assert release_reservation(reference) == 0
+	assert _stock(item.id) == (3, 0)
+
+
+def test_sweeper_releases_only_expired_holds(app):
+	item = _item(5)
+	now = datetime.datetime.utcnow()
+	reserve_stock(None, [(item.id, 1)], now=now - datetime.timedelta(hours=2))
+	reserve_stock(None, [(item.id, 2)], now=now)
+	db.session.commit()
+
+	assert sweep_expired_reservations(now=now) == 1
+	assert _stock(item.id) == (5, 2)
+	assert sorted(r.status for r in StockReservation.query) == [STATUS_HELD, STATUS_RELEASED]
+
+
+def test_failed_checkout_session_releases_the_hold(app, client, monkeypatch):
+	item = _item(3)
+	user = User(
+		name="Buyer",
+		email="buyer@example.com",
+		phone="000",
+		password=generate_password_hash("secret-pass", method="pbkdf2:sha256", salt_length=8),
+	)
+	db.session.add(user)
+	db.session.commit()
+	client.post("/login", data={"email": user.email, "password": "secret-pass"})
+	client.post(f"/add/{item.id}", data={"quantity": 2})
+	monkeypatch.setitem(app.config, "STRIPE_DISABLED", False)
+
+	created = {}
+
+	class FailingGateway(FakeGateway):
+		def create_checkout_session(self, **params):
+			created.update(params)
+			raise PaymentUnavailable("Stripe unavailable")
+
+	set_gateway(app, FailingGateway())
+	response = client.post("/create-checkout-session")
+	set_gateway(app, None)
+
+	assert response.headers["Location"].endswith("/payment_failure")
+	assert created["metadata"]["reservation"]
+	assert _stock(item.id) == (3, 0)
+	assert StockReservation.query.one().status == STATUS_RELEASED
+
+
+def test_short_hold_lasts_as_long_as_the_checkout_session(app, client, monkeypatch):
+	item = _item(3)
+	user = User(
+		name="Buyer",
+		email="buyer@example.com",
+		phone="000",
+		password=generate_password_hash("secret-pass", method="pbkdf2:sha256", salt_length=8),
+	)
+	db.session.add(user)
+	db.session.commit()
+	client.post("/login", data={"email": user.email, "password": "secret-pass"})
+	client.post(f"/add/{item.id}", data={"quantity": 1})
+	monkeypatch.setitem(app.config, "STRIPE_DISABLED", False)
+	monkeypatch.setitem(app.config, "RESERVATION_HOLD_SECONDS", 60)
+	gateway = FakeGateway()
+	set_gateway(app, gateway)
+	client.post("/create-checkout-session")
+	set_gateway(app, None)
+
+	session = gateway.sessions[0]
+	hold = StockReservation.query.one()
+	assert calendar.timegm(hold.expires_at.utctimetuple()) == session["expires_at"] + RELEASE_GRACE_SECONDS
+
+	# The session can still be paid until it expires, so the sweeper keeps the hold until then.
+	session_end = datetime.datetime.utcfromtimestamp(session["expires_at"])
+	assert sweep_expired_reservations(now=session_end) == 0
+	assert _stock(item.id) == (3, 1)
+
+
+def test_sweeper_keeps_holds_with_a_queued_completion(app):
+	item = _item(5)
+	now = datetime.datetime.utcnow()
+	paid = reserve_stock(None, [(item.id, 1)], now=now - datetime.timedelta(hours=2))
+	reserve_stock(None, [(item.id, 2)], now=now - datetime.timedelta(hours=2))
+	db.session.commit()
+	event = {"id": "evt_late", "data": {"object": {"metadata": {"reservation": paid}}}}
+	enqueue_event("evt_late", "checkout.session.completed", json.dumps(event))
+
+	assert sweep_expired_reservations(now=now) == 1
+	assert _stock(item.id) == (5, 1)
+	assert StockReservation.query.filter_by(reference=paid).one().status == STATUS_HELD
+
+
+def test_concurrent_checkouts_never_oversell(app):
+	stock, buyers = 25, 120
+	item_id = _item(stock).id
+	db.session.remove()
+
+	start = threading.Barrier(buyers)
+	outcomes = []
+
+	def checkout():
+		with app.app_context():
+			start.wait()
+			try:
+				reserve_stock(None, [(item_id, 1)])
+				db.session.commit()
+				outcomes.append("held")
+			except InsufficientStock:
+				outcomes.append("sold out")
+			finally:
+				db.session.remove()
+
+	threads = [threading.Thread(target=checkout) for _ in range(buyers)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	assert outcomes.count("held") == stock
+	assert outcomes.count("sold out") == buyers - stock
+	assert _stock(item_id) == (stock, stock)
+	assert StockReservation.query.filter_by(status=STATUS_HELD).count() == stock
@@ -0,0 +1,57 @@
+import pytest
+
+
+@pytest.fixture(params=["auto", "tokens"])
+def search_backend(request, app):
+	app.config["SEARCH_BACKEND"] = request.param
+	return request.param
+
+
+def test_search_matches_name_category_and_details_ranked_by_name(search_backend, client, create_item):
+	create_item(name="Laptop sleeve", category="Accessories", details="Fits a laptop")
+	create_item(name="Desk lamp", category="Office", details="Bright enough to read laptop labels")
+	create_item(name="Coffee mug", category="Kitchen", details="Ceramic")
+
+	body = client.get("/search?query=laptop").get_data(as_text=True)
+	assert "Laptop sleeve" in body
+	assert "Desk lamp" in body
+	assert "Coffee mug" not in body
+	assert body.index("Laptop sleeve") < body.index("Desk lamp")
+
+	body = client.get("/search?query=kitch").get_data(as_text=True)
+	assert "Coffee mug" in body
+
+
+def test_search_index_follows_admin_updates_and_deletes(search_backend, client, admin_headers, create_item):
+	item = create_item(name="Old name")
+	client.patch(f"/admin/api/items/{item['id']}", json={"name": "Renamed gadget"}, headers=admin_headers)
+
+	assert "Renamed gadget" in client.get("/search?query=gadget").get_data(as_text=True)
+	assert "No items found" in client.get("/search?query=old").get_data(as_text=True)
+
+	client.delete(f"/admin/api/items/{item['id']}", headers=admin_headers)
+	assert "No items found" in client.get("/search?query=gadget").get_data(as_text=True)
+
+
+def test_search_results_are_paginated(app, client, create_item):
+	app.config["SEARCH_PAGE_SIZE"] = 2
+	for index in range(3):
+		create_item(name=f"Widget {index}")
+
+	first_page = client.get("/search?query=widget").get_data(as_text=True)
+	assert "page=2" in first_page
+	second_page = client.get("/search?query=widget&page=2").get_data(as_text=True)
+	assert second_page.count("Widget ") == 1
+	assert "page=3" not in second_page
+
+
+
+def test_item_delete_clears_search_tokens_before_the_item(app, client, admin_headers, query_budget, create_item):
+	# Databases without FTS5 use search_tokens and enforce its foreign key to items.
+	app.config["SEARCH_BACKEND"] = "tokens"
+	item = create_item(name="Constrained gadget")
+	with query_budget(8) as statements:
+		response = client.delete(f"/admin/api/items/{item['id']}", headers=admin_headers)
+	assert response.status_code == 200, response.get_json()
+	tables = [statement.split()[2] for statement in statements if statement.startswith("DELETE FROM")]
+	assert tables.index("search_tokens") < tables.index("items")
@@ -0,0 +1,142 @@
+import datetime
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from app.db_models import Cart, Item, Order, ProcessedWebhookEvent, User, WebhookEvent, db
+from app import webhooks
+
+
+ENDPOINT_SECRET = "whsec_test"
+
+
+@pytest.fixture(autouse=True)
+def _clear_processed_cache():
+	webhooks._processed_cache.clear()
+	yield
+	webhooks._processed_cache.clear()
+
+
+@pytest.fixture
+def stripe_app(app, monkeypatch):
+	monkeypatch.setenv("ENDPOINT_SECRET", ENDPOINT_SECRET)
+	monkeypatch.setitem(app.config, "STRIPE_DISABLED", False)
+	return app
+
+
+def _signed_post(client, event):
+	payload = json.dumps(event)
+	timestamp = int(time.time())
+	signature = hmac.new(
+		ENDPOINT_SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+	).hexdigest()
+	return client.post(
+		"/stripe-webhook",
+		data=payload,
+		content_type="application/json",
+		headers={"Stripe-Signature": f"t={timestamp},v1={signature}"},
+	)
+
+
+def _checkout_event(event_id, uid):
+	return {
+		"id": event_id,
+		"object": "event",
+		"type": "checkout.session.completed",
+		"data": {"object": {"id": "cs_test", "client_reference_id": str(uid)}},
+	}
+
+
+def _buyer_with_cart():
+	user = User(name="Buyer", email="buyer@example.com", phone="000", password="x")
+	item = Item(name="Thing", price=2.0, category="Misc", image="/x.png", details="d", price_id="p")
+	db.session.add_all([user, item])
+	db.session.flush()
+	db.session.add(Cart(uid=user.id, itemid=item.id, quantity=3))
+	db.session.commit()
+	return user
+
+
+def test_webhook_queues_event_and_worker_fulfils_it(stripe_app, client):
+	user = _buyer_with_cart()
+
+	response = _signed_post(client, _checkout_event("evt_1", user.id))
+	assert response.status_code == 200
+	assert Order.query.count() == 0
+	assert WebhookEvent.query.one().status == webhooks.STATUS_PENDING
+
+	# Stripe retries of the same event are acknowledged without queueing twice.
+	assert _signed_post(client, _checkout_event("evt_1", user.id)).status_code == 200
+	assert WebhookEvent.query.count() == 1
+
+	assert webhooks.drain() == 1
+	assert WebhookEvent.query.one().status == webhooks.STATUS_DONE
+	assert Order.query.count() == 1
+	assert webhooks.drain() == 0
+
+
+def test_webhook_rejects_bad_signature(stripe_app, client):
+	response = client.post(
+		"/stripe-webhook",
+		data=json.dumps(_checkout_event("evt_bad", 1)),
+		content_type="application/json",
+		headers={"Stripe-Signature": "t=1,v1=deadbeef"},
+	)
+	assert response.status_code == 400
+	assert WebhookEvent.query.count() == 0
+
+
+def test_failed_events_are_retried_with_backoff(app, monkeypatch):
+	def explode(event):
+		raise RuntimeError("database unavailable")
+
+	monkeypatch.setitem(webhooks.EVENT_HANDLERS, "checkout.session.completed", explode)
+	monkeypatch.setattr(webhooks, "MAX_ATTEMPTS", 2)
+	webhooks.enqueue_event("evt_retry", "checkout.session.completed", json.dumps(_checkout_event("evt_retry", 1)))
+
+	assert webhooks.drain() == 1
+	queued = WebhookEvent.query.one()
+	assert queued.status == webhooks.STATUS_PENDING
+	assert queued.attempts == 1
+	assert "database unavailable" in queued.last_error
+	assert queued.next_attempt_at > datetime.datetime.utcnow()
+	assert webhooks.drain() == 0
+
+	queued.next_attempt_at = datetime.datetime.utcnow()
+	db.session.commit()
+	assert webhooks.drain() == 1
+	assert WebhookEvent.query.one().status == webhooks.STATUS_FAILED
+
+
+def test_replayed_event_is_answered_from_the_ledger(stripe_app, client, monkeypatch):
+	user = _buyer_with_cart()
+	_signed_post(client, _checkout_event("evt_replay", user.id))
+	webhooks.drain()
+	assert ProcessedWebhookEvent.query.filter_by(event_id="evt_replay").count() == 1
+
+	# Even with the queue pruned, a replay is recognised and never reaches fulfillment.
+	WebhookEvent.query.delete()
+	db.session.commit()
+	monkeypatch.setitem(webhooks.EVENT_HANDLERS, "checkout.session.completed", pytest.fail)
+	assert _signed_post(client, _checkout_event("evt_replay", user.id)).status_code == 200
+	assert WebhookEvent.query.count() == 0
+	assert Order.query.count() == 1
+
+
+def test_duplicate_queue_rows_fulfil_once(app):
+	user = _buyer_with_cart()
+	payload = json.dumps(_checkout_event("evt_dup", user.id))
+	webhooks.enqueue_event("evt_dup", "checkout.session.completed", payload)
+	assert webhooks.drain() == 1
+
+	# A second delivery that bypassed the front check (e.g. from another process) is a no-op.
+	webhooks._processed_cache.clear()
+	db.session.add(WebhookEvent(event_id="evt_dup-copy", event_type="checkout.session.completed", payload=payload))
+	db.session.add(ProcessedWebhookEvent(event_id="evt_dup-copy", event_type="checkout.session.completed"))
+	db.session.commit()
+	assert webhooks.drain() == 1
+	assert Order.query.count() == 1
+	assert WebhookEvent.query.filter_by(status=webhooks.STATUS_DONE).count() == 2